@@ -2,9 +2,11 @@
 import numpy as np
 import warnings
 from .duckprint import duck_repr, duck_str
-from .common import is_ndtype
+from .common import (is_ndtype, iter_chunks, pool_map, pickle_array,
+                     unpickle_array, SharedHandle, unique_outputs)
 from .ndarray_api_mixin import NDArrayAPIMixin
 import sys
+import ast
 import operator
 from functools import reduce
 
@@ -53,8 +55,12 @@ class ArrayCollection(CollectionMixin):
     as named axes.
 
     Tip: One can use `np.broadcast_to` to broadcast the input arrays to the
-    same shape in a memory-saving way, though this makes the arrays readonly.
-    See the `np.broadcast_to` docstring for details.
+    same shape in a memory-saving way, see the `np.broadcast_to` docstring
+    for details. Fields which are a single value broadcast to the full shape
+    ("constant" fields, see `constant_array`) are kept compact by indexing,
+    `take`, `concatenate`, `copy` and `astype`. Broadcast fields are copied
+    to full size the first time an element of them is assigned to, after
+    which they no longer share memory with other collections viewing them.
 
     """
     def __init__(self, data, dtype=None, skip_validation=False):
@@ -171,8 +177,18 @@ class ArrayCollection(CollectionMixin):
         if isinstance(ind, (int, np.integer)):
             ind = (ind,)
 
-        # fall through: Use ndarray indexing
-        out = {n: a[ind] for n, a in self._arrays.items()}
+        # fall through: Use ndarray indexing, with the index converted
+        # once for all fields. Constant fields are indexed without expanding
+        # them.
+        ind, copy = _normalize_index(ind, self.shape)
+
+        def getfield(a):
+            if _is_constant(a):
+                return _constant_op(a, lambda x: x[ind])
+            return a[ind].copy() if copy else a[ind]
+
+        out = _map_fields(getfield, {n: (a,) for n, a in self._arrays.items()},
+                          self.size*len(self._arrays))
 
         # scalars get returned as a CollectionScalar
         if next(iter(out.values())).shape == ():
@@ -181,6 +197,14 @@ class ArrayCollection(CollectionMixin):
         return type(self)(out)
 
     def __setitem__(self, ind, val):
+        # copy-on-write of broadcast fields
+        if isinstance(ind, str):
+            self._materialize([ind])
+        elif is_list_of_strings(ind):
+            self._materialize(ind)
+        else:
+            self._materialize(list(self._arrays.keys()))
+
         # for a single field name, assign to that array
         if isinstance(ind, str):
             self._arrays[ind][:] = val
@@ -190,30 +214,102 @@ class ArrayCollection(CollectionMixin):
             view = self[ind]
             view[:] = val
 
-        # for a tuple, assign values to each array in order
-        elif isinstance(val, tuple):
-            if len(val) != len(self.arrays.keys()):
-                raise ValueError("wrong number of values")
-            for dst,v in zip(self.arrays.values(), val):
-                dst[ind] = v
-
         # for a structured ndarray, fail
         elif isinstance(val, np.ndarray) and val.dtype.names is not None:
             raise Exception("Convert structured arrays to "
                             "ArrayCollection first")
 
-        # for another arraycollection, assign successive arrays
-        elif isinstance(val, ArrayCollection):
-            if len(self._arrays) != len(val._arrays):
+        else:
+            # for a tuple, assign values to each array in order
+            if isinstance(val, tuple):
+                vals = val
+            # for another arraycollection, assign successive arrays
+            elif isinstance(val, ArrayCollection):
+                vals = tuple(val._arrays.values())
+            # otherwise, try to assign val to each array (includes scalars
+            # and unstructured ndarrays)
+            else:
+                vals = (val,)*len(self._arrays)
+
+            if len(vals) != len(self._arrays):
                 raise ValueError("wrong number of values")
-            for dst, src in zip(self._arrays.values(), val._arrays.values()):
-                dst[ind] = src
 
-        # otherwise, try to assign val to each array (includes scalars and
-        # unstructured ndarrays)
-        else:
-            for dst in self._arrays.values():
-                dst[ind] = val
+            # convert the index once for all fields
+            ind, _ = _normalize_index(ind, self.shape)
+
+            def setfield(dst, v):
+                dst[ind] = v
+
+            pool_map(setfield, zip(self._arrays.values(), vals),
+                     self.size*len(self._arrays))
+
+    def __reduce_ex__(self, protocol):
+        # For protocol 5, ndarray fields are transported as PickleBuffers.
+        # Constant fields are pickled compactly as their single value.
+        if protocol < 5:
+            return super().__reduce_ex__(protocol)
+
+        fields = []
+        for name, a in self._arrays.items():
+            if _is_constant(a):
+                fields.append((name, 'constant', _constant_value(a)[()],
+                               a.shape, a.dtype))
+            elif isinstance(a, np.ndarray):
+                fields.append((name, 'array', pickle_array(a, protocol)))
+            else:
+                fields.append((name, 'duck', a))
+        return (_unpickle_collection, (type(self), fields))
+
+    def to_shared(self):
+        """
+        Copy the fields into a new shared memory segment.
+
+        Fields may be ndarrays or MaskedArrays. Constant fields (see
+        `constant_array`) are stored in the handle as their single value,
+        so assignments to them are not shared between processes.
+
+        Returns
+        -------
+        handle : SharedHandle
+            Picklable handle, which can be sent to other processes and
+            passed to `from_shared` there to view the collection without
+            copying. The calling process owns the segment, and should call
+            ``handle.unlink()`` when it is no longer needed.
+        """
+        arrays, fields = {}, []
+        for name, a in self._arrays.items():
+            if _is_constant(a):
+                fields.append((name, 'constant', (_constant_value(a)[()],
+                                                  a.shape, a.dtype)))
+            elif isinstance(a, np.ndarray):
+                arrays[name, 'data'] = a
+                fields.append((name, 'array', None))
+            elif hasattr(a, '_data') and hasattr(a, '_mask'):
+                arrays[name, 'data'], arrays[name, 'mask'] = a._data, a._mask
+                fields.append((name, 'masked', type(a)))
+            else:
+                raise TypeError("field '{}' of type {} cannot be shared"
+                                .format(name, type(a).__name__))
+        return SharedHandle(arrays, fields)
+
+    @classmethod
+    def from_shared(cls, handle):
+        """
+        Construct a collection viewing the shared memory segment of a handle
+        returned by `to_shared`. Writes to its fields are seen by all
+        processes using the segment.
+        """
+        shared = handle.attach()
+        arrays = {}
+        for name, kind, extra in handle.meta:
+            if kind == 'constant':
+                arrays[name] = constant_array(*extra)
+            elif kind == 'array':
+                arrays[name] = shared[name, 'data']
+            else:
+                arrays[name] = extra(shared[name, 'data'],
+                                     shared[name, 'mask'])
+        return cls(arrays, skip_validation=True)
 
     def __str__(self):
         return duck_str(self)
@@ -227,6 +323,14 @@ class ArrayCollection(CollectionMixin):
     #    except StopIteration:
     #        return 0
 
+    def _materialize(self, names):
+        # replace broadcast (readonly, zero-stride) fields by full copies
+        for n in names:
+            a = self._arrays[n]
+            if (isinstance(a, np.ndarray) and not a.flags.writeable and
+                    0 in a.strides and a.size > 1):
+                self._arrays[n] = a.copy()
+
     def astype(self, dtype, order='K', casting='unsafe', subok=True, copy=True):
         kwds = {'order': order, 'casting': casting, 'subok': subok,
                 'copy': copy}
@@ -240,7 +344,8 @@ class ArrayCollection(CollectionMixin):
         if list(self._arrays.keys()) != [n for n,dt in types]:
             copy = True
 
-        mapping = [(n, arr, arr.astype(dt, *kwds))
+        mapping = [(n, arr, _constant_op(arr, lambda x: x, dt)
+                            if _is_constant(arr) else arr.astype(dt, **kwds))
                    for arr,(n,dt) in zip(self._arrays.values(), types)]
 
         if copy is False:
@@ -270,9 +375,27 @@ class ArrayCollection(CollectionMixin):
         return ArrayCollection(out)
 
     def copy(self, order='C'):
-        return ArrayCollection({n: a.copy(order=order)
+        return ArrayCollection({n: _constant_op(a, lambda x: x)
+                                   if _is_constant(a) else a.copy(order=order)
                                 for n, a in self._arrays.items()})
 
+    def to_structured(self):
+        """
+        Return a copy of the collection as a structured ndarray.
+
+        Constant fields are assigned from their single value rather than
+        expanded first.
+        """
+        out = np.empty(self.shape, dtype=self._dtype)
+        for n, a in self._arrays.items():
+            if isinstance(a, ArrayCollection):
+                out[n] = a.to_structured()
+            elif _is_constant(a):
+                out[n] = _constant_value(a)
+            else:
+                out[n] = a
+        return out
+
     # unlike np.reshape, allows shape to be passed as separate args
     def reshape(self, *shape, **kwargs):
         if len(shape) > 1:
@@ -284,6 +407,132 @@ class ArrayCollection(CollectionMixin):
         for a in self._arrays.values():
             a.resize(new_shape, refcheck)
 
+    def partition_by(self, keys, n):
+        """
+        Split the collection into `n` partitions by hashing the key fields,
+        so that elements with equal keys always land in the same partition.
+
+        The collection is flattened, and the partitions are computed using a
+        vectorized hash of the key fields followed by a single stable
+        counting sort, so only one gather of each field is performed. The
+        returned partitions are contiguous views of that gathered copy, and
+        are picklable so may be passed directly to `concurrent.futures`
+        workers.
+
+        Parameters
+        ----------
+        keys : str or list of str
+            Name(s) of the fields to use as the partitioning key. Masked
+            values in a key field hash together.
+        n : int
+            Number of partitions
+
+        Returns
+        -------
+        parts : list of ArrayCollection
+            The `n` partitions, some of which may be empty. Within each
+            partition the original element order is preserved.
+        """
+        if n < 1:
+            raise ValueError("number of partitions must be at least 1")
+        if isinstance(keys, str):
+            keys = [keys]
+
+        flat = self.ravel()
+        size = flat.size
+
+        h = _hash_rows(_row_keys(flat[keys], size, hashed=True), size)
+        part = (h % np.uint64(n)).astype(np.intp)
+
+        counts = np.bincount(part, minlength=n)
+        order = np.argsort(part, kind='stable')
+        gathered = type(self)(flat[order])
+
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        return [gathered[start:stop]
+                for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    def iter_chunks(self, rows=65536, prefetch=False):
+        """
+        Iterate over the collection in chunks of `rows` elements along the
+        first axis. Each chunk is a view of the collection, no data is
+        copied.
+
+        Parameters
+        ----------
+        rows : int, optional
+            Number of rows per chunk. The last chunk may be shorter.
+        prefetch : bool, optional
+            If True, the next chunk's data is read in a background thread
+            while the current chunk is being processed. Useful when the
+            fields are memory-mapped.
+
+        Returns
+        -------
+        chunks : iterator of ArrayCollection
+        """
+        if self.ndim == 0:
+            raise TypeError("iteration over a 0-d collection")
+
+        def getchunk(start, stop):
+            chunk = self[start:stop]
+            return chunk, _buffers(chunk)
+
+        return iter_chunks(self.shape[0], rows, getchunk, prefetch)
+
+    def query(self, expr, columns=None, rows=65536, variables=None):
+        """
+        Select the elements of a 1d collection satisfying a predicate.
+
+        The predicate is evaluated block by block, and `&`/`|` (or `and`/`or`)
+        of predicates are short-circuited: the right operand is only
+        evaluated for the elements whose result is not already determined
+        by the left operand, and not at all for blocks where none are.
+        Only the fields
+        used by the predicate and the requested columns are read, so this
+        works well for memory-mapped fields.
+
+        Parameters
+        ----------
+        expr : str
+            Boolean expression in python syntax using the field names, eg
+            ``"(a > 3) & (b < 7)"``. Supports comparisons (including
+            chained ones), arithmetic, `&`, `|`, `~`, `and`, `or`, `not`
+            and constants. `&`, `|` and `~` are logical operators when
+            applied to comparisons and bitwise otherwise, eg in
+            ``"(a & 1) == 1"``. Comparisons of masked elements are unknown,
+            and are combined with three-valued logic, so that eg neither
+            ``"a > 3"`` nor ``"~(a > 3)"`` selects them.
+        columns : list of str, optional
+            Fields to return. Default is all fields.
+        rows : int, optional
+            Number of elements per block.
+        variables : dict, optional
+            Values for names in `expr` which are not field names.
+
+        Returns
+        -------
+        result : ArrayCollection
+            The requested columns of the selected elements.
+        """
+        if self.ndim != 1:
+            raise ValueError("query requires a 1d collection")
+        if columns is None:
+            columns = list(self._arrays.keys())
+
+        tree = ast.parse(expr, mode='eval').body
+        names = dict(variables or {})
+        names.update(self._arrays)
+
+        selected = []
+        for start in range(0, self.shape[0], rows):
+            stop = min(start + rows, self.shape[0])
+            found, _ = _eval_query(tree, names, slice(start, stop))
+            selected.append(start + np.flatnonzero(found))
+        idx = np.concatenate(selected) if selected else np.empty(0, np.intp)
+
+        return self[columns][idx]
+
 class CollectionScalar(CollectionMixin):
     def __init__(self, vals, dtype=None):
         if isinstance(vals, tuple):
@@ -301,12 +550,12 @@ class CollectionScalar(CollectionMixin):
     def __getitem__(self, ind):
         # for a single field name, return the bare ndarray
         if isinstance(ind, str):
-            return self.data[self._dtype.names.index(ind)]
+            return self._data[self._dtype.names.index(ind)]
 
         # for a list of field names return a CollectionScalar
         if is_list_of_strings(ind):
             new_dtype = np.dtype([(n, self._dtype.fields[n][0]) for n in ind])
-            new_data = (self._data[self._dtype.names.index(n)] for n in inds)
+            new_data = (self._data[self._dtype.names.index(n)] for n in ind)
             return CollectionScalar(tuple(new_data), new_dtype)
 
         if ind == ():
@@ -330,6 +579,332 @@ def is_list_of_strings(val):
             return False
     return True
 
+def _normalize_index(ind, shape):
+    """
+    Convert an index into a form which is cheaper to apply to many fields of
+    the given shape.
+
+    Boolean arrays are converted to integer index arrays, so that `nonzero`
+    is only computed once. A 1d integer index (or boolean mask) selecting
+    evenly spaced increasing elements is converted to the equivalent slice.
+    Because indexing by a slice gives a view while an index array gives a
+    copy, returns a tuple `(ind, copy)` where `copy` says whether the result
+    of indexing needs to be copied to keep the semantics of the original
+    index. Other indices are returned unchanged.
+    """
+    if not isinstance(ind, (list, np.ndarray)):
+        return ind, False
+
+    arr = np.asarray(ind)
+    if arr.dtype == np.bool_:
+        if arr.ndim == 0 or arr.shape != shape[:arr.ndim]:
+            return ind, False  # let numpy raise the error
+        if arr.ndim > 1:
+            return np.nonzero(arr), False
+        idx = np.flatnonzero(arr)
+    elif arr.dtype.kind in 'iu' and arr.ndim == 1 and len(shape) > 0:
+        idx = arr.astype(np.intp, copy=False)
+    else:
+        return ind, False
+
+    n = len(idx)
+    if n > 1 and 0 <= idx[0] and idx[-1] < shape[0]:
+        step = idx[1] - idx[0]
+        if step > 0 and np.all(np.diff(idx) == step):
+            return slice(idx[0], idx[-1] + 1, step), True
+    return idx, False
+
+_query_binops = {ast.Add: operator.add, ast.Sub: operator.sub,
+                 ast.Mult: operator.mul, ast.Div: operator.truediv,
+                 ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+                 ast.Pow: operator.pow, ast.BitAnd: np.bitwise_and,
+                 ast.BitOr: np.bitwise_or}
+_query_unops = {ast.USub: operator.neg, ast.Invert: np.invert,
+                ast.Not: np.logical_not}
+_query_cmpops = {ast.Eq: operator.eq, ast.NotEq: operator.ne,
+                 ast.Lt: operator.lt, ast.LtE: operator.le,
+                 ast.Gt: operator.gt, ast.GtE: operator.ge}
+
+def _is_predicate(node):
+    # whether a query expression node is a predicate (comparison or boolean
+    # combination of predicates), rather than a value. `&`, `|` and `~`
+    # are logical for predicates, and bitwise for values.
+    if isinstance(node, (ast.Compare, ast.BoolOp)):
+        return True
+    if isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, ast.Not) or (
+               isinstance(node.op, ast.Invert) and _is_predicate(node.operand))
+    if isinstance(node, ast.BinOp) and isinstance(node.op,
+                                                  (ast.BitAnd, ast.BitOr)):
+        return _is_predicate(node.left) and _is_predicate(node.right)
+    return False
+
+def _eval_query(node, names, rows):
+    """
+    Evaluate a predicate (a python ast node) for the elements `rows` (a slice
+    or index array) of the 1d arrays in `names`.
+
+    Masked elements are unknown, and are combined using three-valued logic:
+    eg, "unknown & False" is False, and "~unknown" is unknown. Returns two
+    boolean ndarrays, `(true, false)`, marking the elements for which the
+    predicate is known to be true or false.
+    """
+    if isinstance(node, ast.BoolOp) or (isinstance(node, ast.BinOp) and
+                                        _is_predicate(node)):
+        if isinstance(node, ast.BoolOp):
+            is_and = isinstance(node.op, ast.And)
+            operands = node.values
+        else:
+            is_and = isinstance(node.op, ast.BitAnd)
+            operands = [node.left, node.right]
+
+        true, false = _eval_query(operands[0], names, rows)
+        for operand in operands[1:]:
+            # only evaluate the elements which are still undetermined
+            todo = ~false if is_and else ~true
+            if not todo.any():
+                break
+            if todo.all():
+                sub = rows
+            elif isinstance(rows, slice):
+                sub = rows.start + np.flatnonzero(todo)
+            else:
+                sub = rows[todo]
+            t, f = _eval_query(operand, names, sub)
+            if is_and:
+                true[todo] &= t
+                false[todo] = f
+            else:
+                true[todo] = t
+                false[todo] &= f
+        return true, false
+
+    if isinstance(node, ast.UnaryOp) and _is_predicate(node):
+        true, false = _eval_query(node.operand, names, rows)
+        return false, true
+
+    if isinstance(node, ast.Compare):
+        left = _eval_query_value(node.left, names, rows)
+        true = false = None
+        for op, right in zip(node.ops, node.comparators):
+            if type(op) not in _query_cmpops:
+                raise ValueError("unsupported comparison in query")
+            right = _eval_query_value(right, names, rows)
+            t, f = _as_bool(_query_cmpops[type(op)](left, right), rows)
+            true = t if true is None else true & t
+            false = f if false is None else false | f
+            left = right
+        return true, false
+
+    return _as_bool(_eval_query_value(node, names, rows), rows)
+
+def _eval_query_value(node, names, rows):
+    # evaluate a part of a query expression as a value, without short-
+    # circuiting. Masked values propagate.
+    if isinstance(node, ast.Name):
+        if node.id not in names:
+            raise NameError("name '{}' is not a field or variable".format(
+                            node.id))
+        val = names[node.id]
+        return val[rows] if is_ndtype(val) and np.ndim(val) > 0 else val
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, (ast.Num, ast.Str)):  # python < 3.8
+        return node.n if isinstance(node, ast.Num) else node.s
+    if isinstance(node, ast.BinOp) and type(node.op) in _query_binops:
+        return _query_binops[type(node.op)](
+                    _eval_query_value(node.left, names, rows),
+                    _eval_query_value(node.right, names, rows))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _query_unops:
+        return _query_unops[type(node.op)](
+                    _eval_query_value(node.operand, names, rows))
+    if isinstance(node, ast.Compare):
+        left = _eval_query_value(node.left, names, rows)
+        result = None
+        for op, right in zip(node.ops, node.comparators):
+            if type(op) not in _query_cmpops:
+                raise ValueError("unsupported comparison in query")
+            right = _eval_query_value(right, names, rows)
+            res = _query_cmpops[type(op)](left, right)
+            result = res if result is None else np.logical_and(result, res)
+            left = right
+        return result
+    if isinstance(node, ast.BoolOp):
+        func = np.logical_and if isinstance(node.op, ast.And) else (
+               np.logical_or)
+        return reduce(func, [_eval_query_value(v, names, rows)
+                             for v in node.values])
+    raise ValueError("unsupported expression in query: {}".format(
+                     ast.dump(node)))
+
+def _as_bool(res, rows):
+    # Convert a value to new (true, false) boolean arrays with an element
+    # for each row. Masked elements (eg, from comparisons of MaskedArrays)
+    # are neither.
+    n = rows.stop - rows.start if isinstance(rows, slice) else len(rows)
+    true = np.empty(n, dtype=bool)
+    if hasattr(res, 'filled'):
+        true[...] = res.filled(False)
+        known = np.empty(n, dtype=bool)
+        known[...] = ~np.asarray(res.mask)
+        return true & known, ~true & known
+    true[...] = res
+    return true, ~true
+
+def _unpickle_collection(cls, fields):
+    arrays = {}
+    for name, kind, *state in fields:
+        if kind == 'constant':
+            arrays[name] = constant_array(*state)
+        elif kind == 'array':
+            arrays[name] = unpickle_array(state[0])
+        else:
+            arrays[name] = state[0]
+    return cls(arrays, skip_validation=True)
+
+def _map_fields(func, fields, nelem):
+    # Apply func(*args) for each item of a dict {name: args}, possibly in
+    # the thread pool (see `common.set_thread_pool`). Returns a dict.
+    return dict(zip(fields.keys(), pool_map(func, fields.values(), nelem)))
+
+def constant_array(value, shape, dtype=None):
+    """
+    Return a readonly array of the given shape all of whose elements are
+    `value`, using the memory of a single element.
+
+    When used as a field of an ArrayCollection, the field stays compact
+    through indexing and most shape operations, and is copied to full
+    size only when one of its elements is assigned to.
+    """
+    return np.broadcast_to(np.array(value, dtype=dtype), shape)
+
+def _is_constant(arr):
+    # a non-empty ndarray whose elements all share the same memory
+    return (isinstance(arr, np.ndarray) and arr.ndim > 0 and arr.size > 0
+            and not any(arr.strides))
+
+def _constant_value(arr):
+    # 0d view of the single value of a constant array
+    return arr[(slice(None, 1),)*arr.ndim].reshape(())
+
+def _constant_op(arr, func, dtype=None):
+    # Apply an indexing or shape operation to a constant array without
+    # expanding it: the operation is applied to a zero-itemsize array of the
+    # same shape to get the result shape (and to raise the same errors).
+    shape = func(np.empty(arr.shape, dtype='V0')).shape
+    val = _constant_value(arr)
+    if dtype is not None:
+        val = val.astype(dtype)
+    if shape == ():
+        return val[()]
+    return constant_array(val, shape)
+
+def _row_keys(arr, n, hashed=False):
+    """
+    Return a list of 1d ndarrays of length `n` which together identify each
+    element of `arr` (flattened to `n` elements), for use as lexsort keys.
+
+    Nested collections are expanded recursively, subarray fields contribute
+    one key per subarray element, and masked fields (any ducktype with a
+    `filled` method and a `mask`) contribute a mask key followed by the
+    zero-filled data, so that all masked cells compare equal to each other.
+    Categorical fields (with `codes` and sorted `categories`) contribute
+    their integer codes, or if `hashed` is True the hashes of their category
+    values gathered by code, so that equal values hash equally whatever the
+    categories.
+    """
+    if isinstance(arr, ArrayCollection):
+        return [k for a in arr._arrays.values()
+                  for k in _row_keys(a, n, hashed)]
+
+    if hasattr(arr, 'codes') and hasattr(arr, 'categories'):
+        if hashed:
+            cats = np.ravel(arr.categories)
+            codes = np.reshape(arr.codes, (n, -1))
+            return [_hash_key(cats)[codes[:,i]]
+                    for i in range(codes.shape[1])]
+        arr = arr.codes
+
+    if hasattr(arr, 'filled') and hasattr(arr, 'mask'):
+        data = np.reshape(arr.filled(0, view=1), (n, -1))
+        mask = np.reshape(arr.mask, (n, -1))
+        return [k for i in range(data.shape[1])
+                  for k in (mask[:,i], data[:,i])]
+
+    arr = np.reshape(arr, (n, -1))
+    return [arr[:,i] for i in range(arr.shape[1])]
+
+def _buffers(arr):
+    # list the ndarrays which hold the data of an ndarray ducktype
+    if isinstance(arr, ArrayCollection):
+        return [b for a in arr._arrays.values() for b in _buffers(a)]
+    if hasattr(arr, '_data') and hasattr(arr, '_mask'):
+        return [arr._data, arr._mask]
+    if hasattr(arr, 'codes') and hasattr(arr, 'categories'):
+        return [arr.codes]
+    return [arr]
+
+def _mix64(h):
+    # splitmix64 finalizer, applied inplace to a uint64 array. uint64
+    # array arithmetic wraps around silently, which is what we want.
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xbf58476d1ce4e5b9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94d049bb133111eb)
+    h ^= h >> np.uint64(31)
+    return h
+
+def _hash_key(key):
+    """
+    Return a uint64 array of the same length as the 1d array `key`, such
+    that equal elements give equal values.
+    """
+    kind = key.dtype.kind
+    if kind in 'biu':
+        return key.astype(np.uint64)
+    if kind in 'mM':
+        return key.view(np.int64).astype(np.uint64)
+    if kind == 'f':
+        # adding 0.0 converts -0.0 to 0.0, which compares equal to it
+        return (key.astype(np.float64) + 0.0).view(np.uint64)
+    if kind == 'c':
+        key = key.astype(np.complex128)
+        return _hash_key(key.real) ^ _mix64(_hash_key(key.imag))
+    if kind == 'O':
+        return np.array([hash(k) for k in key], dtype=np.int64).view(
+                        np.uint64)
+
+    # flexible types: hash the raw bytes of each element in 8-byte words.
+    # Strings are zero-padded, so equal strings have equal bytes. Trailing
+    # zero words are skipped, so that the hash does not depend on the width
+    # of the dtype.
+    nbytes = key.dtype.itemsize
+    words = -(-nbytes // 8)
+    buf = np.zeros((len(key), words*8), dtype=np.uint8)
+    buf[:,:nbytes] = np.ascontiguousarray(key).view(np.uint8).reshape(
+                                                            len(key), nbytes)
+    buf = buf.view(np.uint64)
+    nonzero = buf[:,1:] != 0
+    last = words - 1 - np.argmax(nonzero[:,::-1], axis=1)
+    last[~nonzero.any(axis=1)] = 0
+    h = buf[:,0].copy()
+    for i in range(1, words):
+        more = i <= last
+        h[more] = _mix64(h[more]) ^ buf[more,i]
+    return h
+
+def _hash_rows(keys, n):
+    """
+    Compute a combined uint64 hash for each row of a list of 1d key arrays
+    of length `n`, as returned by `_row_keys`.
+    """
+    h = np.zeros(n, dtype=np.uint64)
+    for k in keys:
+        h ^= _hash_key(k)
+        h += np.uint64(0x9e3779b97f4a7c15)
+        h = _mix64(h)
+    return h
+
 def empty_collection(shape, dtype, order='C'):
     dtype = np.dtype(dtype)
 
@@ -409,8 +984,7 @@ def setup_ducktype():
 
     @implements(np.copy)
     def copy(a, order='K'):
-        return ArrayCollection({name: np.copy(ai, order)
-                                for name, ai in a._arrays.items()()})
+        return a.copy(order=order)
 
     @implements(np.diagonal)
     def diagonal(a, offset=0, axis1=0, axis2=1):
@@ -439,8 +1013,15 @@ def setup_ducktype():
 
     @implements(np.take, checked_args=(0,))
     def take(a, indices, axis=None, out=None, mode='raise'):
-        arrs = {name: np.take(ai, indices, axis, o, mode) for (name, ai), o
-                in zip(a._arrays.items(), check_out(out, a.dtype))}
+        def take_field(ai, o):
+            if o is None and _is_constant(ai):
+                return _constant_op(ai, lambda x: np.take(x, indices, axis,
+                                                          mode=mode))
+            return np.take(ai, indices, axis, o, mode)
+
+        arrs = _map_fields(take_field, {name: (ai, o) for (name, ai), o
+                           in zip(a._arrays.items(), check_out(out, a.dtype))},
+                           np.size(indices)*len(a._arrays))
         return out if out is not None else ArrayCollection(arrs)
 
     @implements(np.put, checked_args=(0,))
@@ -462,18 +1043,25 @@ def setup_ducktype():
 
     @implements(np.ravel)
     def ravel(a, order='C'):
-        return ArrayCollection({name: np.ravel(ai, order)
+        return ArrayCollection({name: _constant_op(ai, np.ravel)
+                                      if _is_constant(ai) else
+                                      np.ravel(ai, order)
                                 for name, ai in a._arrays.items()})
 
     @implements(np.repeat)
     def repeat(a, repeats, axis=None):
-        return ArrayCollection({name: np.repeat(ai, repeats, axis)
-                                for name, ai in a._arrays.items()})
+        return ArrayCollection(_map_fields(
+            lambda ai: np.repeat(ai, repeats, axis),
+            {name: (ai,) for name, ai in a._arrays.items()},
+            a.size*len(a._arrays)))
 
     @implements(np.reshape)
     def reshape(a, newshape, order='C'):
-        return ArrayCollection({name: np.reshape(ai, newshape, order)
-                                for name, ai in a._arrays.items()})
+        # reshapes which copy are parallelized, views are cheap either way
+        return ArrayCollection(_map_fields(
+            lambda ai: np.reshape(ai, newshape, order),
+            {name: (ai,) for name, ai in a._arrays.items()},
+            a.size*len(a._arrays)))
 
     @implements(np.resize)
     def resize(a, new_shape):
@@ -522,10 +1110,22 @@ def setup_ducktype():
 
     @implements(np.concatenate)
     def concatenate(arrays, axis=0, out=None):
-        out_dt, out_subtype = promote_duckarrays(arrays)
-        #arrays, dtype = check_common_fields(arrays)
-        arrs = {name: np.concatenate([ai[name] for ai in arrays], axis, o)
-                for name, o in zip(dtype.names, check_out(out, dtype))}
+        arrays, dtype = check_common_fields(arrays)
+
+        def concat_field(name, o):
+            fields = [a._arrays[name] for a in arrays]
+            # constant fields with the same value stay constant
+            if o is None and all(_is_constant(f) for f in fields):
+                val = _constant_value(fields[0])
+                if all(_constant_value(f) == val for f in fields[1:]):
+                    proxies = [np.empty(f.shape, dtype='V0') for f in fields]
+                    shape = np.concatenate(proxies, axis).shape
+                    return constant_array(val, shape, np.result_type(*fields))
+            return np.concatenate(fields, axis, o)
+
+        arrs = _map_fields(concat_field, {name: (name, o) for name, o
+                           in zip(dtype.names, check_out(out, dtype))},
+                           sum(a.size for a in arrays)*len(dtype.names))
         return out if out is not None else ArrayCollection(arrs)
 
     @implements(np.block)
@@ -653,14 +1253,20 @@ def setup_ducktype():
 
     @implements(np.delete)
     def delete(arr, obj, axis=None):
-        return ArrayCollection({name: np.delete(ai, obj, axis)
-                                for name, ai in arr._arrays.items()})
+        return ArrayCollection(_map_fields(
+            lambda ai: np.delete(ai, obj, axis),
+            {name: (ai,) for name, ai in arr._arrays.items()},
+            arr.size*len(arr._arrays)))
 
     @implements(np.insert)
     def insert(arr, obj, values, axis=None):
-        vals = ArrayCollection(values, dtype=arr.dtype)
-        return ArrayCollection({name: np.insert(ai, obj, vals[name], axis)
-                                for name, ai in arr._arrays.items()})
+        vals = values
+        if not isinstance(vals, (ArrayCollection, CollectionScalar)):
+            vals = ArrayCollection(values, dtype=arr.dtype)
+        return ArrayCollection(_map_fields(
+            lambda ai, vi: np.insert(ai, obj, vi, axis),
+            {name: (ai, vals[name]) for name, ai in arr._arrays.items()},
+            arr.size*len(arr._arrays)))
 
     @implements(np.append)
     def append(arr, values, axis=None):
@@ -681,8 +1287,10 @@ def setup_ducktype():
 
     @implements(np.pad)
     def pad(array, pad_width, mode, **kwargs):
-        return ArrayCollection({name: np.pad(ai, pad_width, mode, **kwargs)
-                                for name, ai in array._arrays.items()})
+        return ArrayCollection(_map_fields(
+            lambda ai: np.pad(ai, pad_width, mode, **kwargs),
+            {name: (ai,) for name, ai in array._arrays.items()},
+            array.size*len(array._arrays)))
 
     @implements(np.broadcast_to)
     def broadcast_to(array, shape, subok=False):
@@ -733,13 +1341,49 @@ def setup_ducktype():
                              'ArrayCollection. Supply x and y.')
         (x, y), dtype = check_common_fields((x, y))
         fields = zip(dtype.names, x._arrays.values(), y._arrays.values())
-        return ArrayCollection({name: np.where(condition, xi, yi)
-                                for name, xi, yi in fields})
+        return ArrayCollection(_map_fields(
+            lambda xi, yi: np.where(condition, xi, yi),
+            {name: (xi, yi) for name, xi, yi in fields},
+            np.size(condition)*len(dtype.names)))
 
     @implements(np.choose, checked_args=(1,)) #XXX checkedargs doesn't work here
     def choose(a, choices, out=None, mode='raise'):
         pass
 
+    @implements(np.unique)
+    def unique(ar, return_index=False, return_inverse=False,
+               return_counts=False, axis=None):
+        # finds the unique rows (elements) of the collection. Masked fields
+        # treat the masked value as a distinct value.
+        if axis is not None:
+            raise NotImplementedError('axis argument to unique is not '
+                                      'supported for ArrayCollection')
+
+        cls = type(ar)
+        ar = ar.ravel()
+        n = ar.size
+
+        if n == 0:
+            perm = np.empty(0, dtype=np.intp)
+            flag = np.empty(0, dtype=np.bool_)
+        else:
+            # lexsort uses the last key as primary, so reverse to make the
+            # first field primary. lexsort is stable so "perm[flag]" gives the
+            # index of the first occurrence of each unique row.
+            keys = _row_keys(ar, n)
+            perm = np.lexsort(keys[::-1])
+
+            flag = np.empty(n, dtype=np.bool_)
+            flag[:1] = True
+            flag[1:] = False
+            for k in keys:
+                k = k[perm]
+                flag[1:] |= k[1:] != k[:-1]
+
+        ret = (cls(ar[perm[flag]]),) + unique_outputs(
+                    perm, flag, return_index, return_inverse, return_counts)
+        return ret[0] if len(ret) == 1 else ret
+
     @implements(np.shape)
     def shape(a):
         return a.shape
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+import numpy as np
+from functools import reduce
+from .duckprint import duck_str, duck_repr
+from .common import new_ducktype_implementation
+from .ndarray_api_mixin import NDArrayAPIMixin
+
+class CategoricalArray(NDArrayAPIMixin):
+    """
+    Dictionary-encoded ndarray ducktype, for arrays (typically of strings)
+    with few distinct values.
+
+    The array is stored as an array of small integer `codes` indexing into
+    an array of `categories`. The categories are kept sorted and unique, so
+    that comparisons, sorts and unique can operate on the codes alone, and
+    give the same result as for the decoded values.
+
+    Indexing with an integer returns the decoded numpy scalar. Most other
+    operations return a CategoricalArray sharing the categories. Convert to
+    a plain ndarray using `np.asarray`. Values assigned to the array must
+    already be categories.
+
+    It is mainly intended for use as a field of an ArrayCollection:
+
+    >>> c = ArrayCollection({'city': CategoricalArray(['Oslo', 'Rome',
+    ...                                                'Oslo']),
+    ...                      'temp': [3., 17., 5.]})
+    >>> c[c['city'] == 'Oslo']['temp']
+    array([3., 5.])
+    """
+
+    def __init__(self, data, categories=None):
+        """
+        Parameters
+        ----------
+        data : array-like
+            The values to encode. May also be another CategoricalArray.
+        categories : array-like, optional
+            The allowed values. If not given, the distinct values in `data`
+            are used. Otherwise all values in `data` must be in categories.
+        """
+        if isinstance(data, CategoricalArray):
+            if categories is None:
+                self._codes, self._categories = data._codes, data._categories
+                return
+
+        data = np.asarray(data)
+        if categories is None:
+            cats, codes = np.unique(data, return_inverse=True)
+        else:
+            cats = np.unique(categories)
+            codes = _encode(data.ravel(), cats)
+        self._categories = cats
+        self._codes = codes.astype(_code_dtype(len(cats))).reshape(data.shape)
+
+    @classmethod
+    def from_codes(cls, codes, categories):
+        """
+        Construct a CategoricalArray from integer codes and a sorted array of
+        unique categories, without copying or validating them.
+        """
+        self = cls.__new__(cls)
+        self._codes = np.asarray(codes)
+        self._categories = np.asarray(categories)
+        return self
+
+    @property
+    def codes(self):
+        return self._codes
+
+    @property
+    def categories(self):
+        return self._categories
+
+    @property
+    def dtype(self):
+        return self._categories.dtype
+
+    @property
+    def shape(self):
+        return self._codes.shape
+
+    @shape.setter
+    def shape(self, shape):
+        self._codes.shape = shape
+
+    @property
+    def ndim(self):
+        return self._codes.ndim
+
+    @property
+    def size(self):
+        return self._codes.size
+
+    @property
+    def strides(self):
+        return self._codes.strides
+
+    def __len__(self):
+        return len(self._codes)
+
+    def __array__(self, dtype=None):
+        out = self._categories[self._codes]
+        return out if dtype is None else out.astype(dtype, copy=False)
+
+    def __getitem__(self, ind):
+        codes = self._codes[ind]
+        if codes.shape == ():
+            return self._categories[codes]
+        return self.from_codes(codes, self._categories)
+
+    def __setitem__(self, ind, val):
+        # Values must already be categories: adding one would recode all of
+        # self into a new codes array, which views of self would not see.
+        # Use np.concatenate or the `categories` argument to add categories.
+        if not isinstance(val, CategoricalArray):
+            val = CategoricalArray(val, self._categories)
+        elif not _same_categories(self, val):
+            if not np.all(np.isin(val._categories, self._categories)):
+                raise ValueError("values are not all in the categories")
+            val = _recode(val, self._categories)
+        self._codes[ind] = val._codes
+
+    def __str__(self):
+        return duck_str(self)
+
+    def __repr__(self):
+        return duck_repr(self, extra_args=['categories={}'.format(
+                         len(self._categories))])
+
+    def astype(self, dtype, order='K', casting='unsafe', subok=True,
+               copy=True):
+        return self._categories.astype(dtype, order, casting)[self._codes]
+
+    def __array_function__(self, func, types, arg, kwarg):
+        impl, check_args = implements.handled_functions.get(func, (None, None))
+        if impl is None or not check_args(arg, kwarg, types, self.known_types):
+            return NotImplemented
+
+        return impl(*arg, **kwarg)
+
+    # comparisons with a value or another categorical are done on the codes
+
+    def _compare(self, other, op):
+        if isinstance(other, CategoricalArray):
+            a, b = ((self, other) if _same_categories(self, other)
+                    else _unify([self, other]))
+            return op(a._codes, b._codes)
+
+        other = np.asarray(other)
+        if other.ndim != 0:
+            return op(np.asarray(self), other)
+
+        # position of `other` in the sorted categories. If it is not a
+        # category, it sorts between codes ind-1 and ind.
+        ind = np.searchsorted(self._categories, other)
+        found = ind < len(self._categories) and self._categories[ind] == other
+        if op is np.equal:
+            if not found:
+                return np.zeros(self.shape, dtype=bool)
+        elif op is np.not_equal:
+            if not found:
+                return np.ones(self.shape, dtype=bool)
+        elif not found:
+            # codes >= ind are greater than other, codes < ind are less
+            op = {np.less: np.less, np.less_equal: np.less,
+                  np.greater: np.greater_equal,
+                  np.greater_equal: np.greater_equal}[op]
+        return op(self._codes, ind)
+
+    def __eq__(self, other):
+        return self._compare(other, np.equal)
+
+    def __ne__(self, other):
+        return self._compare(other, np.not_equal)
+
+    def __lt__(self, other):
+        return self._compare(other, np.less)
+
+    def __le__(self, other):
+        return self._compare(other, np.less_equal)
+
+    def __gt__(self, other):
+        return self._compare(other, np.greater)
+
+    def __ge__(self, other):
+        return self._compare(other, np.greater_equal)
+
+CategoricalArray._arraytype = CategoricalArray
+CategoricalArray._scalartype = np.generic
+CategoricalArray.known_types = (CategoricalArray, np.ndarray)
+
+def _code_dtype(ncategories):
+    # smallest unsigned integer type able to index the categories
+    return np.min_scalar_type(max(ncategories - 1, 0))
+
+def _encode(values, categories):
+    # codes of values in a sorted array of categories
+    codes = np.searchsorted(categories, values)
+    codes[codes == len(categories)] = 0
+    if not np.all(categories[codes] == values):
+        raise ValueError("values are not all in the categories")
+    return codes
+
+def _same_categories(a, b):
+    return (a._categories is b._categories or
+            np.array_equal(a._categories, b._categories))
+
+def _unify(arrs):
+    """
+    Recode CategoricalArrays to use the union of their categories.
+
+    Each input's codes are translated by a lookup table of its categories'
+    positions in the union, so the cost is one gather per array.
+    """
+    cats = reduce(np.union1d, [a._categories for a in arrs])
+    return [_recode(a, cats) for a in arrs]
+
+def _recode(a, categories):
+    # recode to a sorted superset of a's categories
+    table = np.searchsorted(categories, a._categories)
+    table = table.astype(_code_dtype(len(categories)))
+    return CategoricalArray.from_codes(table[a._codes], categories)
+
+def _as_categorical(arrs):
+    # convert all to CategoricalArrays with common categories
+    arrs = [a if isinstance(a, CategoricalArray) else CategoricalArray(a)
+            for a in arrs]
+    if all(_same_categories(arrs[0], a) for a in arrs[1:]):
+        return arrs
+    return _unify(arrs)
+
+################################################################################
+#                      Numpy API function implementations
+################################################################################
+
+implements = new_ducktype_implementation()
+
+def _from_codes(a, codes):
+    return CategoricalArray.from_codes(codes, a._categories)
+
+@implements(np.take)
+def take(a, indices, axis=None, out=None, mode='raise'):
+    if out is not None:
+        raise ValueError("out argument is not supported for CategoricalArray")
+    codes = np.take(a._codes, indices, axis, mode=mode)
+    if codes.shape == ():
+        return a._categories[codes]
+    return _from_codes(a, codes)
+
+@implements(np.concatenate)
+def concatenate(arrays, axis=0, out=None):
+    if out is not None:
+        raise ValueError("out argument is not supported for CategoricalArray")
+    arrays = _as_categorical(arrays)
+    return _from_codes(arrays[0], np.concatenate([a._codes for a in arrays],
+                                                 axis))
+
+@implements(np.where)
+def where(condition, x=None, y=None):
+    if x is None or y is None:
+        raise ValueError('np.where can only be used in "nonzero" mode for '
+                         'CategoricalArray. Supply x and y.')
+    x, y = _as_categorical([x, y])
+    return _from_codes(x, np.where(condition, x._codes, y._codes))
+
+@implements(np.unique)
+def unique(ar, return_index=False, return_inverse=False,
+           return_counts=False, axis=None):
+    # the codes sort in the same order as the categories
+    ret = np.unique(ar._codes, return_index, return_inverse, return_counts,
+                    axis)
+    if not isinstance(ret, tuple):
+        return _from_codes(ar, ret)
+    return (_from_codes(ar, ret[0]),) + ret[1:]
+
+@implements(np.argsort)
+def argsort(a, axis=-1, kind=None, order=None):
+    return np.argsort(a._codes, axis, kind)
+
+@implements(np.sort)
+def sort(a, axis=-1, kind=None, order=None):
+    return _from_codes(a, np.sort(a._codes, axis, kind))
+
+@implements(np.copy)
+def copy(a, order='K'):
+    return _from_codes(a, np.copy(a._codes, order))
+
+@implements(np.ravel)
+def ravel(a, order='C'):
+    return _from_codes(a, np.ravel(a._codes, order))
+
+@implements(np.reshape)
+def reshape(a, newshape, order='C'):
+    return _from_codes(a, np.reshape(a._codes, newshape, order))
+
+@implements(np.repeat)
+def repeat(a, repeats, axis=None):
+    return _from_codes(a, np.repeat(a._codes, repeats, axis))
+
+@implements(np.transpose)
+def transpose(a, axes=None):
+    return _from_codes(a, np.transpose(a._codes, axes))
+
+@implements(np.broadcast_to)
+def broadcast_to(array, shape, subok=False):
+    return _from_codes(array, np.broadcast_to(array._codes, shape))
+
+@implements(np.empty_like)
+def empty_like(prototype, dtype=None, order='K', subok=True, shape=None):
+    if dtype is not None and np.dtype(dtype) != prototype.dtype:
+        return np.empty_like(np.asarray(prototype), dtype, order, subok, shape)
+    return _from_codes(prototype, np.zeros_like(prototype._codes,
+                                                shape=shape))
+
+@implements(np.array_equal)
+def array_equal(a1, a2):
+    a1, a2 = _as_categorical([a1, a2])
+    return np.array_equal(a1._codes, a2._codes)
+
+@implements(np.shape)
+def shape(a):
+    return a.shape
+
+@implements(np.ndim)
+def ndim(a):
+    return a.ndim
+
+@implements(np.size)
+def size(a):
+    return a.size
@@ -1,12 +1,20 @@
 #!/usr/bin/env python
 import builtins
+import contextlib
+import functools
+import itertools
 import operator
+import os
 import warnings
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
 
 from .duckprint import (duck_str, duck_repr, duck_array2string, typelessdata,
     default_duckprint_options, default_duckprint_formatters, FormatDispatcher)
 from .common import (is_ndducktype, is_ndscalar, is_ndarr, is_ndtype,
-    new_ducktype_implementation, ducktype_link, get_duck_cls, as_duck_cls)
+    new_ducktype_implementation, ducktype_link, get_duck_cls, as_duck_cls,
+    iter_chunks, pickle_array, unpickle_array, SharedHandle, pool_map,
+    thread_pool_workers, blocked_minmax, unique_outputs)
 from .ndarray_api_mixin import NDArrayAPIMixin
 
 import numpy as np
@@ -499,6 +507,79 @@ class MaskedArray(MaskedOperatorMixin, NDArrayAPIMixin):
         """
         return (~self._mask).sum(axis=axis, dtype=np.intp, keepdims=keepdims)
 
+    def __reduce_ex__(self, protocol):
+        # for protocol 5, data and mask are transported as PickleBuffers
+        if protocol < 5:
+            return super().__reduce_ex__(protocol)
+        return (_unpickle_masked, (type(self),
+                                   pickle_array(self._data, protocol),
+                                   pickle_array(self._mask, protocol)))
+
+    def to_shared(self):
+        """
+        Copy the data and mask into a new shared memory segment.
+
+        Returns
+        -------
+        handle : SharedHandle
+            Picklable handle, which can be sent to other processes and
+            passed to `MaskedArray.from_shared` there to view the array
+            without copying. The calling process owns the segment, and
+            should call ``handle.unlink()`` when it is no longer needed.
+
+        Examples
+        --------
+        >>> with a.to_shared() as h:
+        ...     b = MaskedArray.from_shared(h)
+        ...     results = pool.map(func, [h]*4)
+        """
+        return SharedHandle({'data': self._data, 'mask': self._mask})
+
+    @classmethod
+    def from_shared(cls, handle):
+        """
+        Construct a MaskedArray viewing the shared memory segment of a
+        handle returned by `MaskedArray.to_shared`. Writes to the result
+        are seen by all processes using the segment.
+        """
+        arrays = handle.attach()
+        return cls(arrays['data'], arrays['mask'])
+
+    def iter_chunks(self, rows=65536, prefetch=False):
+        """
+        Iterate over the array in chunks of `rows` elements along the first
+        axis, without copying.
+
+        This is much faster than element-wise iteration, which constructs a
+        MaskedScalar for every element.
+
+        Parameters
+        ----------
+        rows : int, optional
+            Number of rows per chunk. The last chunk may be shorter.
+        prefetch : bool, optional
+            If True, the next chunk's data and mask are read in a background
+            thread while the current chunk is being processed. Useful when
+            the data is memory-mapped.
+
+        Returns
+        -------
+        chunks : iterator of (ndarray, ndarray) pairs
+            Views of the data and mask for each chunk. The mask views are
+            readonly, and the data at masked positions is undefined.
+        """
+        if self.ndim == 0:
+            raise TypeError("iteration over a 0-d array")
+
+        def getchunk(start, stop):
+            data = self._data[start:stop]
+            mask = self._mask[start:stop]
+            ret_mask = mask.view()
+            ret_mask.flags['WRITEABLE'] = False
+            return (data, ret_mask), [data, mask]
+
+        return iter_chunks(self.shape[0], rows, getchunk, prefetch)
+
     # This works inplace, unlike np.sort
     def sort(self, axis=-1, kind='quicksort', order=None):
         # Note: See comment in np.sort impl below for trick used here.
@@ -562,7 +643,7 @@ class MaskedScalar(MaskedOperatorMixin, NDArrayAPIMixin):
         if dtype is None or dtype.type is not np.object_:
             if is_ndtype(data):
                 if dtype is not None and data.dtype != dtype:
-                    data = data.astype(dtype, copy=False)[()]
+                    data = data.astype(dtype, copy=False)
                 if not is_ndscalar(data):
                     data = data[()]
                 self._data = data
@@ -580,6 +661,10 @@ class MaskedScalar(MaskedOperatorMixin, NDArrayAPIMixin):
             self._mask = np.bool_(mask)
             self._dtype = dtype
 
+    def __reduce__(self):
+        # scalars are pickled by value, without the instance dict
+        return (type(self), (self._data, self._mask, self._dtype))
+
     @property
     def shape(self):
         return ()
@@ -691,8 +776,146 @@ class MaskedX:
 
 masked = X = MaskedX()
 
+def _unpickle_masked(cls, data, mask):
+    return cls(unpickle_array(data), unpickle_array(mask))
+
+def parallel_map(func, marr, axis=0, workers=None):
+    """
+    Apply `func` to blocks of a MaskedArray split along an axis, in a pool
+    of worker processes.
+
+    The input and output are placed in shared memory, so that only the
+    blocks' positions are sent to the workers. This is useful when `func`
+    does CPU-bound Python-level work, which threads cannot parallelize.
+
+    Parameters
+    ----------
+    func : callable
+        Called as ``func(block)`` for blocks of `marr` along `axis`, and
+        must return an array-like with the same length as the block along
+        `axis` (its other dimensions may differ from the block's), and the
+        same shape and dtype for all blocks. It must be
+        picklable, eg a module-level function or a `functools.partial` of
+        one.
+    marr : MaskedArray
+        The input array.
+    axis : int, optional
+        The axis along which to split `marr`.
+    workers : int or concurrent.futures.Executor, optional
+        Number of worker processes, defaulting to the number of CPUs, or an
+        executor to use.
+
+    Returns
+    -------
+    out : MaskedArray
+        The blocks' results joined along `axis`. Its memory is the (already
+        unlinked) shared output segment.
+    """
+    marr = marr if isinstance(marr, MaskedArray) else MaskedArray(marr)
+    axis = normalize_axis_index(axis, marr.ndim)
+    n = marr.shape[axis]
+    if n == 0:
+        raise ValueError("cannot split an axis of length 0")
+
+    executor, nworkers = workers, os.cpu_count()
+    if not isinstance(workers, Executor):
+        nworkers = nworkers if workers is None else workers
+        executor = ProcessPoolExecutor(nworkers)
+    nblocks = builtins.min(nworkers * 4, n)
+    bounds = np.linspace(0, n, nblocks + 1).astype(np.intp)
+
+    # the first block is computed here, to find the output shape and dtype
+    first = _block_result(func, marr, axis, bounds[0], bounds[1])
+    shape = first.shape[:axis] + (n,) + first.shape[axis+1:]
+    out = MaskedArray(np.empty(shape, first.dtype),
+                      np.zeros(shape, bool))
+    _axis_block(out, axis, bounds[0], bounds[1])[...] = first
+
+    try:
+        inh, outh = marr.to_shared(), out.to_shared()
+        try:
+            futs = [executor.submit(_parallel_map_block, func, inh, outh,
+                                    axis, start, stop)
+                    for start, stop in zip(bounds[1:-1], bounds[2:])]
+            for f in futs:
+                f.result()
+            return MaskedArray.from_shared(outh)
+        finally:
+            inh.unlink()
+            outh.unlink()
+    finally:
+        if executor is not workers:
+            executor.shutdown()
+
+def _axis_block(arr, axis, start, stop):
+    return arr[(slice(None),)*axis + (slice(start, stop),)]
+
+def _block_result(func, marr, axis, start, stop):
+    block = _axis_block(marr, axis, start, stop)
+    res = func(block)
+    res = res if isinstance(res, MaskedArray) else MaskedArray(res)
+    if res.ndim <= axis or res.shape[axis] != block.shape[axis]:
+        raise ValueError("func must preserve the length of the split axis")
+    return res
+
+def _parallel_map_block(func, inh, outh, axis, start, stop):
+    # runs in a worker process
+    res = _block_result(func, MaskedArray.from_shared(inh), axis, start, stop)
+    out = _axis_block(MaskedArray.from_shared(outh), axis, start, stop)
+    if res.shape != out.shape:
+        raise ValueError("func returned blocks of different shapes")
+    out[...] = res
+
 ducktype_link(MaskedArray, MaskedScalar, (MaskedX,))
 
+_scalar_types = (int, float, complex, str, bytes, np.generic)
+
+def _replace_X_flat(data, dtype):
+    """
+    Fast path of replace_X for nested lists of scalars and X, of regular
+    shape. The lists are flattened level by level, X is found by identity,
+    and the dtype is inferred by a single np.array call on the other
+    values, which are then scattered into the data array. Returns None if
+    `data` is not of this form.
+    """
+    shape = [len(data)]
+    items = data
+    while type(items[0]) is list:
+        if set(map(type, items)) != {list} or len(set(map(len, items))) != 1:
+            return None
+        shape.append(len(items[0]))
+        items = list(itertools.chain.from_iterable(items))
+        if not items:
+            return None
+
+    types = set(map(type, items))
+    hasX = MaskedX in types
+    types.discard(MaskedX)
+    if not builtins.all(issubclass(t, _scalar_types) for t in types):
+        return None
+
+    if hasX:
+        keep = list(map(operator.is_not, items, itertools.repeat(X)))
+        values = list(itertools.compress(items, keep))
+        if not values and dtype is None:
+            raise ValueError("must supply dtype if all elements are X")
+    else:
+        values = items
+
+    values = np.array(values, dtype=dtype)
+    if values.ndim != 1:
+        return None
+    # set shapes in place, so that the results own their memory
+    if not hasX:
+        values.shape = shape
+        return values, np.zeros(shape, dtype=bool), MaskedArray
+
+    keep = np.array(keep, dtype=bool)
+    out = np.zeros(len(items), dtype=values.dtype)
+    out[keep] = values
+    out.shape = keep.shape = shape
+    return out, ~keep, MaskedArray
+
 def replace_X(data, dtype=None):
     """
     takes array-like input, replaces masked value by 0 and return filled data &
@@ -717,6 +940,11 @@ def replace_X(data, dtype=None):
     if isinstance(data, (list, tuple)) and len(data) == 0:
         return data, [], MaskedArray
 
+    if isinstance(data, list):
+        ret = _replace_X_flat(data, dtype)
+        if ret is not None:
+            return ret
+
     # we do two passes: First we figure out the output dtype, then we replace
     # all masked values by the filler "type(0)".
 
@@ -1160,7 +1388,8 @@ class _Masked_BinOp(_Masked_UFunc):
             raise ValueError("initial should not be masked")
 
         if not is_ndscalar(da):
-            da[ma] = self.reduce_fill(da.dtype)
+            # fill a copy, leaving the input unchanged
+            da = np.where(ma, self.reduce_fill(da.dtype), da)
             # if da is a scalar, we get correct result no matter fill
 
         result = self.f.reduceat(da, indices, **kwargs)
@@ -1826,7 +2055,28 @@ def _quantile_unchecked(a, q, axis=None, out=None, overwrite_input=False,
 
 @implements(np.cov, checked_args=('m', 'y'))
 def cov(m, y=None, rowvar=True, bias=False, ddof=None, fweights=None,
-        aweights=None):
+        aweights=None, *, max_memory=1 << 28, workers=None):
+    """
+    Masked version of `np.cov`. Each element of the result is computed
+    from the observations where both variables are unmasked, with each
+    variable centered on the mean of all its unmasked observations.
+
+    The computation streams over blocks of observations, accumulating the
+    products and the counts of unmasked pairs (as floating point matrix
+    products, which use BLAS) block by block. The following keyword-only
+    arguments are only accepted when calling this function directly, not
+    through `np.cov`:
+
+    max_memory : int, optional
+        Approximate bound, in bytes, on the memory used by each block of
+        observations. Default 256 MiB. Besides this and the result with its
+        mask, the accumulated weight sums take one more nvars x nvars
+        float64 matrix, or up to three with `fweights` and `aweights`.
+    workers : int, optional
+        Number of threads computing blocks of rows of the result. By
+        default the thread pool set by `common.set_thread_pool` is used,
+        if any.
+    """
     # Check inputs
     if ddof is not None and ddof != int(ddof):
         raise ValueError(
@@ -1851,16 +2101,23 @@ def cov(m, y=None, rowvar=True, bias=False, ddof=None, fweights=None,
             raise ValueError("y has more than 2 dimensions")
         dtype = np.result_type(m, y, np.float64)
 
-    X = cls(m, ndmin=2, dtype=dtype)
+    # the variables are the rows of X and y, which are not concatenated
+    X = cls(m, ndmin=2)
     if not rowvar and X.shape[0] != 1:
         X = X.T
     if X.shape[0] == 0:
         return cls([]).reshape(0, 0)
+    sources = [X]
     if y is not None:
-        y = cls(y, copy=False, ndmin=2, dtype=dtype)
+        y = cls(y, copy=False, ndmin=2)
         if not rowvar and y.shape[0] != 1:
             y = y.T
-        X = np.concatenate((X, y), axis=0)
+        if y.shape[1] != X.shape[1]:
+            raise ValueError("m and y must have the same number of "
+                             "observations")
+        sources.append(y)
+    nvars = builtins.sum(len(v) for v in sources)
+    nobs = X.shape[1]
 
     if ddof is None:
         if bias == 0:
@@ -1878,7 +2135,7 @@ def cov(m, y=None, rowvar=True, bias=False, ddof=None, fweights=None,
         if fweights.ndim > 1:
             raise RuntimeError(
                 "cannot handle multidimensional fweights")
-        if fweights.shape[0] != X.shape[1]:
+        if fweights.shape[0] != nobs:
             raise RuntimeError(
                 "incompatible numbers of samples and fweights")
         if np.any(fweights < 0):
@@ -1890,7 +2147,7 @@ def cov(m, y=None, rowvar=True, bias=False, ddof=None, fweights=None,
         if aweights.ndim > 1:
             raise RuntimeError(
                 "cannot handle multidimensional aweights")
-        if aweights.shape[0] != X.shape[1]:
+        if aweights.shape[0] != nobs:
             raise RuntimeError(
                 "incompatible numbers of samples and aweights")
         if np.any(aweights < 0):
@@ -1899,45 +2156,139 @@ def cov(m, y=None, rowvar=True, bias=False, ddof=None, fweights=None,
         if w is None:
             w = aweights
         else:
-            w *= aweights
-
-    avg = np.average(X, axis=1, weights=w)
-
-    X -= avg[:, None]
-    if w is None:
-        X_T = X.T
-    else:
-        X_T = (X*w).T
-    c = np.dot(X, X_T.conj())
-
-    # Determine the normalization
-    nomask = ~X.mask
-    wnm = nomask.astype(dtype) if w is None else w*nomask
-    w_sum = np.dot(wnm, nomask.T)
-    if ddof == 0:
-        fact = w_sum
-    elif aweights is None:
-        fact = w_sum - ddof
-    else:
-        a_sum = np.dot(w*aweights*nomask, nomask.T)
-        fact = w_sum - ddof*a_sum/w_sum
-
-    nonpos_fact = fact <= 0
-    if np.any(nonpos_fact):
+            w = w*aweights
+
+    # number of observations per block, such that the block's temporaries
+    # (centered data, weighted copy, float masks) fit in max_memory
+    ncopies = 4 + 2*(w is not None) + (aweights is not None)
+    step = nobs
+    if max_memory is not None:
+        step = max_memory // (nvars * np.dtype(dtype).itemsize * ncopies)
+        step = builtins.min(builtins.max(step, 1), builtins.max(nobs, 1))
+
+    def blocks():
+        for k0 in range(0, nobs, step):
+            k1 = builtins.min(k0 + step, nobs)
+            data = np.concatenate([v._data[:, k0:k1] for v in sources])
+            valid = np.concatenate([~v._mask[:, k0:k1] for v in sources])
+            yield (k0, k1, data.astype(dtype, copy=False),
+                   valid.astype(np.float64))
+
+    # first pass: each variable's mean over its unmasked observations
+    total = np.zeros(nvars, dtype)
+    wtotal = np.zeros(nvars)
+    for k0, k1, data, valid in blocks():
+        data[valid == 0] = 0
+        if w is None:
+            total += data.sum(axis=1)
+            wtotal += valid.sum(axis=1)
+        else:
+            total += np.dot(data, w[k0:k1])
+            wtotal += np.dot(valid, w[k0:k1])
+    avg = total / np.where(wtotal == 0, 1, wtotal)
+
+    # second pass: accumulate the upper triangle of the product and weight
+    # sum matrices, by blocks of rows
+    c = np.zeros((nvars, nvars), dtype)
+    w_sum = np.zeros((nvars, nvars))
+    count = None if w is None else np.zeros((nvars, nvars))
+    a_sum = None if aweights is None else np.zeros((nvars, nvars))
+    rows = 256
+    tasks = [(i, builtins.min(i + rows, nvars)) for i in range(0, nvars, rows)]
+
+    executor = None
+    if workers is not None and workers > 1:
+        executor = ThreadPoolExecutor(workers)
+    with executor or contextlib.nullcontext():
+        for k0, k1, data, valid in blocks():
+            data -= avg[:, None]
+            data[valid == 0] = 0
+            if w is None and k1 - k0 <= 1 << 24:
+                # counts of unmasked pairs are exact in float32
+                valid = valid.astype(np.float32)
+            wdata, wvalid = data, valid
+            if w is not None:
+                wdata, wvalid = data * w[k0:k1], valid * w[k0:k1]
+            if np.iscomplexobj(wdata):
+                wdata = wdata.conj()
+            if aweights is not None:
+                avalid = valid * (w[k0:k1] * aweights[k0:k1])
+
+            def rowblock(i0, i1):
+                # products of the rows i0:i1 with the rows i0: are computed
+                # as a diagonal block, for which BLAS uses a symmetric
+                # product when both operands are the same, and the block to
+                # its right
+                def add(out, a, b):
+                    out[i0:i1, i0:i1] += np.dot(a[i0:i1], b[i0:i1].T)
+                    out[i0:i1, i1:] += np.dot(a[i0:i1], b[i1:].T)
+                add(c, data, wdata)
+                add(w_sum, wvalid, valid)
+                if count is not None:
+                    add(count, valid, valid)
+                if a_sum is not None:
+                    add(a_sum, avalid, valid)
+
+            if executor is not None:
+                list(executor.map(lambda t: rowblock(*t), tasks))
+            else:
+                pool_map(rowblock, tasks, nvars * nvars * (k1 - k0))
+
+    # fill in the lower triangles from the upper ones, by blocks of rows
+    tril = np.tri(rows, k=-1, dtype=bool)
+    for mat in (c, w_sum, count, a_sum):
+        if mat is None:
+            continue
+        for i0, i1 in tasks:
+            upper, diag = mat[i0:i1, i1:].T, mat[i0:i1, i0:i1]
+            if np.iscomplexobj(mat):
+                upper, diag_t = upper.conj(), diag.T.conj()
+            else:
+                diag_t = diag.T.copy()
+            mat[i1:, i0:i1] = upper
+            np.copyto(diag, diag_t, where=tril[:i1 - i0, :i1 - i0])
+
+    # pairs without common observations are masked, and do not warn
+    mask = (w_sum if count is None else count) == 0
+    del count
+
+    # Normalize by blocks of rows, turning w_sum into the normalization
+    # factor in place
+    nonpos = False
+    for i0, i1 in tasks:
+        fact = w_sum[i0:i1]
+        if ddof != 0 and aweights is None:
+            fact -= ddof
+        elif ddof != 0:
+            corr = a_sum[i0:i1]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                corr /= fact
+            corr *= ddof
+            fact -= corr
+        fact[mask[i0:i1]] = 1
+        nonpos_fact = fact <= 0
+        if nonpos_fact.any():
+            nonpos = True
+            fact[nonpos_fact] = 0.0
+        np.true_divide(c[i0:i1], fact, out=c[i0:i1])
+    if nonpos:
         warnings.warn("Degrees of freedom <= 0 for slice",
                       RuntimeWarning, stacklevel=3)
-        fact[nonpos_fact] = X
 
-    c *= np.true_divide(1, fact)
-    return c.squeeze()
+    return cls(c, mask).squeeze()
 
 @implements(np.corrcoef, checked_args=('x', 'y'))
-def corrcoef(x, y=None, rowvar=True, bias=np._NoValue, ddof=np._NoValue):
+def corrcoef(x, y=None, rowvar=True, bias=np._NoValue, ddof=np._NoValue, *,
+             max_memory=1 << 28, workers=None):
+    """
+    Masked version of `np.corrcoef`. See `cov`, which computes the
+    covariance, for the keyword-only arguments.
+    """
     if bias is not np._NoValue or ddof is not np._NoValue:
         # 2015-03-15, 1.10
         warnings.warn('bias and ddof have no effect and are deprecated',
                       DeprecationWarning, stacklevel=3)
-    c = np.cov(x, y, rowvar)
+    c = cov(x, y, rowvar, max_memory=max_memory, workers=workers)
     try:
         d = np.diag(c)
     except ValueError:
@@ -2310,9 +2661,8 @@ def imag(a):
 
 @implements(np.ptp)
 def ptp(a, axis=None, out=None, keepdims=False):
-    return np.subtract(
-        np.maximum.reduce(a, axis, None, out, keepdims),
-        np.minimum.reduce(a, axis, None, None, keepdims), out)
+    amin, amax = minmax(a, axis, keepdims)
+    return np.subtract(amax, amin, out)
 
 @implements(np.take)
 def take(a, indices, axis=None, out=None, mode='raise'):
@@ -2346,51 +2696,98 @@ def put_along_axis(arr, indices, values, axis):
     np.put_along_axis(arr._mask, indices, mask, axis)
 
 @implements(np.apply_along_axis)
-def apply_along_axis(func1d, axis, arr, *args, **kwargs):
+def apply_along_axis(func1d, axis, arr, *args, vectorized=False, workers=None,
+                     **kwargs):
+    """
+    Masked version of `np.apply_along_axis`, with two extra keyword-only
+    arguments, which are not passed on to `func1d`:
+
+    vectorized : bool, optional
+        If True, `func1d` is called once, with a 2D MaskedArray whose rows
+        are all the 1D slices, and must return an array whose first axis
+        indexes the slices.
+    workers : int or concurrent.futures.Executor, optional
+        Split the slices across this many threads, or across the workers of
+        the given executor. For a `ProcessPoolExecutor` the work is
+        done by `parallel_map`, so `func1d` must be picklable.
+    """
     # handle negative axes
     cls = get_duck_cls(arr)
     nd = arr.ndim
     axis = normalize_axis_index(axis, nd)
 
-    # arr, with the iteration axis at the end
+    # arr, with the iteration axis at the end, as a 2d array of 1d slices
     in_dims = list(range(nd))
     inarr_view = np.transpose(arr, in_dims[:axis] + in_dims[axis+1:] + [axis])
-
-    # compute indices for the iteration axes, and append a trailing ellipsis to
-    # prevent 0d arrays decaying to scalars, which fixes gh-8642
-    inds = np.ndindex(inarr_view.shape[:-1])
-    inds = (ind + (Ellipsis,) for ind in inds)
-
-    # invoke the function on the first item
-    try:
-        ind0 = next(inds)
-    except StopIteration:
+    outer = inarr_view.shape[:-1]
+    nlanes = int(np.prod(outer))
+    if nlanes == 0:
         raise ValueError('Cannot apply_along_axis when any '
                          'iteration dimensions are 0')
-    res = func1d(inarr_view[ind0], *args, **kwargs)
+    lanes = np.reshape(inarr_view, (nlanes, inarr_view.shape[-1]))
+
+    if vectorized:
+        res = func1d(lanes, *args, **kwargs)
+        res = res if isinstance(res, MaskedArray) else cls(res)
+        if res.ndim == 0 or res.shape[0] != nlanes:
+            raise ValueError("vectorized func1d must return an array whose "
+                             "first axis has one element per 1d slice")
+    elif isinstance(workers, ProcessPoolExecutor):
+        func = functools.partial(_apply_lanes, func1d, args, kwargs, cls)
+        res = parallel_map(func, lanes, 0, workers)
+    else:
+        res = _apply_lanes(func1d, args, kwargs, cls, lanes, workers)
 
-    # build a buffer for storing evaluations of func1d.
-    # remove the requested axis, and add the new ones on the end.
-    # laid out so that each write is contiguous.
-    # for a tuple index inds, buff[inds] = func1d(inarr_view[inds])
-    buff = cls(np.empty(inarr_view.shape[:-1] + res.shape, res.dtype), False)
+    # buffer of evaluations of func1d: the requested axis is removed, and
+    # the result's axes are added on the end
+    buff = np.reshape(res, outer + res.shape[1:])
 
     # permutation of axes such that out = buff.transpose(buff_permute)
+    resnd = res.ndim - 1
     buff_dims = list(range(buff.ndim))
     buff_permute = (
         buff_dims[0 : axis] +
-        buff_dims[buff.ndim-res.ndim : buff.ndim] +
-        buff_dims[axis : buff.ndim-res.ndim]
+        buff_dims[buff.ndim-resnd : buff.ndim] +
+        buff_dims[axis : buff.ndim-resnd]
     )
 
-    # save the first result, then compute and save all remaining results
-    buff[ind0] = res
-    for ind in inds:
-        buff[ind] = func1d(inarr_view[ind], *args, **kwargs)
-
     # finally, rotate the inserted axes back to where they belong
     return transpose(buff, buff_permute)
 
+def _apply_lanes(func1d, args, kwargs, cls, lanes, workers=None):
+    # Apply func1d to each row of the 2d MaskedArray `lanes`, writing the
+    # results directly into preallocated data and mask arrays. The rows are
+    # constructed from the data and mask, bypassing MaskedArray indexing.
+    data, mask = lanes._data, lanes._mask
+    res = func1d(cls(data[0], mask[0]), *args, **kwargs)
+    res = res if isinstance(res, MaskedArray) else cls(res)
+    outdata = np.empty((len(data),) + res.shape, res.dtype)
+    outmask = np.empty((len(data),) + res.shape, bool)
+    outdata[0], outmask[0] = res._data, res._mask
+
+    def run(start, stop):
+        for i in range(start, stop):
+            r = func1d(cls(data[i], mask[i]), *args, **kwargs)
+            outdata[i], outmask[i] = getdata(r), getmask(r)
+
+    executor, nworkers = workers, os.cpu_count()
+    if workers is not None and not isinstance(workers, Executor):
+        executor = ThreadPoolExecutor(workers) if workers > 1 else None
+        nworkers = workers
+    if executor is None:
+        run(1, len(data))
+    else:
+        try:
+            nblocks = builtins.min(nworkers * 4, len(data) - 1)
+            bounds = np.linspace(1, len(data), nblocks + 1).astype(np.intp)
+            for f in [executor.submit(run, start, stop)
+                      for start, stop in zip(bounds[:-1], bounds[1:])]:
+                f.result()
+        finally:
+            if executor is not workers:
+                executor.shutdown()
+    return cls(outdata, outmask)
+
 @implements(np.apply_over_axes)
 def apply_over_axes(func, a, axes):
     val = a
@@ -2998,6 +3395,7 @@ def _unique1d(ar, return_index=False, return_inverse=False,
     else:
         ar.sort()
         aux = ar
+        perm = None
     # argsort has put mask at end. As implementation hack, use the fact
     # that argsort/argsort used .filled(minval, view=True)
     mask = np.empty(aux.shape, dtype=np.bool_)
@@ -3009,18 +3407,8 @@ def _unique1d(ar, return_index=False, return_inverse=False,
         mask[-n_masked:] = False
         mask[-n_masked] = True
 
-    ret = (aux[mask],)
-    if return_index:
-        ret += (perm[mask],)
-    if return_inverse:
-        imask = np.cumsum(mask) - 1
-        inv_idx = np.empty(mask.shape, dtype=np.intp)
-        inv_idx[perm] = imask
-        ret += (inv_idx,)
-    if return_counts:
-        idx = np.concatenate(np.nonzero(mask) + ([mask.size],))
-        ret += (np.diff(idx),)
-    return ret
+    return (aux[mask],) + unique_outputs(perm, mask, return_index,
+                                         return_inverse, return_counts)
 
 def _unpack_tuple(x):
     """ Unpacks one-element tuples for use as return values """
@@ -3038,9 +3426,149 @@ def unique(ar, return_index=False, return_inverse=False,
         ret = _unique1d(ar, return_index, return_inverse, return_counts)
         return _unpack_tuple(ret)
 
-    # TODO: this might be implemented using lexsort
-    raise NotImplementedError('axis argument to unique is not supported '
-                              'for MaskedArray')
+    ar = as_duck_cls(ar, base=MaskedArray)
+    axis = normalize_axis_index(axis, ar.ndim)
+    ar = np.moveaxis(ar, axis, 0)
+    shape = ar.shape
+    rows = np.reshape(ar, (shape[0], -1))
+    ret = _unique_rows(rows, return_index, return_inverse, return_counts)
+    u = np.moveaxis(np.reshape(ret[0], (-1,) + shape[1:]), 0, axis)
+    return _unpack_tuple((u,) + ret[1:])
+
+def _unique_rows(ar, return_index=False, return_inverse=False,
+                 return_counts=False):
+    """
+    Find the unique rows of a 2d MaskedArray, where rows are equal if they
+    have the same mask and the same unmasked data.
+
+    The rows are sorted with a masked lexsort, whose keys are each column's
+    mask and filled data, with the first column most significant. Equal
+    rows are then adjacent.
+    """
+    data, mask = ar.filled(0), ar._mask
+    keys = [k for j in range(ar.shape[1] - 1, -1, -1)
+              for k in (data[:, j], mask[:, j])]
+    perm = np.lexsort(keys) if keys else np.arange(len(ar))
+    data, mask = data[perm], mask[perm]
+
+    flag = np.empty(len(ar), dtype=bool)
+    flag[:1] = True
+    flag[1:] = np.any((data[1:] != data[:-1]) | (mask[1:] != mask[:-1]),
+                      axis=1)
+
+    # lexsort is stable, so the index is of the first occurrence
+    return (type(ar)(data[flag], mask[flag]),) + unique_outputs(
+                perm, flag, return_index, return_inverse, return_counts)
+
+# Set operations. Masked elements are treated as a distinct value, as in
+# `unique`: a masked element is "in" an array containing a masked element.
+
+def _in_values(ar, test):
+    """
+    Return whether each element of the ndarray `ar` is in the ndarray
+    `test`.
+
+    For integer arrays whose values span a range not much larger than their
+    sizes this uses a lookup table, otherwise a binary search of the sorted
+    test values.
+    """
+    if ar.size == 0 or test.size == 0:
+        return np.zeros(ar.shape, dtype=bool)
+
+    if (np.can_cast(ar.dtype, np.intp) and np.can_cast(test.dtype, np.intp)
+            and ar.dtype.kind in 'biu' and test.dtype.kind in 'biu'):
+        test = test.astype(np.intp, copy=False)
+        lo, hi = int(test.min()), int(test.max())
+        if hi - lo <= 6 * (ar.size + test.size):
+            table = np.zeros(hi - lo + 1, dtype=bool)
+            table[test - lo] = True
+            ar = ar.astype(np.intp, copy=False)
+            inrange = (ar >= lo) & (ar <= hi)
+            result = np.zeros(ar.shape, dtype=bool)
+            result[inrange] = table[ar[inrange] - lo]
+            return result
+
+    test = np.sort(test.ravel())
+    pos = np.searchsorted(test, ar)
+    np.minimum(pos, len(test) - 1, out=pos)
+    return test[pos] == ar
+
+def _sorted_unique(ar, assume_unique=False):
+    # unique elements of a MaskedArray and their first indices in ar.ravel(),
+    # sorted with any masked element last
+    if not assume_unique:
+        return _unique1d(ar, return_index=True)
+    ar = ar.ravel()
+    perm = ar.argsort(kind='mergesort')
+    return ar[perm], perm
+
+def _sorted_lookup(ar, test):
+    """
+    For 1d MaskedArrays `ar` and `test`, where `test` is sorted and unique
+    as returned by `_sorted_unique`, return whether each element of `ar` is
+    in `test` and, where it is, its position in `test`.
+    """
+    nvalid = len(test) - int(np.sum(test._mask))
+    values = test._data[:nvalid]
+    pos = np.searchsorted(values, ar._data)
+    if nvalid:
+        found = values[np.minimum(pos, nvalid - 1)] == ar._data
+        found &= pos < nvalid
+    else:
+        found = np.zeros(ar.shape, dtype=bool)
+    found[ar._mask] = nvalid < len(test)
+    pos[ar._mask] = nvalid
+    return found, pos
+
+@implements(np.isin)
+def isin(element, test_elements, assume_unique=False, invert=False):
+    element, test_elements = as_duck_cls(element, test_elements,
+                                         base=MaskedArray, single=False)
+    test = test_elements._data[~test_elements._mask]
+    if not element._mask.any():
+        result = _in_values(element._data, test)
+    else:
+        valid = ~element._mask
+        result = np.empty(element.shape, dtype=bool)
+        result[valid] = _in_values(element._data[valid], test)
+        result[element._mask] = test_elements._mask.any()
+    if invert:
+        np.logical_not(result, out=result)
+    return result
+
+@implements(np.in1d)
+def in1d(ar1, ar2, assume_unique=False, invert=False):
+    return isin(np.ravel(ar1), ar2, assume_unique, invert)
+
+@implements(np.intersect1d)
+def intersect1d(ar1, ar2, assume_unique=False, return_indices=False):
+    ar1, ar2 = as_duck_cls(ar1, ar2, base=MaskedArray, single=False)
+    u1, ind1 = _sorted_unique(ar1, assume_unique)
+    u2, ind2 = _sorted_unique(ar2, assume_unique)
+    found, pos = _sorted_lookup(u1, u2)
+    result = u1[found]
+    if return_indices:
+        return result, ind1[found], ind2[pos[found]]
+    return result
+
+@implements(np.union1d)
+def union1d(ar1, ar2):
+    return _unique1d(np.concatenate((np.ravel(ar1), np.ravel(ar2))))[0]
+
+@implements(np.setdiff1d)
+def setdiff1d(ar1, ar2, assume_unique=False):
+    ar1 = as_duck_cls(ar1, base=MaskedArray)
+    ar1 = ar1.ravel() if assume_unique else _unique1d(ar1)[0]
+    return ar1[isin(ar1, ar2, invert=True)]
+
+@implements(np.setxor1d)
+def setxor1d(ar1, ar2, assume_unique=False):
+    ar1, ar2 = as_duck_cls(ar1, ar2, base=MaskedArray, single=False)
+    if not assume_unique:
+        ar1, ar2 = _unique1d(ar1)[0], _unique1d(ar2)[0]
+    only1 = ar1[isin(ar1, ar2, invert=True)]
+    only2 = ar2[isin(ar2, ar1, invert=True)]
+    return sort(np.concatenate((only1.ravel(), only2.ravel())))
 
 @implements(np.can_cast, checked_args=())
 def can_cast(from_, to, casting='safe'):
@@ -3101,6 +3629,8 @@ def histogram(a, bins=10, range=None, normed=None, weights=None,
         weights = as_duck_cls(weights, base=MaskedArray)
     if isinstance(weights, (MaskedArray, MaskedScalar)):
         weights = weights.filled()
+    if normed is None and not isinstance(bins, str):
+        return chunked_histogram(a, bins, range, weights, density)
 
     a = a.ravel()
     keep = ~a._mask
@@ -3143,6 +3673,9 @@ def histogramdd(sample, bins=10, range=None, normed=None, weights=None,
         # Sample is a sequence of 1D arrays.
         sample = atleast_2d(sample).T
         N, D = sample.shape
+    if normed is None:
+        return chunked_histogram(sample, bins, range, weights, density,
+                                 ndim=D)
 
     # drop any samples containing a masked value
     keep = ~np.any(sample._mask, axis=1)
@@ -3773,6 +4306,105 @@ def unwrap(p, discont=np.pi, axis=-1):
 
     return up
 
+@implements(np.polyval)
+def polyval(p, x):
+    if isinstance(p, np.poly1d):
+        p = p.coeffs
+    p, x = as_duck_cls(p, x, base=MaskedArray)
+    y = np.zeros_like(x)
+    for pv in p:
+        y = y * x + pv
+    return y
+
+@implements(np.polyfit)
+def polyfit(x, y, deg, rcond=None, full=False, w=None, cov=False, *,
+            axis=0):
+    """
+    Masked version of `np.polyfit`. Samples where x, y or w are masked
+    have zero weight.
+
+    If y has more than one dimension, a polynomial is fit to each lane of
+    y along `axis`, which is a keyword-only argument only accepted when
+    calling this function directly (`np.polyfit` fits along axis 0). The
+    fits are solved in batches by least squares as in `np.polyfit`, with
+    `rcond` applying to each lane, and `full` and `cov` are not supported.
+    The coefficients replace the samples along `axis` of the result, and
+    are masked for lanes with too few unmasked samples to determine them.
+    """
+    x, y = as_duck_cls(x, y, base=MaskedArray)
+    deg = operator.index(deg)
+    if deg < 0:
+        raise ValueError("expected deg >= 0")
+    if x.ndim != 1:
+        raise TypeError("expected 1D vector for x")
+    if x.size == 0:
+        raise TypeError("expected non-empty vector for x")
+    if y.ndim < 1:
+        raise TypeError("expected 1D or more vector for y")
+    axis = normalize_axis_index(axis, y.ndim)
+    if y.shape[axis] != x.shape[0]:
+        raise TypeError("expected x and y to have same length")
+
+    keep = ~x._mask
+    if w is not None:
+        w = as_duck_cls(w, base=MaskedArray)
+        if w.ndim != 1:
+            raise TypeError("expected a 1-d array for weights")
+        if w.shape[0] != x.shape[0]:
+            raise TypeError("expected w and y to have the same length")
+        keep &= ~w._mask
+
+    if y.ndim == 1:
+        keep &= ~y._mask
+        return np.polyfit(x._data[keep], y._data[keep], deg, rcond, full,
+                          None if w is None else w._data[keep], cov)
+    if full or cov:
+        raise ValueError("full and cov are only supported for 1d y")
+
+    # lanes of y as the columns of a 2d array, with the weights of their
+    # samples
+    ydata = np.moveaxis(y._data, axis, 0)
+    shape = ydata.shape[1:]
+    ydata = ydata.reshape(len(x), -1)
+    weight = ~np.moveaxis(y._mask, axis, 0).reshape(len(x), -1)
+    weight &= keep[:, None]
+    count = np.count_nonzero(weight, axis=0)
+    ydata = np.where(weight, ydata, 0)
+    weight = weight.astype(np.float64)
+    if w is not None:
+        weight *= np.where(keep, w._data, 0)[:, None]
+    if rcond is None:
+        rcond = count * np.finfo(np.float64).eps
+    rcond = np.broadcast_to(rcond, count.shape)
+
+    # As in np.polyfit, solve the weighted least squares problem of each
+    # lane with the columns of its Vandermonde matrix scaled to unit norm,
+    # by SVD so that singular values below rcond are cut off. The lanes
+    # are solved in blocks which bound the memory of the stacked matrices.
+    ndeg = deg + 1
+    van = np.vander(np.where(keep, x._data, 0).astype(np.float64), ndeg)
+    nlanes = ydata.shape[1]
+    coef = np.empty((nlanes, ndeg))
+    step = builtins.max((1 << 20) // (len(x) * ndeg), 1)
+    for j0 in range(0, nlanes, step):
+        wj = weight[:, j0:j0 + step].T
+        lhs = wj[:, :, None] * van
+        rhs = wj * ydata[:, j0:j0 + step].T
+        scale = np.sqrt(np.einsum('ijk,ijk->ik', lhs, lhs))
+        scale[scale == 0] = 1
+        lhs /= scale[:, None, :]
+        u, sv, vt = np.linalg.svd(lhs, full_matrices=False)
+        cut = sv > rcond[j0:j0 + step, None] * sv[:, :1]
+        sinv = np.divide(1, sv, out=np.zeros_like(sv), where=cut)
+        c = np.matmul(u.swapaxes(1, 2), rhs[..., None])[..., 0] * sinv
+        c = np.matmul(vt.swapaxes(1, 2), c[..., None])[..., 0]
+        coef[j0:j0 + step] = c / scale
+
+    bad = count < ndeg
+    coef = coef.T.reshape((ndeg,) + shape)
+    mask = np.broadcast_to(bad.reshape(shape), coef.shape)
+    return type(y)(np.moveaxis(coef, 0, axis), np.moveaxis(mask, 0, axis))
+
 
 
     # Deprecated, don't implement
@@ -3824,18 +4456,10 @@ def unwrap(p, discont=np.pi, axis=-1):
     #@implements(np.roots)
     #@implements(np.polyint)
     #@implements(np.polyder)
-    #@implements(np.polyfit)
-    #@implements(np.polyval)
     #@implements(np.polyadd)
     #@implements(np.polysub)
     #@implements(np.polymul)
     #@implements(np.polydiv)
-    #@implements(np.intersect1d)
-    #@implements(np.setxor1d)
-    #@implements(np.in1d)
-    #@implements(np.isin)
-    #@implements(np.union1d)
-    #@implements(np.setdiff1d)
     #@implements(np.fv)
     #@implements(np.pmt)
     #@implements(np.nper)
@@ -3852,3 +4476,952 @@ def unwrap(p, discont=np.pi, axis=-1):
     #@implements(np.savez_compressed)
     #@implements(np.savetxt)
 
+################################################################################
+#                       Masked-specific functions
+################################################################################
+
+# Moving-window reductions. Windows are the length-`window` slices along an
+# axis, as for `np.lib.stride_tricks.sliding_window_view`, so the output has
+# length n - window + 1 along the axis. All are O(n) in the window size:
+# sums use differences of cumulative sums, and min/max use the van Herk/Gil-
+# Werman algorithm of block-wise prefix and suffix extrema.
+
+def _rolling_setup(marr, window, axis):
+    # returns the array class and the data and validity with axis moved last
+    marr = as_duck_cls(marr, base=MaskedArray)
+    axis = normalize_axis_index(axis, marr.ndim)
+    n = marr.shape[axis]
+    if not 1 <= window <= n:
+        raise ValueError("window must be between 1 and the axis length")
+    data = np.moveaxis(marr._data, axis, -1)
+    valid = ~np.moveaxis(marr._mask, axis, -1)
+    return type(marr), marr, data, valid, axis
+
+def _window_sums(x, window, dtype=None):
+    # sums of all length-window windows along the last axis of x
+    s = np.cumsum(x, axis=-1, dtype=dtype)
+    out = s[..., window-1:].copy()
+    out[..., 1:] -= s[..., :-window]
+    return out
+
+def _inexact_dtype(dtype):
+    # dtype of the mean of an array of the given dtype
+    return dtype if issubclass(dtype.type, np.inexact) else np.dtype('f8')
+
+def _rolling_result(cls, data, mask, axis):
+    return cls(np.moveaxis(data, -1, axis), np.moveaxis(mask, -1, axis))
+
+def rolling_count(marr, window, axis=-1):
+    """
+    Number of unmasked elements in each length-`window` window along `axis`.
+
+    Returns
+    -------
+    count : ndarray
+        Integer array, of length n - window + 1 along `axis`.
+    """
+    cls, marr, data, valid, axis = _rolling_setup(marr, window, axis)
+    return np.moveaxis(_window_sums(valid, window, np.intp), -1, axis)
+
+def rolling_sum(marr, window, axis=-1, min_count=1):
+    """
+    Sum of the unmasked elements in each length-`window` window along
+    `axis`.
+
+    Parameters
+    ----------
+    marr : MaskedArray
+        Input array.
+    window : int
+        Window length.
+    axis : int, optional
+        Axis along which to slide the window. Default is the last axis.
+    min_count : int, optional
+        Windows with fewer than this many unmasked elements are masked in
+        the result.
+
+    Returns
+    -------
+    out : MaskedArray
+        Array of length n - window + 1 along `axis`.
+
+    Notes
+    -----
+    The sums are computed as differences of cumulative sums, so for floating
+    point data the rounding error grows with the distance from the start of
+    the axis rather than with the window length.
+    """
+    cls, marr, data, valid, axis = _rolling_setup(marr, window, axis)
+    count = _window_sums(valid, window, np.intp)
+    total = _window_sums(np.where(valid, data, 0), window,
+                         np.sum(data[..., :0]).dtype)
+    return _rolling_result(cls, total, count < min_count, axis)
+
+def rolling_mean(marr, window, axis=-1, min_count=1):
+    """
+    Mean of the unmasked elements in each length-`window` window along
+    `axis`. See `rolling_sum` for the arguments. Windows with no unmasked
+    elements are always masked.
+    """
+    cls, marr, data, valid, axis = _rolling_setup(marr, window, axis)
+    count = _window_sums(valid, window, np.intp)
+    total = _window_sums(np.where(valid, data, 0), window,
+                         _inexact_dtype(data.dtype))
+    mask = count < builtins.max(min_count, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return _rolling_result(cls, total / np.where(mask, 1, count), mask,
+                               axis)
+
+def rolling_var(marr, window, axis=-1, ddof=0, min_count=1):
+    """
+    Variance of the unmasked elements in each length-`window` window along
+    `axis`. See `rolling_sum` for the arguments. `ddof` is as for `np.var`.
+    Windows with at most `ddof` unmasked elements are always masked.
+
+    To limit cancellation error, each lane is first shifted by its mean.
+    """
+    cls, marr, data, valid, axis = _rolling_setup(marr, window, axis)
+    count = _window_sums(valid, window, np.intp)
+    x = np.where(valid, data, 0).astype(_inexact_dtype(data.dtype))
+    nvalid = np.sum(valid, axis=-1, keepdims=True)
+    x -= np.sum(x, axis=-1, keepdims=True) / np.maximum(nvalid, 1)
+    x[~valid] = 0
+    s1 = _window_sums(x, window)
+    s2 = _window_sums(np.abs(x)**2, window)
+    mask = count < builtins.max(min_count, ddof + 1)
+    n = np.where(mask, ddof + 1, count)
+    var = np.maximum((s2 - np.abs(s1)**2 / n) / (n - ddof), 0)
+    return _rolling_result(cls, var, mask, axis)
+
+def _rolling_extreme(marr, window, axis, min_count, ufunc, minmax):
+    cls, marr, data, valid, axis = _rolling_setup(marr, window, axis)
+    fill = marr._get_fill_value(np._NoValue, minmax)
+    count = _window_sums(valid, window, np.intp)
+    data = np.where(valid, data, fill)
+
+    # pad to a whole number of blocks of length window, then compute the
+    # running extremum from the start (g) and end (h) of each block. Any
+    # window covers the end of one block and the start of the next.
+    n = data.shape[-1]
+    nblocks = -(-n // window)
+    pad = nblocks*window - n
+    if pad:
+        data = np.concatenate([data, np.full(data.shape[:-1] + (pad,), fill,
+                                             data.dtype)], axis=-1)
+    blocks = data.reshape(data.shape[:-1] + (nblocks, window))
+    g = ufunc.accumulate(blocks, axis=-1).reshape(data.shape)
+    h = ufunc.accumulate(blocks[..., ::-1], axis=-1)[..., ::-1]
+    h = h.reshape(data.shape)
+
+    m = n - window + 1
+    result = ufunc(h[..., :m], g[..., window-1:window-1+m])
+    return _rolling_result(cls, result, count < builtins.max(min_count, 1),
+                           axis)
+
+def rolling_min(marr, window, axis=-1, min_count=1):
+    """
+    Minimum of the unmasked elements in each length-`window` window along
+    `axis`. See `rolling_sum` for the arguments. Windows with no unmasked
+    elements are always masked.
+    """
+    return _rolling_extreme(marr, window, axis, min_count, np.minimum, 'max')
+
+def rolling_max(marr, window, axis=-1, min_count=1):
+    """
+    Maximum of the unmasked elements in each length-`window` window along
+    `axis`. See `rolling_sum` for the arguments. Windows with no unmasked
+    elements are always masked.
+    """
+    return _rolling_extreme(marr, window, axis, min_count, np.maximum, 'min')
+
+# Filling of masked gaps. For each position, the index of the nearest
+# unmasked element before (or after) it along the axis is found by a running
+# maximum (or minimum) of the unmasked positions' indices, after which all
+# lanes are filled by one gather.
+
+def _fill_source(valid, backward):
+    # index of the nearest valid element at or before (after) each position
+    # along the last axis, or -1 (n) where there is none
+    n = valid.shape[-1]
+    pos = np.arange(n)
+    if backward:
+        idx = np.where(valid[..., ::-1], pos[::-1], n)
+        return np.minimum.accumulate(idx, axis=-1)[..., ::-1]
+    return np.maximum.accumulate(np.where(valid, pos, -1), axis=-1)
+
+def _gather_lanes(data, idx):
+    # data[..., idx] lane by lane, for idx of the same shape as data. This
+    # is take_along_axis, done as one flat take, which is faster.
+    n = data.shape[-1]
+    data = np.ascontiguousarray(data).reshape(-1, n)
+    flat = idx.reshape(-1, n) + (np.arange(len(data)) * n)[:, None]
+    return np.take(data.reshape(-1), flat).reshape(idx.shape)
+
+def _fill(marr, axis, limit, backward):
+    marr = as_duck_cls(marr, base=MaskedArray)
+    axis = normalize_axis_index(axis, marr.ndim)
+    data = np.moveaxis(marr._data, axis, -1)
+    valid = ~np.moveaxis(marr._mask, axis, -1)
+
+    n = valid.shape[-1]
+    src = _fill_source(valid, backward)
+    found = (src < n) if backward else (src >= 0)
+    if limit is not None:
+        found &= np.abs(src - np.arange(n)) <= limit
+    np.clip(src, 0, builtins.max(n - 1, 0), out=src)
+    result = _gather_lanes(data, src)
+    return type(marr)(np.moveaxis(result, -1, axis),
+                      np.moveaxis(~found, -1, axis))
+
+def ffill(marr, axis=-1, limit=None):
+    """
+    Fill masked elements with the last unmasked value before them along
+    `axis` (last observation carried forward).
+
+    Parameters
+    ----------
+    marr : MaskedArray
+        Input array.
+    axis : int, optional
+        Axis along which to fill. Default is the last axis.
+    limit : int, optional
+        Maximum number of consecutive masked elements to fill after an
+        unmasked one. Elements further into a gap stay masked.
+
+    Returns
+    -------
+    out : MaskedArray
+        The filled array. Elements with no unmasked value before them stay
+        masked.
+    """
+    return _fill(marr, axis, limit, backward=False)
+
+def bfill(marr, axis=-1, limit=None):
+    """
+    Fill masked elements with the next unmasked value after them along
+    `axis`. See `ffill`.
+    """
+    return _fill(marr, axis, limit, backward=True)
+
+def interpolate_masked(marr, axis=-1, limit=None):
+    """
+    Fill masked elements by linear interpolation between the nearest
+    unmasked elements before and after them along `axis`, with the
+    elements treated as equally spaced.
+
+    Parameters
+    ----------
+    marr : MaskedArray
+        Input array.
+    axis : int, optional
+        Axis along which to interpolate. Default is the last axis.
+    limit : int, optional
+        Gaps of more than this many consecutive masked elements are left
+        masked.
+
+    Returns
+    -------
+    out : MaskedArray
+        The interpolated array, of floating point type. Masked elements at
+        the ends of the axis are not extrapolated, and stay masked.
+    """
+    marr = as_duck_cls(marr, base=MaskedArray)
+    axis = normalize_axis_index(axis, marr.ndim)
+    data = np.moveaxis(marr._data, axis, -1)
+    valid = ~np.moveaxis(marr._mask, axis, -1)
+
+    n = valid.shape[-1]
+    pos = np.arange(n)
+    prev = _fill_source(valid, backward=False)
+    nxt = _fill_source(valid, backward=True)
+    found = (prev >= 0) & (nxt < n)
+    if limit is not None:
+        found &= (nxt - prev <= limit + 1) | valid
+    np.maximum(prev, 0, out=prev)
+    np.minimum(nxt, builtins.max(n - 1, 0), out=nxt)
+
+    # result = fp + (fn - fp) * (pos - prev) / (nxt - prev)
+    dtype = _inexact_dtype(data.dtype)
+    fp = _gather_lanes(data, prev).astype(dtype, copy=False)
+    result = _gather_lanes(data, nxt).astype(dtype, copy=False)
+    result -= fp
+    span = nxt - prev
+    frac = np.subtract(pos, prev, out=prev).astype(dtype)
+    np.divide(frac, span, out=frac, where=span != 0)
+    result *= frac
+    result += fp
+    return type(marr)(np.moveaxis(result, -1, axis),
+                      np.moveaxis(~found, -1, axis))
+
+def grouped_reduce(values, labels, op, ngroups=None):
+    """
+    Reduce the unmasked values in each group given by integer labels.
+
+    Parameters
+    ----------
+    values : MaskedArray
+        1D array of length n, or 2D array of shape (n, k) whose k columns
+        are reduced independently.
+    labels : array-like of int
+        Group label, in ``range(ngroups)``, of each of the n rows of
+        `values`. Need not be sorted. Rows with masked labels are ignored.
+    op : {'sum', 'mean', 'count', 'min', 'max'}
+        The reduction.
+    ngroups : int, optional
+        Number of groups. Defaults to the largest label plus one.
+
+    Returns
+    -------
+    out : MaskedArray
+        Array of shape (ngroups,) or (ngroups, k). Groups with no unmasked
+        values are masked, except for 'count', which is never masked.
+
+    Notes
+    -----
+    'sum', 'mean' and 'count' use `np.bincount`, which accumulates in
+    float64, so integer sums are exact up to 2**53. 'min' and 'max' sort the
+    unmasked values by group and use `reduceat`.
+    """
+    if op not in ('sum', 'mean', 'count', 'min', 'max'):
+        raise ValueError("unknown op {!r}".format(op))
+    values = as_duck_cls(values, base=MaskedArray)
+    if values.ndim not in (1, 2):
+        raise ValueError("values must be 1D or 2D")
+    labels = as_duck_cls(labels, base=MaskedArray)
+    if labels.shape != values.shape[:1]:
+        raise ValueError("labels must have one element per row of values")
+    lab = labels.filled(0).astype(np.intp, copy=False)
+    if lab.size and lab.min() < 0:
+        raise ValueError("labels must be non-negative")
+    if ngroups is None:
+        ngroups = int(lab.max()) + 1 if lab.size else 0
+    elif np.max(lab, where=~labels._mask, initial=-1) >= ngroups:
+        raise ValueError("labels must be less than ngroups")
+
+    # flatten to one label per element, with each column in its own groups
+    data, valid = values._data, ~values._mask
+    k = 1 if values.ndim == 1 else values.shape[1]
+    keys = lab[:, None] * k + np.arange(k) if values.ndim == 2 else lab
+    valid = valid & ~labels._mask.reshape((-1,) + (1,)*(values.ndim - 1))
+    keys, data = keys[valid], data[valid]
+    shape = (ngroups,) + values.shape[1:]
+    count = np.bincount(keys, minlength=ngroups*k).reshape(shape)
+
+    if op == 'count':
+        return type(values)(count)
+    empty = count == 0
+
+    if op in ('sum', 'mean'):
+        def bincount(w):
+            return np.bincount(keys, w, ngroups*k).reshape(shape)
+        if np.iscomplexobj(data):
+            total = bincount(data.real) + 1j*bincount(data.imag)
+        else:
+            total = bincount(data)
+        if op == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return type(values)(total / np.where(empty, 1, count), empty)
+        dtype = np.sum(data[:0]).dtype
+        if dtype.kind in 'iu':
+            total = np.rint(total)
+        return type(values)(total.astype(dtype, copy=False), empty)
+
+    order = np.argsort(keys, kind='stable')
+    keys, data = keys[order], data[order]
+    starts = np.flatnonzero(np.diff(keys, prepend=-1))
+    ufunc = np.minimum if op == 'min' else np.maximum
+    result = np.zeros(ngroups*k, data.dtype)
+    if len(starts):
+        result[keys[starts]] = ufunc.reduceat(data, starts)
+    return type(values)(result.reshape(shape), empty)
+
+def minmax(marr, axis=None, keepdims=False):
+    """
+    Return the minimum and maximum of the unmasked elements along an axis.
+
+    Both are computed together in one pass over the data and mask, in
+    blocks which fit in the CPU cache, without filling the input.
+
+    Parameters
+    ----------
+    marr : MaskedArray
+        Input array.
+    axis : None or int or tuple of ints, optional
+        Axis or axes to reduce, all by default.
+    keepdims : bool, optional
+        As for `np.min`.
+
+    Returns
+    -------
+    min, max : MaskedArray or MaskedScalar
+        The extremes, masked where all elements of a lane are masked.
+    """
+    marr = as_duck_cls(marr, base=MaskedArray)
+    amin, amax, empty = blocked_minmax(marr._data, axis, marr._mask,
+                                       keepdims)
+    cls = type(marr)
+    return (maskedarray_or_scalar(amin, empty, cls=cls),
+            maskedarray_or_scalar(amax, empty, cls=cls))
+
+def topk(marr, k, axis=-1, largest=True, sorted=True):
+    """
+    Return the k largest (or smallest) unmasked elements along an axis.
+
+    Masked elements are only returned for lanes with fewer than k unmasked
+    elements, after all of the unmasked ones. NaN counts as larger than
+    any other value, as in `np.sort`.
+
+    Parameters
+    ----------
+    marr : MaskedArray
+        Input array.
+    k : int
+        Number of elements to return from each lane.
+    axis : int, optional
+        Axis along which to select. Default is the last axis.
+    largest : bool, optional
+        If True return the largest elements, otherwise the smallest.
+    sorted : bool, optional
+        If True the elements are returned in order, largest (or smallest)
+        first. Otherwise their order is unspecified.
+
+    Returns
+    -------
+    values : MaskedArray
+        The selected elements, with `k` elements along `axis`.
+    indices : ndarray
+        Their indices along `axis` in `marr`.
+    """
+    marr = as_duck_cls(marr, base=MaskedArray)
+    axis = normalize_axis_index(axis, marr.ndim)
+    n = marr.shape[axis]
+    if not 0 <= k <= n:
+        raise ValueError("k must be between 0 and {}".format(n))
+
+    # a single partition of the data with masked elements filled by the
+    # least favourable value. Ties between the fill value and unmasked
+    # elements can put masked elements in the selection, but then only
+    # in lanes where it is needed, so only those lanes are corrected.
+    data = np.moveaxis(marr._data, axis, -1)
+    mask = np.moveaxis(marr._mask, axis, -1)
+    filled = np.moveaxis(marr.filled(minmax='min' if largest else 'max',
+                                     view=1), axis, -1)
+    if 0 < k < n:
+        kth = n - k if largest else k - 1
+        inds = np.argpartition(filled, kth, axis=-1)
+        inds = inds[..., n - k:] if largest else inds[..., :k]
+    else:
+        inds = np.broadcast_to(np.arange(n - k if largest else 0,
+                                         n if largest else k),
+                               data.shape[:-1] + (k,)).copy()
+
+    if sorted and k > 1:
+        vals = np.take_along_axis(filled, inds, axis=-1)
+        order = np.argsort(vals, axis=-1)
+        if largest:
+            order = order[..., ::-1]
+        inds = np.take_along_axis(inds, order, axis=-1)
+
+    bad = np.take_along_axis(mask, inds, axis=-1).any(axis=-1)
+    if bad.any():
+        # order the lanes fully, unmasked elements first: ascending order
+        # puts masked elements last, so for the largest read the unmasked
+        # elements backwards
+        sub = marr.__class__(data[bad], mask[bad])
+        order = argsort(sub, axis=-1)
+        nvalid = n - np.count_nonzero(mask[bad], axis=-1)[:, None]
+        pos = np.arange(k)
+        if largest:
+            pos = np.where(pos < nvalid, nvalid - 1 - pos, pos)
+        inds[bad] = np.take_along_axis(order, np.broadcast_to(
+                                       pos, (len(order), k)), axis=-1)
+
+    values = type(marr)(np.take_along_axis(data, inds, axis=-1),
+                        np.take_along_axis(mask, inds, axis=-1))
+    return (np.moveaxis(values, -1, axis), np.moveaxis(inds, -1, axis))
+
+class HistogramAccumulator:
+    """
+    Histogram with fixed bins, accumulated over chunks of data.
+
+    Each call to `update` adds the unmasked values of a chunk to the
+    counts, without copying the chunk's valid data in full. Accumulators
+    with the same bins, eg filled by different threads, can be combined
+    with `merge`. See also `chunked_histogram`.
+
+    Parameters
+    ----------
+    bins : int or sequence of scalars
+        Number of equal-width bins, which requires `range`, or the bin
+        edges, as for `np.histogram`. If `ndim` is given, a sequence of
+        `ndim` such values, or a single int for all dimensions, as for
+        `np.histogramdd`.
+    range : (float, float), optional
+        The range of equal-width bins, as for `np.histogram`. If `ndim` is
+        given, a sequence of `ndim` such pairs.
+    ndim : int, optional
+        If given, the histogram is multidimensional, and the chunks passed
+        to `update` are arrays of shape (N, ndim) holding N points. A point
+        with any masked coordinate is ignored.
+    dtype : data-type, optional
+        The dtype of the data, which determines the dtype of the edges of
+        equal-width bins as in `np.histogram`. Default float64.
+
+    Examples
+    --------
+    >>> h = HistogramAccumulator(100, range=(0, 1))
+    >>> for data, mask in marr.iter_chunks():
+    ...     h.update(MaskedArray(data, mask))
+    >>> hist, edges = h.result()
+    """
+
+    def __init__(self, bins=10, range=None, ndim=None, dtype=None):
+        dtype = np.dtype(np.float64 if dtype is None else dtype)
+        self.ndim = ndim
+        if ndim is None:
+            dims_bins, dims_range = [bins], [range]
+        else:
+            dims_bins = [bins]*ndim if np.isscalar(bins) else list(bins)
+            dims_range = [None]*ndim if range is None else list(range)
+            if len(dims_bins) != ndim or len(dims_range) != ndim:
+                raise ValueError("bins and range must have ndim entries")
+
+        # (edges, uniform) for each dimension. The edges of equal-width bins
+        # are computed by numpy, so that they match np.histogram exactly.
+        self._dims = []
+        for b, r in zip(dims_bins, dims_range):
+            if np.ndim(b) == 0:
+                if r is None:
+                    raise ValueError("range is required with a number of "
+                                     "bins")
+                if ndim is None:
+                    edges = np.histogram_bin_edges(np.empty(0, dtype), b, r)
+                else:
+                    edges = np.histogramdd(np.empty((0, 1), dtype), [b],
+                                           [r])[1][0]
+                self._dims.append((edges, True))
+            else:
+                edges = np.asarray(b)
+                if edges.ndim != 1 or np.any(edges[:-1] > edges[1:]):
+                    raise ValueError("bins must increase monotonically")
+                self._dims.append((edges, False))
+
+        self._shape = tuple(len(e) - 1 for e, _ in self._dims)
+        self._counts = np.zeros(int(np.prod(self._shape)), np.intp)
+        self._weight_dtype = None
+
+    @property
+    def edges(self):
+        """
+        The bin edges, or for a multidimensional histogram a list of the
+        edges of each dimension.
+        """
+        edges = [e for e, _ in self._dims]
+        return edges[0] if self.ndim is None else edges
+
+    def _bin_index(self, x, d):
+        # bin of each value of x in dimension d, for values in range
+        edges, uniform = self._dims[d]
+        n = len(edges) - 1
+        if not uniform:
+            idx = np.searchsorted(edges, x, side='right') - 1
+            idx[x == edges[-1]] = n - 1
+            return idx
+
+        # index arithmetic, corrected for rounding as in np.histogram
+        x = x.astype(edges.dtype, copy=False)
+        lo, hi = edges[0], edges[-1]
+        idx = ((x - lo) * (n / (hi - lo))).astype(np.intp)
+        idx[idx == n] -= 1
+        idx[x < edges[idx]] -= 1
+        idx[(x >= edges[idx + 1]) & (idx != n - 1)] += 1
+        return idx
+
+    def update(self, sample, weights=None):
+        """
+        Add the unmasked values of `sample` to the histogram.
+
+        Parameters
+        ----------
+        sample : MaskedArray or array-like
+            Values of any shape, or for a multidimensional histogram an
+            array of shape (N, ndim).
+        weights : array-like, optional
+            Weight of each value (or point), of the same shape as `sample`
+            (or of length N). Masked weights count as 0.
+
+        Returns
+        -------
+        self : HistogramAccumulator
+        """
+        sample = as_duck_cls(sample, base=MaskedArray)
+        if self.ndim is None:
+            data, mask = [sample._data.ravel()], sample._mask.ravel()
+        else:
+            if sample.ndim != 2 or sample.shape[1] != self.ndim:
+                raise ValueError("sample must have shape (N, ndim)")
+            data = [sample._data[:, d] for d in builtins.range(self.ndim)]
+            mask = np.any(sample._mask, axis=1)
+
+        keep = ~mask
+        for x, (edges, _) in zip(data, self._dims):
+            keep &= (x >= edges[0]) & (x <= edges[-1])
+
+        flat = self._bin_index(data[0][keep], 0)
+        for d, x in enumerate(data[1:], 1):
+            flat *= self._shape[d]
+            flat += self._bin_index(x[keep], d)
+
+        if weights is None:
+            self._counts += np.bincount(flat, minlength=len(self._counts))
+            return self
+
+        if isinstance(weights, (MaskedArray, MaskedScalar)):
+            weights = weights.filled(0)
+        weights = np.asarray(weights)
+        if self._weight_dtype is None:
+            self._weight_dtype = weights.dtype
+            self._counts = self._counts.astype(np.float64)
+        w = weights.ravel()[keep]
+        if np.iscomplexobj(w):
+            if self._counts.dtype.kind != 'c':
+                self._counts = self._counts.astype(np.complex128)
+            self._counts += 1j*np.bincount(flat, w.imag, len(self._counts))
+            w = w.real
+        self._counts += np.bincount(flat, w, len(self._counts))
+        return self
+
+    def merge(self, other):
+        """
+        Add the counts of another accumulator with the same bins.
+
+        Returns
+        -------
+        self : HistogramAccumulator
+        """
+        if self._shape != other._shape or not builtins.all(
+                np.array_equal(a, b) for (a, _), (b, _)
+                in zip(self._dims, other._dims)):
+            raise ValueError("histograms have different bins")
+        if other._weight_dtype is not None:
+            self._weight_dtype = np.result_type(other._weight_dtype,
+                                                self._weight_dtype or np.intp)
+        self._counts = self._counts + other._counts
+        return self
+
+    def result(self, density=False):
+        """
+        Return the histogram and bin edges, as `np.histogram` (or for a
+        multidimensional histogram, `np.histogramdd`) would.
+        """
+        hist = self._counts.reshape(self._shape)
+        if self._weight_dtype is not None:
+            if self._weight_dtype.kind in 'biu':
+                hist = np.rint(hist.real)
+            hist = hist.astype(self._weight_dtype)
+        if self.ndim is not None:
+            hist = hist.astype(float, casting='safe')
+        if density:
+            hist = hist / hist.sum()
+            for d, (edges, _) in enumerate(self._dims):
+                shape = [1]*len(self._shape)
+                shape[d] = -1
+                hist /= np.diff(edges).reshape(shape)
+        return hist, self.edges
+
+def chunked_histogram(a, bins=10, range=None, weights=None, density=None,
+                      ndim=None, rows=65536, workers=None):
+    """
+    Compute the histogram of the unmasked values of a MaskedArray by
+    streaming over it in blocks, which can be memory-mapped.
+
+    The arguments are as for `np.histogram` or, if `ndim` is given, as
+    for `np.histogramdd` with `a` of shape (N, ndim). Bins may not be given
+    as strings. If `range` is not given for a number of bins, it is found
+    by a first pass over the blocks.
+
+    Parameters
+    ----------
+    rows : int, optional
+        Approximate number of elements (or points) per block. Blocks are
+        taken along the first axis of `a`, so are views for any memory
+        layout.
+    workers : int, optional
+        Number of threads accumulating partial histograms of different
+        blocks, which are merged at the end. By default the thread pool set
+        by `common.set_thread_pool` is used, if any.
+
+    Returns
+    -------
+    hist, edges :
+        As for `np.histogram` or `np.histogramdd`.
+    """
+    a = as_duck_cls(a, base=MaskedArray)
+    if ndim is not None and (a.ndim != 2 or a.shape[1] != ndim):
+        raise ValueError("a must have shape (N, ndim)")
+    if weights is not None:
+        weights = as_duck_cls(weights, base=MaskedArray)
+        if weights.shape != (a.shape if ndim is None else a.shape[:1]):
+            raise ValueError("weights should have the same shape as a.")
+    if a.ndim == 0:
+        a = a.reshape(1)
+        weights = None if weights is None else weights.reshape(1)
+    n = a.shape[0]
+    if ndim is None:
+        rows = builtins.max(rows // builtins.max(a[:1].size, 1), 1)
+    starts = builtins.range(0, n, rows)
+
+    def block(start):
+        return a[start:start + rows]
+
+    # number of bins without a range: use the range of the unmasked data
+    nd = 1 if ndim is None else ndim
+    dims_bins = [bins]*nd if ndim is None or np.isscalar(bins) else bins
+    dims_range = [range] if ndim is None else (range or [None]*nd)
+    if builtins.any(np.ndim(b) == 0 and r is None
+                    for b, r in zip(dims_bins, dims_range)):
+        lo = hi = None
+        for start in starts:
+            blk = block(start).reshape(-1, nd)
+            valid = ~np.any(blk._mask, axis=1)
+            if valid.any():
+                d = blk._data[valid]
+                blo, bhi = d.min(axis=0), d.max(axis=0)
+                lo = blo if lo is None else np.minimum(lo, blo)
+                hi = bhi if hi is None else np.maximum(hi, bhi)
+        if lo is None:
+            lo, hi = np.zeros(nd, a.dtype), np.ones(nd, a.dtype)
+        if not (np.all(np.isfinite(lo)) and np.all(np.isfinite(hi))):
+            raise ValueError("autodetected range of [{}, {}] is not "
+                             "finite".format(lo, hi))
+        auto = list(zip(lo, hi))
+        dims_range = [r if r is not None else auto[d]
+                      for d, r in enumerate(dims_range)]
+        range = dims_range[0] if ndim is None else dims_range
+
+    def accumulate(chunk_starts):
+        acc = HistogramAccumulator(bins, range, ndim, a.dtype)
+        if weights is not None:
+            # set the result dtype from the weights, even if there is no data
+            acc.update(a[:0], weights[:0])
+        for start in chunk_starts:
+            w = None if weights is None else weights[start:start + rows]
+            acc.update(block(start), w)
+        return acc
+
+    # each thread accumulates a partial histogram of every nparts'th block
+    nparts = workers or thread_pool_workers()
+    nparts = builtins.max(1, builtins.min(nparts, len(starts)))
+    parts = [(starts[i::nparts],) for i in builtins.range(nparts)]
+    if workers is not None and workers > 1:
+        with ThreadPoolExecutor(workers) as executor:
+            accs = list(executor.map(lambda p: accumulate(*p), parts))
+    else:
+        accs = pool_map(accumulate, parts, a.size)
+    acc = functools.reduce(HistogramAccumulator.merge, accs)
+    return acc.result(bool(density))
+
+class QuantileSketch:
+    """
+    Approximate quantiles of the unmasked values of MaskedArray chunks.
+
+    This is a mergeable t-digest: the values seen so far are summarized by
+    at most `compression + 1` weighted centroids, which are smaller near the
+    extreme quantiles, so that tail quantiles such as p99 stay accurate. The
+    memory used is independent of the number of values. Sketches of
+    different data, eg computed by different workers, can be combined with
+    `merge`.
+
+    Parameters
+    ----------
+    axis : int, optional
+        If given, a separate sketch is kept for each lane along `axis` of
+        the chunks, which must all have the same shape apart from `axis`.
+        By default all values go into a single sketch.
+    compression : int, optional
+        Controls the number of centroids, and so the accuracy and size.
+
+    Examples
+    --------
+    >>> s = QuantileSketch(axis=0)
+    >>> for data, mask in marr.iter_chunks():
+    ...     s.update(MaskedArray(data, mask))
+    >>> p50, p99 = s.quantile([0.5, 0.99])
+    """
+
+    def __init__(self, axis=None, compression=200):
+        if compression < 1:
+            raise ValueError("compression must be positive")
+        self.axis = axis
+        self.compression = int(compression)
+        self._lane_shape = None
+
+    def _init_lanes(self, lane_shape):
+        nlanes = int(np.prod(lane_shape))
+        self._lane_shape = lane_shape
+        self._means = np.zeros((nlanes, 0))
+        self._weights = np.zeros((nlanes, 0))
+        self._min = np.full(nlanes, np.inf)
+        self._max = np.full(nlanes, -np.inf)
+        self._nan = np.zeros(nlanes, dtype=bool)
+
+    @property
+    def count(self):
+        """
+        Number of values added, for each lane.
+        """
+        if self._lane_shape is None:
+            return 0
+        return self._weights.sum(axis=1).reshape(self._lane_shape)
+
+    def _compress(self, means, weights):
+        # Sort the centroids of each lane and group neighbours whose
+        # midpoint quantiles fall in the same unit of the scale function
+        # k(q) = compression*(arcsin(2q-1)/pi + 1/2). Groups are contiguous
+        # in the sorted order, so merging them keeps the centroids sorted.
+        nlanes = means.shape[0]
+        order = np.argsort(means, axis=1, kind='stable')
+        means = np.take_along_axis(means, order, axis=1)
+        weights = np.take_along_axis(weights, order, axis=1)
+
+        cum = np.cumsum(weights, axis=1)
+        total = cum[:, -1:] if cum.shape[1] else np.zeros((nlanes, 1))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            q = np.clip((cum - weights/2) / total, 0, 1)
+        q[~np.isfinite(q)] = 0
+        k = np.arcsin(2*q - 1) / np.pi + 0.5
+        nk = self.compression + 1
+        key = np.minimum((self.compression*k).astype(np.intp), nk - 1)
+        key += nk*np.arange(nlanes)[:, None]
+
+        w = np.bincount(key.ravel(), weights.ravel(), nlanes*nk)
+        wx = np.multiply(weights, means, where=weights > 0,
+                         out=np.zeros(weights.shape))
+        wx = np.bincount(key.ravel(), wx.ravel(), nlanes*nk)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(w > 0, wx / w, 0)
+        self._means = means.reshape(nlanes, nk)
+        self._weights = w.reshape(nlanes, nk)
+
+    def update(self, chunk):
+        """
+        Add the unmasked values of `chunk` to the sketch.
+
+        Returns
+        -------
+        self : QuantileSketch
+        """
+        chunk = as_duck_cls(chunk, base=MaskedArray)
+        if self.axis is None:
+            data, mask = chunk._data.reshape(1, -1), chunk._mask.reshape(1, -1)
+            lane_shape = ()
+        else:
+            axis = normalize_axis_index(self.axis, chunk.ndim)
+            data = np.moveaxis(chunk._data, axis, -1)
+            mask = np.moveaxis(chunk._mask, axis, -1)
+            lane_shape = data.shape[:-1]
+            data = data.reshape(-1, data.shape[-1])
+            mask = mask.reshape(-1, mask.shape[-1])
+
+        if self._lane_shape is None:
+            self._init_lanes(lane_shape)
+        elif lane_shape != self._lane_shape:
+            raise ValueError("chunk has lanes of shape {}, expected {}".format(
+                             lane_shape, self._lane_shape))
+
+        # Unmasked nans are left out of the centroids, but make the lane's
+        # quantiles nan, as for np.quantile. They are treated as masked in
+        # the sort, since they would otherwise sort after the masked values.
+        data = data.astype(np.float64, copy=False)
+        nan = np.isnan(data) & ~mask
+        self._nan |= nan.any(axis=1)
+        mask = mask | nan
+
+        # sort the values, with masked ones last, so that merging them with
+        # the (sorted) centroids only needs to merge two sorted runs
+        data = np.where(mask, np.inf, data)
+        data.sort(axis=1)
+        nvalid = data.shape[1] - np.count_nonzero(mask, axis=1)
+        valid = np.arange(data.shape[1]) < nvalid[:, None]
+        self._min = np.minimum(self._min, data[:, 0] if data.shape[1] else
+                               np.inf)
+        self._max = np.maximum(self._max, np.where(
+            nvalid > 0, data[np.arange(len(data)), nvalid - 1], -np.inf))
+        self._compress(np.concatenate([self._means, data], axis=1),
+                       np.concatenate([self._weights, valid], axis=1))
+        return self
+
+    def merge(self, other):
+        """
+        Add the values summarized by another sketch.
+
+        Returns
+        -------
+        self : QuantileSketch
+        """
+        if other._lane_shape is None:
+            return self
+        if self._lane_shape is None:
+            self._init_lanes(other._lane_shape)
+        elif other._lane_shape != self._lane_shape:
+            raise ValueError("sketches have different lane shapes")
+        self._min = np.minimum(self._min, other._min)
+        self._max = np.maximum(self._max, other._max)
+        self._nan |= other._nan
+        self._compress(np.concatenate([self._means, other._means], axis=1),
+                       np.concatenate([self._weights, other._weights], axis=1))
+        return self
+
+    def quantile(self, q):
+        """
+        Estimate the q-th quantiles of each lane, interpolating linearly as
+        `np.quantile` does. While the number of values is small compared
+        to `compression`, the result is exact.
+
+        Parameters
+        ----------
+        q : float or array-like of float
+            Quantiles to compute, between 0 and 1 inclusive.
+
+        Returns
+        -------
+        quantile : MaskedArray or MaskedScalar
+            Of shape `q.shape` followed by the lane shape, as for
+            `np.quantile`. Lanes with no values are masked, and lanes
+            with unmasked nans are nan.
+        """
+        q = np.asanyarray(q, dtype=np.float64)
+        if not _quantile_is_valid(q):
+            raise ValueError("Quantiles must be in the range [0, 1]")
+        if self._lane_shape is None:
+            raise ValueError("no values have been added to the sketch")
+
+        # Value i of n sorted values lies at position i + 1/2 along the
+        # cumulative weight, and a centroid of weight w at the middle of its
+        # span. The min and max are at the first and last positions.
+        nlanes = self._weights.shape[0]
+        total = self._weights.sum(axis=1, keepdims=True)
+        pos = np.cumsum(self._weights, axis=1) - self._weights/2
+        pos = np.concatenate([np.full((nlanes, 1), 0.5), pos, total - 0.5],
+                             axis=1)
+        val = np.concatenate([self._min[:, None], self._means,
+                              self._max[:, None]], axis=1)
+        keep = np.concatenate([total > 0, self._weights > 0, total > 0],
+                              axis=1)
+
+        # interpolate all lanes at once, by offsetting each lane's positions,
+        # scaled to [0, 1], by twice its lane number
+        with np.errstate(invalid='ignore', divide='ignore'):
+            offset = 2*np.arange(nlanes)[:, None]
+            xp = (pos / total + offset)[keep]
+            target = (q.reshape(-1, 1, 1)*(total - 1) + 0.5) / total + offset
+        empty = total[:, 0] == 0
+        if empty.all():
+            res = np.zeros(target.shape[:2])
+        else:
+            res = np.interp(np.where(empty[:, None], 0, target), xp,
+                            val[keep])[..., 0]
+        res[:, self._nan] = np.nan
+        res = MaskedArray(res, np.broadcast_to(empty, res.shape))
+        res = res.reshape(q.shape + self._lane_shape)
+        return res if res.shape != () else res[()]
@@ -1,39 +1,746 @@
 #!/usr/bin/env python
-from .ArrayCollection import ArrayCollection
-from .MaskedArray import MaskedArray, X
+import numpy as np
+from .ArrayCollection import (ArrayCollection, CollectionScalar, _buffers,
+                              is_list_of_strings)
+from .common import iter_chunks, get_thread_pool
+from .MaskedArray import MaskedArray, MaskedScalar, X
 
 class MaskedArrayCollection(ArrayCollection):
-    def __init__(self, data, skip_validation=False):
-        if isinstance(data, list):
-            data = [(name, MaskedArray(arr)) for name, arr in data]
-        elif isinstance(data, np.ndarray) and data.dtype.names is not None:
-            names = data.dtype.names
-            arrays = []
-            for n in self.names:
-                if data[n].dtype.names is not None:
-                    # unpack nested types recursively
-                    arrays.append(MaskedArrayCollection(data[n]))
-                else:
-                    arrays.append(MaskedArray(data[n].copy()))
-            data = list(zip(names, arrays))
-        elif isinstance(data, ArrayCollection):
-            data = [(name, MaskedArray(data.arrays[name]))
-                    for name, arr in data.names]
+    """
+    An ArrayCollection whose fields are MaskedArrays.
+
+    By default each field has its own mask. Alternatively, the collection
+    can store a single shared "row" mask which applies to all fields, plus
+    separate per-field masks only for the fields which differ from it. This
+    saves memory when most missing data is missing for whole records. The
+    shared mask may additionally be bit-packed.
+
+    In shared-mask mode, the MaskedArrays returned by field access are
+    readonly views of the field data and of the shared mask, like the views
+    returned when indexing a structured MaskedArray by field. Assign to the
+    collection instead, eg ``c['a'] = val`` or ``c[ind] = X``. The field
+    data of the input arrays is viewed, but their masks are copied.
+
+    Indexing preserves the shared mask, but functions such as `np.take`,
+    `np.concatenate` and `np.ravel` return collections with a mask per
+    field. Pass the result to ``MaskedArrayCollection(..., shared_mask=True)``
+    to share its mask again.
+    """
+
+    def __init__(self, data, dtype=None, skip_validation=False,
+                 rowmask=None, shared_mask=False, packed=False):
+        """
+        Parameters
+        ----------
+        data, dtype, skip_validation :
+            See `ArrayCollection`. Fields which are not MaskedArrays are
+            converted to MaskedArrays.
+        rowmask : array-like of bool, optional
+            A mask broadcastable to the collection's shape, which masks
+            whole elements (rows) of the collection in addition to any masks
+            of the fields. Implies `shared_mask`.
+        shared_mask : bool, optional
+            If True, store a single shared mask for all fields plus per-field
+            masks only where they differ. If `rowmask` is not given, the
+            shared mask is the elements which are masked in all fields.
+        packed : bool, optional
+            If True, the shared mask is stored bit-packed, using one bit per
+            element. Field access then unpacks it, rather than viewing it.
+            Implies `shared_mask`.
+        """
+        if isinstance(data, MaskedArrayCollection) and data._shared:
+            # view the writeable field data and masks, not the readonly
+            # views returned by field access
+            mask = data._get_rowmask()
+            data = {n: MaskedArray(d, data._fieldmasks.get(n, mask))
+                    for n, d in data._fields.items()}
+
+        self._shared = shared_mask or packed or rowmask is not None
+        self._packed = packed
+        self._init_rowmask = rowmask
+        super().__init__(data, dtype, skip_validation)
+        del self._init_rowmask
+
+    # In shared mode, the persistent state is `_fields` (dict of field data
+    # ndarrays) and `_state`, a _MaskState holding the shared mask and the
+    # masks of the fields which do not use it. Views share the `_state` of
+    # their base, and `_index` is the sequence of (basic) indices which
+    # select the view's elements from the base's masks. `_arrays` is then
+    # computed on access.
+
+    @property
+    def _arrays(self):
+        if not self._shared:
+            return self._masked_arrays
+
+        rowmask = _readonly(self._get_rowmask())
+        fieldmasks = self._fieldmasks
+        arrays = {}
+        for name, data in self._fields.items():
+            mask = fieldmasks.get(name, None)
+            mask = rowmask if mask is None else _readonly(mask)
+            arrays[name] = MaskedArray(_readonly(data), mask)
+        return arrays
+
+    @_arrays.setter
+    def _arrays(self, arrays):
+        # every (non-nested) field is stored as a MaskedArray
+        arrays = {n: a if isinstance(a, (MaskedArray, ArrayCollection))
+                     else MaskedArray(a)
+                  for n, a in arrays.items()}
+
+        if not self._shared:
+            self._masked_arrays = arrays
+            return
+
+        if any(isinstance(a, ArrayCollection) for a in arrays.values()):
+            raise ValueError("nested collections are not supported with a "
+                             "shared mask")
+
+        self._fields = {n: a._data for n, a in arrays.items()}
+        self._shape = next(iter(arrays.values())).shape if arrays else ()
+        self._index = ()
+        masks = {n: a._mask for n, a in arrays.items()}
+
+        rowmask = self._init_rowmask
+        if rowmask is not None:
+            rowmask = np.broadcast_to(np.asarray(rowmask, dtype=bool),
+                                      self._shape)
+            masks = {n: m | rowmask for n, m in masks.items()}
+        elif masks:
+            rowmask = np.logical_and.reduce(list(masks.values()))
         else:
-            raise Exception("Expected either a list of (name, arr) pairs"
-                            "or a structured array")
+            rowmask = np.zeros(self._shape, dtype=bool)
+        rowmask = np.array(rowmask, dtype=bool)
+
+        self._state = _MaskState(list(arrays), rowmask, masks, self._packed)
+
+        # The masks kept for the fields which differ from the shared mask are
+        # copied, as the shared mask is, so that assignments never write to
+        # the masks of the input arrays.
+        if self._init_rowmask is None:
+            fieldmasks = self._state.fieldmasks
+            for name, mask in fieldmasks.items():
+                fieldmasks[name] = mask.copy()
+
+    @classmethod
+    def _from_parts(cls, fields, state, index, shape):
+        # construct a shared-mask collection without any validation
+        self = cls.__new__(cls)
+        self._shared, self._packed = True, state.packed
+        self._fields = fields
+        self._shape = shape
+        self._state = state
+        self._index = index
+        self._dtype = np.dtype([(n, a.dtype) for n, a in fields.items()])
+        return self
+
+    def _view_mask(self, mask):
+        # select this collection's elements from a mask of the base
+        for ind in self._index:
+            mask = mask[ind]
+        return mask
+
+    def _get_rowmask(self):
+        return self._view_mask(self._state.get_rowmask())
+
+    @property
+    def _fieldmasks(self):
+        return {n: self._view_mask(m)
+                for n, m in self._state.fieldmasks.items()
+                if n in self._fields}
+
+    @property
+    def rowmask(self):
+        """
+        The shared mask, as a readonly boolean array, or None if each field
+        has its own mask. If the mask is packed, this is an unpacked copy.
+        """
+        if not self._shared:
+            return None
+        return _readonly(self._get_rowmask())
+
+    @property
+    def shape(self):
+        if self._shared:
+            return self._shape
+        return super().shape
+
+    def __getitem__(self, ind):
+        if not self._shared:
+            return super().__getitem__(ind)
+
+        if isinstance(ind, str):
+            return self._arrays[ind]
+
+        if is_list_of_strings(ind):
+            return self._from_parts({n: self._fields[n] for n in ind},
+                                    self._state, self._index, self._shape)
 
-        super().__init__(data, skip_validation)
+        if isinstance(ind, (int, np.integer)):
+            ind = (ind,)
+
+        # index the shared mask only once for all fields
+        rowmask = self._get_rowmask()[ind]
+        fields = {n: a[ind] for n, a in self._fields.items()}
+
+        if rowmask.shape == ():
+            fieldmasks = {n: m[ind] for n, m in self._fieldmasks.items()}
+            vals = tuple(MaskedScalar(d, fieldmasks.get(n, rowmask))
+                         for n, d in fields.items())
+            return CollectionScalar(vals, self._dtype)
+
+        # basic indexing gives a view sharing the mask state, advanced
+        # indexing a copy with its own
+        if _is_basic_index(ind):
+            return self._from_parts(fields, self._state,
+                                    self._index + (ind,), rowmask.shape)
+
+        fieldmasks = {n: m[ind] for n, m in self._fieldmasks.items()}
+        state = _MaskState(list(fields), rowmask, fieldmasks, self._packed)
+        return self._from_parts(fields, state, (), rowmask.shape)
+
+    def __setitem__(self, ind, val):
+        if not self._shared:
+            return super().__setitem__(ind, val)
+
+        names = list(self._fields.keys())
+
+        # get the data and mask values to assign to each field
+        if isinstance(ind, str):
+            names = [ind]
+            vals = [val]
+            ind = ...
+        elif is_list_of_strings(ind):
+            names = ind
+            vals = _split_fields(val, len(names))
+            ind = ...
+        else:
+            vals = _split_fields(val, len(names))
+
+        state = self._state
+        base_rowmask = state.get_rowmask()
+        rowmask = self._view_mask(base_rowmask)
+        region = rowmask[ind]
+        fieldmask = lambda name: self._view_mask(state.fieldmasks[name])
+
+        # For basic indices the number of elements where each field mask
+        # differs from the shared mask is updated from the assigned region
+        # only, so that scalar assignment does not scan the whole mask.
+        basic = _is_basic_index(ind)
+        if basic:
+            for name in state.fieldmasks:
+                state.ndiff[name] -= np.count_nonzero(fieldmask(name)[ind] !=
+                                                      region)
+
+        masks = {}
+        for name, v in zip(names, vals):
+            if v is X:
+                masks[name] = np.ones(region.shape, dtype=bool)
+            else:
+                v = v if isinstance(v, (MaskedArray, MaskedScalar)) else (
+                    MaskedArray(v))
+                self._fields[name][ind] = v._data
+                masks[name] = np.broadcast_to(v._mask, region.shape)
+
+        # If all fields using the shared mask are assigned, the first one's
+        # mask value is written to the shared mask. Assigned fields which
+        # need a different mask value get their own copy of the mask.
+        shared = [n for n in names if n not in state.fieldmasks]
+        if shared:
+            allshared = len(shared) == len(state.names) - len(state.fieldmasks)
+            newmask = masks[shared[0]] if allshared else region
+            for name in shared:
+                if not np.array_equal(masks[name], newmask):
+                    state.fieldmasks[name] = base_rowmask.copy()
+                    state.ndiff[name] = 0
+            if allshared:
+                rowmask[ind] = newmask
+                if state.packed:
+                    state.set_rowmask(base_rowmask)
+
+        for name in names:
+            if name in state.fieldmasks:
+                fieldmask(name)[ind] = masks[name]
+
+        if basic:
+            region = rowmask[ind]
+            for name in state.fieldmasks:
+                state.ndiff[name] += np.count_nonzero(fieldmask(name)[ind] !=
+                                                      region)
+        else:
+            for name, m in state.fieldmasks.items():
+                state.ndiff[name] = np.count_nonzero(m != base_rowmask)
+
+        # fields whose mask became the same as the shared mask rejoin it
+        state.rejoin()
+
+    def __reduce_ex__(self, protocol):
+        # the shared mask state is pickled as the instance dict
+        if self._shared:
+            return object.__reduce_ex__(self, protocol)
+        return super().__reduce_ex__(protocol)
 
     def filled(self, fill_value=0):
         if not isinstance(fill_value, tuple):
-            fill_value = (fill_value,)*len(self.names)
+            fill_value = (fill_value,)*len(self._dtype.names)
 
-        data = [(name, self.arrays[name].filled(fill))
-                for name, fill in zip(self.names, fill_value)]
+        if not self._shared:
+            data = {name: arr.filled(fill) for (name, arr), fill
+                    in zip(self._arrays.items(), fill_value)}
+            return ArrayCollection(data)
 
+        # the shared mask is unpacked (if needed) once, and used directly
+        rowmask = self._get_rowmask()
+        data = {}
+        for (name, arr), fill in zip(self._fields.items(), fill_value):
+            data[name] = arr.copy()
+            data[name][self._fieldmasks.get(name, rowmask)] = fill
         return ArrayCollection(data)
 
+    def _data_mask(self):
+        # split into collections of the (unmasked) data and readonly masks
+        data, mask = {}, {}
+        for name, arr in self._arrays.items():
+            if isinstance(arr, MaskedArrayCollection):
+                data[name], mask[name] = arr._data_mask()
+            else:
+                data[name], mask[name] = arr._data, arr.mask
+        return ArrayCollection(data), ArrayCollection(mask)
+
+    def iter_chunks(self, rows=65536, prefetch=False):
+        """
+        Iterate over the collection in chunks of `rows` elements along the
+        first axis, without copying.
+
+        Yields `(data_block, mask_block)` pairs, which are ArrayCollections
+        viewing the data and (readonly) mask arrays of each field. See
+        `ArrayCollection.iter_chunks` for the parameters.
+        """
+        if self.ndim == 0:
+            raise TypeError("iteration over a 0-d collection")
+
+        def getchunk(start, stop):
+            data, mask = self[start:stop]._data_mask()
+            return (data, mask), _buffers(data) + _buffers(mask)
+
+        return iter_chunks(self.shape[0], rows, getchunk, prefetch)
+
+class _MaskState:
+    """
+    The mask state of a shared-mask MaskedArrayCollection, which is shared
+    by the collection and its views: the shared mask (possibly packed), the
+    masks of the fields which differ from it, and the number of elements
+    where each of these differs from the shared mask.
+    """
+
+    def __init__(self, names, rowmask, fieldmasks, packed):
+        self.names = names
+        self.shape = rowmask.shape
+        self.packed = packed
+        self.set_rowmask(rowmask)
+        self.fieldmasks = dict(fieldmasks)
+        self.ndiff = {n: np.count_nonzero(m != rowmask)
+                      for n, m in fieldmasks.items()}
+        self.rejoin()
+
+    def get_rowmask(self):
+        if self.packed:
+            n = int(np.prod(self.shape))
+            return np.unpackbits(self.rowmask, count=n).view(bool).reshape(
+                                                                self.shape)
+        return self.rowmask
+
+    def set_rowmask(self, rowmask):
+        if self.packed:
+            self.rowmask = np.packbits(rowmask.ravel())
+        else:
+            self.rowmask = rowmask
+
+    def rejoin(self):
+        # drop the field masks which are the same as the shared mask
+        for name in [n for n, k in self.ndiff.items() if k == 0]:
+            del self.fieldmasks[name], self.ndiff[name]
+
+def _is_basic_index(ind):
+    # whether indexing with ind gives a view
+    if not isinstance(ind, tuple):
+        ind = (ind,)
+    return all(i is None or i is Ellipsis or isinstance(i, slice) or
+               (isinstance(i, (int, np.integer)) and not isinstance(i, bool))
+               for i in ind)
+
+def _readonly(arr):
+    view = arr.view()
+    view.flags['WRITEABLE'] = False
+    return view
+
+def _split_fields(val, nfields):
+    # split a value assigned to a collection into one value per field
+    if isinstance(val, ArrayCollection):
+        vals = list(val._arrays.values())
+    elif isinstance(val, CollectionScalar):
+        vals = list(val._data)
+    elif isinstance(val, tuple):
+        vals = list(val)
+    else:
+        return [val]*nfields
+
+    if len(vals) != nfields:
+        raise ValueError("wrong number of values")
+    return vals
+
+def load_delimited(fname, delimiter=',', dtype=None, names=None,
+                   skip_header=0, missing_values=('', 'NA', 'N/A', 'nan'),
+                   block_size=1 << 24, executor=None):
+    """
+    Load a delimited text file (eg, CSV) into a MaskedArrayCollection, or a
+    MaskedArray if `dtype` is not structured. Empty fields and fields equal
+    to one of `missing_values` are masked.
+
+    The file is memory-mapped and split into blocks of about `block_size`
+    bytes at line boundaries. The blocks are tokenized and converted using
+    vectorized numpy operations, in parallel if an executor is available,
+    and written into preallocated data and mask arrays.
+
+    Parameters
+    ----------
+    fname : str or path
+        File to read.
+    delimiter : str, optional
+        Single-character field delimiter. Quoting is not supported, and
+        whitespace around fields is ignored.
+    dtype : dtype, optional
+        Structured dtype with one field per column, or a plain dtype used
+        for all columns. If not given, each column is inferred as the first
+        of int64, float64 and str which can represent all its values.
+    names : list of str or True, optional
+        Field names. If True, they are read from the first line after the
+        skipped header lines. Default is the dtype's names, or f0, f1, ....
+    skip_header : int, optional
+        Number of lines to skip at the start of the file.
+    missing_values : sequence of str, optional
+        Tokens (after stripping whitespace) which are treated as masked.
+    block_size : int, optional
+        Approximate number of bytes parsed per block.
+    executor : concurrent.futures.Executor, optional
+        Executor used to parse the blocks. May be a ProcessPoolExecutor.
+        Default is the thread pool set by `common.set_thread_pool`, if any.
+
+    Returns
+    -------
+    out : MaskedArrayCollection or MaskedArray
+        For a plain `dtype`, a 2d MaskedArray of shape (rows, columns), or
+        1d if there is only one column.
+    """
+    fname = str(fname)
+    delim = delimiter.encode()
+    if len(delim) != 1:
+        raise ValueError("delimiter must be a single character")
+
+    with open(fname, 'rb') as f:
+        for i in range(skip_header):
+            f.readline()
+        if names is True:
+            names = [n.strip() for n in
+                     f.readline().decode().rstrip('\r\n').split(delimiter)]
+        offset = f.tell()
+        first = f.readline()
+
+    structured = dtype is None or np.dtype(dtype).names is not None
+    if dtype is not None:
+        dtype = np.dtype(dtype)
+        if names is None and dtype.names is not None:
+            names = list(dtype.names)
+    if names is not None:
+        ncols = len(names)
+    elif dtype is not None and dtype.names is not None:
+        ncols = len(dtype.names)
+    else:
+        ncols = first.count(delim) + 1
+    if names is None:
+        names = ['f{}'.format(i) for i in range(ncols)]
+
+    if dtype is None:
+        dtypes = [None]*ncols
+    elif dtype.names is not None:
+        if len(dtype.names) != ncols:
+            raise ValueError("dtype has {} fields but there are {} "
+                             "columns".format(len(dtype.names), ncols))
+        dtypes = [dtype.fields[n][0] for n in dtype.names]
+    else:
+        dtypes = [dtype]*ncols
+
+    buf = np.memmap(fname, dtype=np.uint8, mode='r')
+    bounds = _block_bounds(buf, offset, block_size)
+    del buf
+    missing = np.array([m.encode() for m in missing_values])
+    args = [(fname, start, stop, delim, ncols) for start, stop in bounds]
+
+    if executor is None:
+        executor = get_thread_pool()
+    mapper = executor.map if executor is not None else map
+
+    # count the rows of each block, to preallocate the output
+    counts = (list(mapper(_count_rows, [fname]*len(bounds), *zip(*bounds)))
+              if bounds else [])
+    rows = np.concatenate([[0], np.cumsum(counts, dtype=np.intp)])
+
+    # Unknown column types are inferred per block, and the column's blocks
+    # are collected and then promoted to the widest type found.
+    inferred = [dt is None for dt in dtypes]
+    if structured:
+        data = [None if dt is None else np.empty(rows[-1], dt)
+                for dt in dtypes]
+        masks = [np.empty(rows[-1], bool) for dt in dtypes]
+    else:
+        data2d = np.empty((rows[-1], ncols), dtypes[0])
+        mask2d = np.empty((rows[-1], ncols), bool)
+        data = [data2d[:, i] for i in range(ncols)]
+        masks = [mask2d[:, i] for i in range(ncols)]
+    pieces = [[] for dt in dtypes]
+
+    nargs = list(zip(*args)) + [[dtypes]*len(args), [missing]*len(args)]
+    results = mapper(_parse_block, *nargs) if args else []
+    for r0, r1, block in zip(rows[:-1], rows[1:], results):
+        for i, (d, m) in enumerate(block):
+            if inferred[i]:
+                pieces[i].append(d)
+            else:
+                data[i][r0:r1] = d
+            masks[i][r0:r1] = m
+
+    # Numeric blocks of inferred str columns are parsed again as str, to
+    # get the tokens' text.
+    strcols = [i for i in range(ncols)
+               if inferred[i] and any(p.dtype.kind == 'U' for p in pieces[i])]
+    for b in range(len(args)):
+        cols = [i for i in strcols if pieces[i][b].dtype.kind != 'U']
+        if cols:
+            redo = _parse_block(*args[b], [np.dtype('U')]*ncols, missing,
+                                cols)
+            for i, (d, m) in zip(cols, redo):
+                pieces[i][b] = d
+
+    for i in range(ncols):
+        if inferred[i]:
+            data[i] = (np.concatenate(pieces[i]) if pieces[i] else
+                       np.empty(0, 'f8'))
+
+    if not structured:
+        out = MaskedArray(data2d, mask2d)
+        return out[:, 0] if ncols == 1 else out
+
+    return MaskedArrayCollection({n: MaskedArray(d, m) for n, d, m
+                                  in zip(names, data, masks)})
+
+def _block_bounds(buf, offset, block_size):
+    # split buf[offset:] into blocks of about block_size bytes which end
+    # just after a newline (or at the end of the file)
+    bounds = []
+    start, n = offset, len(buf)
+    while start < n:
+        stop = start + block_size
+        while stop < n:
+            nl = np.flatnonzero(buf[stop:stop + 65536] == ord('\n'))
+            if len(nl):
+                stop += nl[0] + 1
+                break
+            stop += 65536
+        stop = min(stop, n)
+        bounds.append((start, stop))
+        start = stop
+    return bounds
+
+def _split_lines(block):
+    # start and end offsets of the non-blank lines of a block, excluding
+    # the line terminators
+    nl = np.flatnonzero(block == ord('\n'))
+    starts = np.concatenate([[0], nl + 1])
+    ends = np.concatenate([nl, [len(block)]])
+    cr = (ends > starts) & (block[np.maximum(ends - 1, 0)] == ord('\r'))
+    ends = ends - cr
+    keep = ends > starts
+    return starts[keep], ends[keep]
+
+def _load_block(fname, start, stop):
+    return np.memmap(fname, dtype=np.uint8, mode='r', offset=start,
+                     shape=(stop - start,))
+
+def _count_rows(fname, start, stop):
+    return len(_split_lines(_load_block(fname, start, stop))[0])
+
+# Tokens of columns which are not strings are gathered as at most this many
+# characters. Longer tokens (which are rare) are converted individually, so
+# that a single long token does not make every token that wide.
+_MAX_GATHER_WIDTH = 32
+
+# Maximum number of token characters gathered at once, which bounds the
+# size of the gather's index arrays.
+_GATHER_CHUNK = 1 << 20
+
+def _parse_block(fname, start, stop, delim, ncols, dtypes, missing,
+                 columns=None):
+    """
+    Parse a block of a delimited file. Returns a list of `(data, mask)`
+    for each column, or for each of `columns` if given, where data is
+    converted to the column's dtype, or to the first of int64, float64 and
+    str which can represent its tokens if the dtype is None.
+    """
+    block = np.array(_load_block(fname, start, stop))
+    ls, le = _split_lines(block)
+    n = len(ls)
+
+    # positions of the delimiters, which must be ncols-1 per line
+    d = np.flatnonzero(block == delim[0])
+    line = np.searchsorted(ls, d, 'right') - 1
+    if np.any(np.bincount(line, minlength=n) != ncols - 1):
+        bad = np.flatnonzero(np.bincount(line, minlength=n) != ncols - 1)[0]
+        raise ValueError("wrong number of columns in line at byte offset "
+                         "{}".format(start + ls[bad]))
+
+    d = d.reshape(n, ncols - 1)
+    tstart = np.concatenate([ls[:, None], d + 1], axis=1)
+    tend = np.concatenate([d, le[:, None]], axis=1)
+
+    # strip whitespace from the tokens
+    space = np.array([False]*256)
+    space[[ord(c) for c in ' \t\r']] = True
+    while True:
+        step = (tstart < tend) & space[block[np.minimum(tstart, len(block)-1)]]
+        if not step.any():
+            break
+        tstart += step
+    while True:
+        step = (tend > tstart) & space[block[np.maximum(tend - 1, 0)]]
+        if not step.any():
+            break
+        tend -= step
+
+    out = []
+    for i in range(ncols) if columns is None else columns:
+        dt = dtypes[i]
+        s, e = tstart[:, i], tend[:, i]
+        lengths = e - s
+        width = max(int(np.max(lengths, initial=0)), 1)
+        if dt is None or dt.kind not in 'USVO':
+            width = min(width, max(_MAX_GATHER_WIDTH, missing.itemsize))
+        chars = _gather_tokens(block, s, e, width)
+        tokens = chars.view('S{}'.format(width)).reshape(n)
+        mask = np.isin(tokens, missing) & (lengths <= width)
+        long = np.flatnonzero(lengths > width)
+        longtokens = np.array([block[s[j]:e[j]].tobytes() for j in long],
+                              dtype='S')
+
+        if dt is None:
+            # infer the type: the first of int64, float64 and str which
+            # can represent the tokens
+            for dt in [np.dtype(np.int64), np.dtype(np.float64)]:
+                try:
+                    out.append((_convert(chars, lengths, mask, dt,
+                                         long, longtokens), mask))
+                    break
+                except (ValueError, OverflowError):
+                    pass
+            else:
+                if len(long):
+                    width = int(np.max(lengths))
+                    chars = _gather_tokens(block, s, e, width)
+                out.append((_convert(chars, lengths, mask, None), mask))
+        else:
+            out.append((_convert(chars, lengths, mask, dt, long, longtokens),
+                        mask))
+    return out
+
+def _gather_tokens(block, starts, ends, width):
+    # Gather the tokens block[starts:ends] into a 2d array of their
+    # characters, truncated or zero-padded to `width`. This is done in
+    # chunks of rows, to bound the size of the index arrays.
+    n = len(starts)
+    chars = np.empty((n, width), dtype=np.uint8)
+    offsets = np.arange(width)
+    step = max(_GATHER_CHUNK // width, 1)
+    for r0 in range(0, n, step):
+        s, e = starts[r0:r0 + step], ends[r0:r0 + step]
+        pos = s[:, None] + offsets
+        chars[r0:r0 + step] = np.where(pos < e[:, None],
+                             block[np.minimum(pos, max(len(block) - 1, 0))], 0)
+    return chars
+
+def _convert(chars, lengths, mask, dtype, long=(), longtokens=None):
+    """
+    Convert tokens, given as a 2d array of zero-padded characters and their
+    lengths, to `dtype`, or to str if `dtype` is None. Masked tokens are
+    converted as zero. The tokens at indices `long` are truncated in
+    `chars`, and are instead given in full by `longtokens`.
+
+    Plain decimal numbers are parsed by vectorized digit arithmetic, other
+    tokens (eg, with exponents) by `astype`.
+    """
+    n, width = chars.shape
+    tokens = chars.view('S{}'.format(width)).reshape(n)
+
+    if dtype is None or dtype.kind == 'U':
+        if chars.max(initial=0) < 128:
+            return tokens.astype(dtype if dtype is not None else 'U')
+        return np.char.decode(tokens, 'utf-8').astype(dtype or 'U')
+    if dtype.kind == 'S':
+        return tokens.astype(dtype)
+
+    if dtype not in (np.int64, np.float64):
+        tokens = tokens.copy()
+        tokens[mask] = b'0'
+        tokens[long] = b'0'
+        out = tokens.astype(dtype)
+        out[long] = longtokens.astype(dtype)
+        return out
+
+    # Vectorized parse of [+-]digits[.digits], one character position at a
+    # time over all tokens.
+    cols = np.ascontiguousarray(chars.T)
+    neg = cols[0] == ord('-')
+    sign = neg | (cols[0] == ord('+'))
+    mant = np.zeros(n, dtype=np.int64)
+    ndigits = np.zeros(n, dtype=np.intp)
+    nfrac = np.zeros(n, dtype=np.intp)
+    ndots = np.zeros(n, dtype=np.intp)
+    bad = np.zeros(n, dtype=bool)
+    for j in range(width):
+        c = cols[j]
+        inside = (j >= sign) & (j < lengths)
+        value = c - np.uint8(ord('0'))
+        digit = inside & (value < 10)
+        dot = inside & (c == ord('.'))
+        bad |= inside & ~digit & ~dot
+        mant = np.where(digit, mant*10 + value, mant)
+        ndigits += digit
+        nfrac += digit & (ndots > 0)
+        ndots += dot
+
+    # In ints and floats with at most 15 digits the mantissa, and the power
+    # of 10 it is divided by, are exact as float64, so the division is
+    # correctly rounded like a full parse.
+    maxdigits = 18 if dtype.kind == 'i' else 15
+    simple = (~mask & ~bad & (ndigits > 0) & (ndigits <= maxdigits) &
+              (ndots <= (dtype.kind == 'f')))
+    mant[neg] = -mant[neg]
+
+    if dtype.kind == 'i':
+        out = mant
+    else:
+        out = mant / 10.0**nfrac
+        out[neg & (mant == 0)] = -0.0
+
+    simple[long] = False
+    other = ~simple & ~mask
+    other[long] = False
+    if other.any():
+        out[other] = tokens[other].astype(dtype)
+    if len(long):
+        out[long] = longtokens.astype(dtype)
+    out[mask] = 0
+    return out
+
 if __name__ == '__main__':
     a = MaskedArray([[1,X,3], [X,X,X], [0,1,X]])
     b = MaskedArray([[X,4,5], [3,X,2], [X,X,X]])
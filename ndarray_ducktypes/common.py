@@ -1,7 +1,14 @@
 import builtins
+import mmap
+import os
+import pickle
+import threading
 from inspect import signature
 from collections.abc import Iterable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
+from numpy.core.multiarray import normalize_axis_index
 
 # Interesting Fact: The numpy arrayprint machinery (for one) depends on having
 # a separate scalar type associated with any new ducktype (or subclass). This
@@ -179,3 +186,410 @@ def as_duck_cls(*args, base=None, single=True):
         a = args[0]
         return cls(a) if type(a) != cls else a
     return tuple(cls(a) if type(a) != cls else a for a in args)
+
+def unique_outputs(perm, flag, return_index=False, return_inverse=False,
+                   return_counts=False):
+    """
+    Compute the optional outputs of `np.unique` from a (stable, if
+    `return_index`) sorting permutation `perm` of the input, and the boolean
+    array `flag` marking the elements of the sorted input which differ from
+    the previous one. `perm` is only used for the index and inverse.
+
+    Returns a tuple of the requested index, inverse and counts arrays.
+    """
+    ret = ()
+    if return_index:
+        ret += (perm[flag],)
+    if return_inverse:
+        inv_idx = np.empty(len(flag), dtype=np.intp)
+        inv_idx[perm] = np.cumsum(flag) - 1
+        ret += (inv_idx,)
+    if return_counts:
+        idx = np.concatenate(np.nonzero(flag) + ([len(flag)],))
+        ret += (np.diff(idx),)
+    return ret
+
+def _touch_pages(arrays):
+    # read one byte per page of each buffer, which faults memory-mapped
+    # data into memory. Only contiguous buffers are touched.
+    for a in arrays:
+        if a.size == 0 or a.dtype.hasobject or not a.flags.c_contiguous:
+            continue
+        a.reshape(-1).view(np.uint8)[::mmap.PAGESIZE].sum()
+
+def iter_chunks(length, rows, getchunk, prefetch=False):
+    """
+    Helper to implement chunked iteration along the first axis of a
+    ducktype.
+
+    Parameters
+    ----------
+    length : int
+        Length of the first axis.
+    rows : int
+        Number of rows in each chunk. The last chunk may be shorter.
+    getchunk : function
+        Called as `getchunk(start, stop)`, should return a tuple `(chunk,
+        buffers)` where `chunk` is the object to yield and `buffers` is a
+        list of the ndarrays viewed by the chunk.
+    prefetch : bool
+        If True, while each chunk is being processed the buffers of the next
+        chunk are read in a background thread, so that memory-mapped data is
+        already loaded when it is needed.
+    """
+    if rows < 1:
+        raise ValueError("rows must be at least 1")
+
+    starts = range(0, length, rows)
+    if not prefetch:
+        for start in starts:
+            yield getchunk(start, builtins.min(start + rows, length))[0]
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = None
+        for start in starts:
+            chunk, _ = getchunk(start, builtins.min(start + rows, length))
+            if pending is not None:
+                pending.result()
+
+            nxt = start + rows
+            if nxt < length:
+                _, buffers = getchunk(nxt, builtins.min(nxt + rows, length))
+                pending = executor.submit(_touch_pages, buffers)
+            yield chunk
+
+# Thread pool used by ducktype operations made of independent per-field (or
+# per-block) numpy calls. Numpy releases the GIL in most such calls, so these
+# can run concurrently. Disabled by default.
+_thread_pool = {'executor': None, 'workers': 1, 'owned': False,
+                'threshold': 1 << 20}
+_in_pool = threading.local()
+
+def set_thread_pool(workers, threshold=None):
+    """
+    Configure the thread pool used to run independent parts of ducktype
+    operations, such as the per-field operations of an ArrayCollection,
+    in parallel.
+
+    A pool created here is shut down when it is replaced.
+
+    Parameters
+    ----------
+    workers : int, concurrent.futures.Executor or None
+        Number of worker threads, or an executor to use, whose work is
+        split for `os.cpu_count()` workers. None, 0 or 1 disable the
+        thread pool.
+    threshold : int, optional
+        Minimum total number of elements an operation must process for the
+        thread pool to be used. Smaller operations run serially, since the
+        thread overhead would dominate.
+
+    Returns
+    -------
+    old : tuple
+        The previous (workers, threshold), which can be passed back to
+        `set_thread_pool` to restore it. `workers` is the previous executor
+        if one was given, else its number of workers.
+    """
+    old = (_thread_pool['workers'] if _thread_pool['owned'] else
+           _thread_pool['executor'], _thread_pool['threshold'])
+    if _thread_pool['owned']:
+        _thread_pool['executor'].shutdown(wait=False)
+
+    if isinstance(workers, Executor):
+        executor, nworkers = workers, os.cpu_count()
+    elif workers is None or workers <= 1:
+        executor, nworkers = None, 1
+    else:
+        executor, nworkers = ThreadPoolExecutor(workers), workers
+    _thread_pool['executor'] = executor
+    _thread_pool['workers'] = nworkers
+    _thread_pool['owned'] = executor is not None and executor is not workers
+    if threshold is not None:
+        _thread_pool['threshold'] = threshold
+    return old
+
+def get_thread_pool():
+    """
+    Return the executor set by `set_thread_pool`, or None if there is none.
+    """
+    return _thread_pool['executor']
+
+def thread_pool_workers():
+    """
+    Return the number of workers of the thread pool set by
+    `set_thread_pool`, or 1 if there is none.
+    """
+    return _thread_pool['workers']
+
+def pool_map(func, args, nelem):
+    """
+    Return `[func(*a) for a in args]`, computed using the thread pool set by
+    `set_thread_pool` if one is set and `nelem`, the total number of array
+    elements processed, is at least its threshold.
+
+    Calls made from within a pool worker run serially, so that nested
+    operations (eg, on nested collections) cannot deadlock the pool.
+    """
+    args = list(args)
+    pool = _thread_pool['executor']
+    if (pool is None or len(args) < 2 or nelem < _thread_pool['threshold']
+            or getattr(_in_pool, 'active', False)):
+        return [func(*a) for a in args]
+
+    def work(a):
+        _in_pool.active = True
+        try:
+            return func(*a)
+        finally:
+            _in_pool.active = False
+
+    return list(pool.map(work, args))
+
+# Number of elements reduced at a time by blocked_minmax, sized so a block of
+# data fits in the CPU cache while it is reduced twice.
+_MINMAX_BLOCK = 1 << 15
+
+def _reduction_bounds(dtype):
+    # (largest, smallest) values of a dtype, used as the initial values of
+    # minimum and maximum reductions which may have no elements
+    if dtype.kind in 'fc':
+        return dtype.type(np.inf), dtype.type(-np.inf)
+    if dtype.kind in 'iu':
+        info = np.iinfo(dtype)
+        return dtype.type(info.max), dtype.type(info.min)
+    if dtype.kind in 'mM':
+        # the smallest int64 is NaT
+        info = np.iinfo(np.int64)
+        return (np.array(info.max).view(dtype)[()],
+                np.array(info.min + 1).view(dtype)[()])
+    if dtype.kind == 'b':
+        return np.True_, np.False_
+    raise TypeError("cannot compute the min and max of dtype {}".format(
+                    dtype))
+
+def blocked_minmax(a, axis=None, mask=None, keepdims=False):
+    """
+    Return the minimum and maximum of an ndarray along an axis together.
+
+    The reductions are done in blocks small enough to stay in the CPU
+    cache, so the data (and mask) are read from memory once rather than
+    once per reduction. NaNs propagate as for `np.min` and `np.max`.
+
+    Parameters
+    ----------
+    a : ndarray
+        Input data.
+    axis : None or int or tuple of ints, optional
+        Axis or axes to reduce, all by default.
+    mask : ndarray of bool, optional
+        Elements where `mask` is True are ignored. It must have the same
+        shape as `a`.
+    keepdims : bool, optional
+        As for `np.min`.
+
+    Returns
+    -------
+    min, max : ndarray
+        The extremes of each lane. Where a lane has no unmasked elements
+        they are the largest and smallest values of the dtype.
+    empty : ndarray of bool
+        Whether each lane has no unmasked elements.
+    """
+    a = np.asarray(a)
+    hi, lo = _reduction_bounds(a.dtype)
+    if mask is not None and mask.shape != a.shape:
+        raise ValueError("mask must have the same shape as a")
+
+    if isinstance(axis, tuple) or not a.flags.c_contiguous or (
+            mask is not None and not mask.flags.c_contiguous):
+        # not blocked
+        if mask is None:
+            amin = np.minimum.reduce(a, axis, keepdims=keepdims)
+            amax = np.maximum.reduce(a, axis, keepdims=keepdims)
+            return amin, amax, np.zeros(np.shape(amin), bool)[()]
+        amin = np.minimum.reduce(a, axis, None, None, keepdims, hi, ~mask)
+        amax = np.maximum.reduce(a, axis, None, None, keepdims, lo, ~mask)
+        return amin, amax, np.logical_and.reduce(mask, axis, keepdims=keepdims)
+
+    # view as (outer, n, inner) with the reduced axis in the middle, and
+    # reduce blocks of shape (ob, nb, ib)
+    if axis is None:
+        outer, n, inner = 1, a.size, 1
+        outshape = (1,)*a.ndim if keepdims else ()
+    else:
+        axis = normalize_axis_index(axis, a.ndim)
+        outer = int(np.prod(a.shape[:axis]))
+        n, inner = a.shape[axis], int(np.prod(a.shape[axis + 1:]))
+        outshape = a.shape[:axis] + ((1,) if keepdims else ()) + \
+                   a.shape[axis + 1:]
+    if n == 0 and mask is None:
+        raise ValueError("zero-size array to reduction operation minimum "
+                         "which has no identity")
+    a3 = a.reshape(outer, n, inner)
+    m3 = None if mask is None else mask.reshape(outer, n, inner)
+    amin = np.full((outer, inner), hi, a.dtype)
+    amax = np.full((outer, inner), lo, a.dtype)
+    empty = np.full((outer, inner), n == 0 or mask is not None)
+
+    def fold(out, ind, axis):
+        # combine the extremes of the block a3[ind] along axis (or the block
+        # itself if axis is None) into the results at out
+        blk = a3[ind]
+        mblk = None if m3 is None else m3[ind]
+        for res, fill, op in ((amin, hi, np.minimum), (amax, lo, np.maximum)):
+            # filling a copy of the block is much faster than the where
+            # argument of ufunc reductions
+            b = blk if mblk is None else np.where(mblk, fill, blk)
+            op(res[out], b if axis is None else op.reduce(b, axis),
+               out=res[out])
+        if mblk is not None:
+            empty[out] &= (mblk if axis is None else
+                           np.logical_and.reduce(mblk, axis))
+
+    B = _MINMAX_BLOCK
+    if inner == 1:
+        # contiguous lanes: blocks of whole lanes, or of parts of a lane
+        nb = builtins.max(1, builtins.min(n, B))
+        ob = builtins.max(1, B // nb)
+        for o in range(0, outer, ob):
+            for j in range(0, n, nb):
+                fold((slice(o, o + ob), 0),
+                     (slice(o, o + ob), slice(j, j + nb), 0), 1)
+    elif inner >= B // 8:
+        # long rows: accumulate them elementwise, which is faster than
+        # reducing a short axis
+        for o in range(outer):
+            for i in range(0, inner, B):
+                for j in range(n):
+                    fold((o, slice(i, i + B)), (o, j, slice(i, i + B)),
+                         None)
+    else:
+        nb = builtins.max(1, builtins.min(n, B // inner))
+        ob = builtins.max(1, B // (nb * inner))
+        for o in range(0, outer, ob):
+            for j in range(0, n, nb):
+                fold(slice(o, o + ob),
+                     (slice(o, o + ob), slice(j, j + nb)), 1)
+    return (amin.reshape(outshape)[()], amax.reshape(outshape)[()],
+            empty.reshape(outshape)[()])
+
+# Pickling support. For pickle protocol 5, ducktypes expose the memory of
+# their ndarrays as PickleBuffers, so that it can be transported out-of-band
+# (eg, to other processes) without copies.
+
+def pickle_array(arr, protocol):
+    """
+    Return a picklable tuple representing the ndarray `arr`, to be converted
+    back by `unpickle_array`. For protocol 5 and above, the array's memory
+    is exposed as a `pickle.PickleBuffer`. Non-contiguous arrays are copied
+    once, to a contiguous array.
+    """
+    if (protocol < 5 or not hasattr(pickle, 'PickleBuffer') or
+            not isinstance(arr, np.ndarray) or arr.dtype.hasobject or
+            arr.dtype.itemsize == 0):
+        return (arr,)
+    if not (arr.flags.c_contiguous or arr.flags.f_contiguous):
+        arr = np.ascontiguousarray(arr)
+    order = 'C' if arr.flags.c_contiguous else 'F'
+    return (pickle.PickleBuffer(arr), arr.dtype, arr.shape, order)
+
+def unpickle_array(state):
+    """
+    Convert a tuple returned by `pickle_array` back to an ndarray. The
+    result views the unpickled buffer.
+    """
+    if len(state) == 1:
+        return state[0]
+    buf, dtype, shape, order = state
+    return np.frombuffer(buf, dtype=dtype).reshape(shape, order=order)
+
+# Shared memory support, for sharing ducktypes between processes without
+# copies. All the ndarrays of a ducktype are placed in a single segment.
+
+class _SharedView:
+    # Exposes part of a shared memory segment through the array interface,
+    # so that ndarrays constructed from it keep the segment object alive as
+    # their base. Otherwise the segment could be closed and unmapped while
+    # arrays still point into it.
+    def __init__(self, segment, shape, dtype, offset):
+        addr = np.frombuffer(segment.buf, np.uint8).ctypes.data
+        self.segment = segment
+        self.__array_interface__ = {'shape': shape, 'typestr': dtype.str,
+                                    'descr': dtype.descr,
+                                    'data': (addr + offset, False),
+                                    'version': 3}
+
+class SharedHandle:
+    """
+    Picklable handle to a set of ndarrays stored in one shared memory
+    segment, as returned by the `to_shared` method of ducktypes.
+
+    Pickling the handle (eg, to send it to a worker process) only transports
+    the segment name and the array layout. The arrays are viewed, not
+    copied, by `attach`.
+
+    The process which created the handle owns the segment, and should call
+    `unlink` when no process needs it any more. The handle can be used as a
+    context manager which does this on exit. On POSIX systems, arrays which
+    already view the segment stay valid after it is unlinked.
+    """
+
+    _align = 64
+
+    def __init__(self, arrays, meta=None):
+        """
+        Parameters
+        ----------
+        arrays : dict
+            The ndarrays to copy into a new segment, by key.
+        meta : object, optional
+            Any picklable extra information needed to reconstruct the
+            ducktype from the arrays.
+        """
+        layout, size = [], 0
+        for key, arr in arrays.items():
+            arr = np.asanyarray(arr)
+            if arr.dtype.hasobject:
+                raise TypeError("object arrays cannot be shared")
+            layout.append((key, arr.dtype, arr.shape, size))
+            size += -(-arr.nbytes // self._align) * self._align
+
+        self._shm = shared_memory.SharedMemory(create=True,
+                                               size=builtins.max(size, 1))
+        self.name = self._shm.name
+        self.layout = layout
+        self.meta = meta
+        for (key, *_), out in zip(layout, self.attach().values()):
+            out[...] = arrays[key]
+
+    def __getstate__(self):
+        return {'name': self.name, 'layout': self.layout, 'meta': self.meta}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = None
+
+    def attach(self):
+        """
+        Return a dict of ndarrays viewing the segment, by key.
+        """
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(self.name)
+        return {key: np.asarray(_SharedView(self._shm, shape, dtype, offset))
+                for key, dtype, shape, offset in self.layout}
+
+    def unlink(self):
+        """
+        Destroy the segment once all processes have stopped using it.
+        """
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(self.name)
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.unlink()
@@ -16,6 +16,8 @@ from numpy import (concatenate, errstate, array, format_float_positional,
                    bool_, flexible)
 from numpy.core import umath
 
+from .common import blocked_minmax
+
 from numpy.lib import NumpyVersion
 if (NumpyVersion(np.__version__) < '1.15.10' or
         os.environ.get('NUMPY_EXPERIMENTAL_ARRAY_FUNCTION', '0') == '0'):
@@ -126,8 +128,8 @@ class IntegerFormatter(ElementFormatter):
     def get_format_func(self, elem, **options):
         max_str_len = 0
         if elem.size > 0:
-            max_str_len = max(len(str(int(np.max(elem)))),
-                              len(str(int(np.min(elem)))))
+            min_val, max_val, _ = blocked_minmax(elem)
+            max_str_len = max(len(str(int(max_val))), len(str(int(min_val))))
         fmt = '{{:{}d}}'.format(max_str_len)
         return lambda x: fmt.format(int(x))
 
@@ -158,8 +160,7 @@ class FloatingFormatter(ElementFormatter):
         # choose exponential mode based on the non-zero finite values:
         abs_non_zero = umath.absolute(finite_vals[finite_vals != 0])
         if len(abs_non_zero) != 0:
-            max_val = np.max(abs_non_zero)
-            min_val = np.min(abs_non_zero)
+            min_val, max_val, _ = blocked_minmax(abs_non_zero)
             with np.errstate(over='ignore'):  # division can overflow
                 if max_val >= 1.e8 or (not suppress_small and
                         (min_val < 0.0001 or max_val/min_val > 1000.)):
@@ -303,14 +304,15 @@ class ComplexFloatingFormatter(FloatingFormatter):
 
 class _TimelikeFormatter(ElementFormatter):
     def _datetime_fmt(self, elem, fmt_non_nat):
-        non_nat = elem[~umath.isnat(elem)]
-        if len(non_nat) > 0:
+        nat = umath.isnat(elem)
+        min_val, max_val, all_nat = blocked_minmax(elem, mask=nat)
+        if not all_nat:
             # Max str length of non-NaT elements
-            max_str_len = max(len(fmt_non_nat(np.max(non_nat))),
-                              len(fmt_non_nat(np.min(non_nat))))
+            max_str_len = max(len(fmt_non_nat(max_val)),
+                              len(fmt_non_nat(min_val)))
         else:
             max_str_len = 0
-        if len(non_nat) < elem.size:
+        if nat.any():
             # data contains a NaT
             max_str_len = max(max_str_len, 5)
         fmt = '%{}s'.format(max_str_len)
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# Benchmark of masked apply_along_axis: per-slice, threaded and vectorized.
+#
+# Usage: bench_apply_along_axis.py [nlanes]
+import sys
+import time
+import numpy as np
+from ndarray_ducktypes.MaskedArray import MaskedArray
+
+nlanes = int(float(sys.argv[1])) if len(sys.argv) > 1 else 20000
+rng = np.random.default_rng(0)
+a = MaskedArray(rng.random((nlanes, 50)), rng.random((nlanes, 50)) < 0.1)
+
+def timeit(name, f):
+    t = time.perf_counter()
+    res = f()
+    print("{:12s} {:8.3f}s".format(name, time.perf_counter() - t))
+    return res
+
+ref = timeit("per-slice", lambda: np.apply_along_axis(np.cumsum, 1, a))
+thr = timeit("4 threads", lambda: np.apply_along_axis(np.cumsum, 1, a,
+                                                      workers=4))
+vec = timeit("vectorized", lambda: np.apply_along_axis(
+                 lambda x: np.cumsum(x, axis=1), 1, a, vectorized=True))
+assert np.array_equal(ref.filled(0), thr.filled(0))
+assert np.array_equal(ref.filled(0), vec.filled(0))
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# Benchmark of MaskedArray construction from lists containing X, against
+# np.array of the same lists with nan in place of X.
+#
+# Usage: bench_construct.py [n]
+import sys
+import time
+import numpy as np
+from ndarray_ducktypes.MaskedArray import MaskedArray, X
+
+n = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**6
+rng = np.random.default_rng(0)
+vals = rng.random(n).tolist()
+masked = rng.random(n) < 0.1
+with_X = [X if m else v for v, m in zip(vals, masked)]
+with_nan = [np.nan if m else v for v, m in zip(vals, masked)]
+ints_X = [X if m else i for i, m in enumerate(masked)]
+rows_X = [with_X[i:i + 100] for i in range(0, n, 100)]
+rows_nan = [with_nan[i:i + 100] for i in range(0, n, 100)]
+
+def timeit(name, f):
+    t = time.perf_counter()
+    f()
+    print("{:40s} {:8.3f}s".format(name, time.perf_counter() - t))
+
+timeit("np.array, floats with nan", lambda: np.array(with_nan))
+timeit("MaskedArray, floats with X", lambda: MaskedArray(with_X))
+timeit("MaskedArray, ints with X", lambda: MaskedArray(ints_X))
+timeit("np.array, rows of 100 with nan", lambda: np.array(rows_nan))
+timeit("MaskedArray, rows of 100 with X", lambda: MaskedArray(rows_X))
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# Benchmark of the time and peak temporary memory of masked np.cov, for
+# different max_memory settings, compared to np.cov of an ndarray.
+#
+# Usage: bench_cov.py [nvars] [nobs]
+import sys
+import time
+import tracemalloc
+import numpy as np
+import ndarray_ducktypes.MaskedArray as ma
+from ndarray_ducktypes.MaskedArray import MaskedArray
+
+nvars = int(float(sys.argv[1])) if len(sys.argv) > 1 else 500
+nobs = int(float(sys.argv[2])) if len(sys.argv) > 2 else 2*10**5
+rng = np.random.default_rng(0)
+d = rng.random((nvars, nobs))
+a = MaskedArray(d, rng.random((nvars, nobs)) < 0.1)
+print("input data {:.0f} MB".format(d.nbytes / 2**20))
+
+def measure(name, f):
+    tracemalloc.start()
+    t = time.perf_counter()
+    f()
+    t = time.perf_counter() - t
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print("{:28s} {:8.3f}s  peak {:8.1f} MB".format(name, t, peak / 2**20))
+
+measure("np.cov ndarray", lambda: np.cov(d))
+for mem in [None, 1 << 28, 1 << 25]:
+    measure("masked max_memory={}".format(mem),
+            lambda: ma.cov(a, max_memory=mem))
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# Benchmark of filling masked gaps along the rows of a 2D MaskedArray,
+# compared to a Python loop over the rows using np.interp.
+#
+# The vectorized functions do several passes over the data, so they win
+# when there are many short lanes, where the loop's per-row overhead
+# dominates.
+#
+# Usage: bench_fill.py [ncols]
+import sys
+import time
+import numpy as np
+import ndarray_ducktypes.MaskedArray as ma
+from ndarray_ducktypes.MaskedArray import MaskedArray
+
+ncols = int(float(sys.argv[1])) if len(sys.argv) > 1 else 100
+nrows = 10**7 // ncols
+rng = np.random.default_rng(0)
+a = MaskedArray(rng.random((nrows, ncols)), rng.random((nrows, ncols)) < 0.3)
+
+def loop_interp(a):
+    out = np.empty(a.shape)
+    x = np.arange(a.shape[1])
+    data, mask = a.filled(), a.mask
+    for i in range(a.shape[0]):
+        valid = ~mask[i]
+        if not valid.any():
+            continue
+        out[i] = np.interp(x, x[valid], data[i][valid])
+    return out
+
+def timeit(name, f):
+    t = time.perf_counter()
+    f()
+    print("{:24s} {:8.3f}s".format(name, time.perf_counter() - t))
+
+timeit("row loop np.interp", lambda: loop_interp(a))
+timeit("interpolate_masked", lambda: ma.interpolate_masked(a))
+timeit("ffill", lambda: ma.ffill(a))
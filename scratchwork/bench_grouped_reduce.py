@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# Benchmark of grouped_reduce against a Python loop over the groups.
+#
+# Usage: bench_grouped_reduce.py [n] [ngroups]
+import sys
+import time
+import numpy as np
+import ndarray_ducktypes.MaskedArray as ma
+from ndarray_ducktypes.MaskedArray import MaskedArray
+
+n = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**6
+ngroups = int(float(sys.argv[2])) if len(sys.argv) > 2 else 1000
+rng = np.random.default_rng(0)
+v = MaskedArray(rng.random((n, 4)), rng.random((n, 4)) < 0.1)
+labels = rng.integers(0, ngroups, n)
+
+def loop(op):
+    return [getattr(np, op)(v[labels == g], axis=0) for g in range(ngroups)]
+
+def timeit(name, f):
+    t = time.perf_counter()
+    f()
+    print("{:24s} {:8.3f}s".format(name, time.perf_counter() - t))
+
+for op in ['sum', 'max']:
+    timeit("loop " + op, lambda: loop(op))
+    timeit("grouped_reduce " + op, lambda: ma.grouped_reduce(v, labels, op))
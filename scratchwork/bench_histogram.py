@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# Benchmark of masked histograms: the streaming accumulator (used by
+# np.histogram for numeric bins) against compressing the valid data and
+# calling np.histogram on it, as was done before.
+#
+# Usage: bench_histogram.py [n]
+import sys
+import time
+import numpy as np
+from ndarray_ducktypes.MaskedArray import MaskedArray, chunked_histogram
+
+n = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**7
+rng = np.random.default_rng(0)
+a = MaskedArray(rng.normal(size=n), rng.random(n) < 0.1)
+
+def timeit(name, f):
+    t = time.perf_counter()
+    f()
+    print("{:40s} {:8.3f}s".format(name, time.perf_counter() - t))
+
+for bins, rng_ in [(100, (-4, 4)), (100, None), (np.linspace(-4, 4, 101), None)]:
+    kind = "edges" if np.ndim(bins) else "range" if rng_ else "no range"
+    timeit("compress + np.histogram, " + kind,
+           lambda: np.histogram(a._data[~a._mask], bins, rng_))
+    timeit("chunked_histogram, " + kind,
+           lambda: chunked_histogram(a, bins, rng_))
+
+s = a.reshape(-1, 2)
+timeit("compress + np.histogramdd",
+       lambda: np.histogramdd(s._data[~s._mask.any(axis=1)], 50,
+                              [(-4, 4)]*2))
+timeit("chunked_histogram, ndim=2",
+       lambda: chunked_histogram(s, 50, [(-4, 4)]*2, ndim=2))
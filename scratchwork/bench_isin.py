@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# Benchmark of masked isin against np.isin on the same (unmasked) data.
+#
+# Usage: bench_isin.py [n]
+import sys
+import time
+import numpy as np
+from ndarray_ducktypes.MaskedArray import MaskedArray
+
+n = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**6
+rng = np.random.default_rng(0)
+
+def timeit(name, f):
+    t = time.perf_counter()
+    f()
+    print("{:32s} {:8.3f}s".format(name, time.perf_counter() - t))
+
+for name, hi in [("small int range", 1000), ("large int range", 2**40)]:
+    a, b = rng.integers(0, hi, n), rng.integers(0, hi, n // 10)
+    ma, mb = MaskedArray(a, rng.random(n) < 0.1), MaskedArray(b)
+    timeit("np.isin " + name, lambda: np.isin(a, b))
+    timeit("masked isin " + name, lambda: np.isin(ma, mb))
+
+a, b = rng.random(n), rng.random(n // 10)
+timeit("np.isin float", lambda: np.isin(a, b))
+timeit("masked isin float", lambda: np.isin(MaskedArray(a), MaskedArray(b)))
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# Benchmark of load_delimited against np.genfromtxt.
+#
+# Usage: bench_load_delimited.py [nrows] [workers]
+import sys
+import os
+import time
+import tempfile
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from ndarray_ducktypes.MaskedArrayCollection import load_delimited
+
+nrows = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**6
+workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+rng = np.random.default_rng(0)
+x = rng.random(nrows)
+n = rng.integers(0, 1000, nrows)
+fd, fname = tempfile.mkstemp(suffix='.csv')
+with os.fdopen(fd, 'w') as f:
+    f.writelines('{:.6f},{},{}\n'.format(a, b if b % 10 else '', 'abc'[b % 3])
+                 for a, b in zip(x, n))
+size = os.path.getsize(fname)
+
+def bench(name, f):
+    t = time.perf_counter()
+    f()
+    t = time.perf_counter() - t
+    print("{:28s} {:8.3f}s {:8.1f} MB/s".format(name, t, size/t/1e6))
+
+print("{} rows, {:.1f} MB".format(nrows, size/1e6))
+bench('load_delimited', lambda: load_delimited(fname))
+with ThreadPoolExecutor(workers) as ex:
+    bench('load_delimited {} threads'.format(workers),
+          lambda: load_delimited(fname, executor=ex, block_size=1 << 22))
+bench('np.genfromtxt', lambda: np.genfromtxt(fname, delimiter=',',
+                                             dtype=None, encoding='ascii'))
+os.remove(fname)
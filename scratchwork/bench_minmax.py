@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# Benchmark of the fused masked minmax against separate masked max and min
+# reductions (the previous np.ptp), and of the ndarray kernel against
+# separate np.min and np.max. Best of 5 runs.
+#
+# Usage: bench_minmax.py [nrows] [ncols]
+import sys
+import time
+import numpy as np
+from ndarray_ducktypes.MaskedArray import MaskedArray, minmax
+from ndarray_ducktypes.common import blocked_minmax
+
+nrows = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**4
+ncols = int(sys.argv[2]) if len(sys.argv) > 2 else 10**4
+rng = np.random.default_rng(0)
+d = rng.random((nrows, ncols))
+a = MaskedArray(d, rng.random(d.shape) < 0.1)
+
+def timeit(name, f):
+    best = np.inf
+    for i in range(5):
+        t = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - t)
+    print("{:36s} {:8.3f}s".format(name, best))
+
+for axis in [None, 0, 1]:
+    print("axis={}".format(axis))
+    timeit("  np.min + np.max", lambda: (d.min(axis), d.max(axis)))
+    timeit("  blocked_minmax", lambda: blocked_minmax(d, axis))
+    timeit("  masked max + min reductions",
+           lambda: (np.maximum.reduce(a, axis), np.minimum.reduce(a, axis)))
+    timeit("  masked minmax", lambda: minmax(a, axis))
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# Benchmark of per-field thread parallelism in ArrayCollection operations.
+#
+# Usage: bench_parallel_fields.py [ncols] [nrows] [workers]
+# The default size (200 columns of 1e7 float64 rows) needs about 16GB for the
+# input plus the same for each result; pass smaller sizes to try it out.
+import sys
+import os
+import time
+import numpy as np
+from ndarray_ducktypes.ArrayCollection import ArrayCollection
+from ndarray_ducktypes.common import set_thread_pool
+
+ncols = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+nrows = int(float(sys.argv[2])) if len(sys.argv) > 2 else 10**7
+workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+
+rng = np.random.default_rng(0)
+a = ArrayCollection({'c{}'.format(i): rng.random(nrows) for i in range(ncols)})
+ind = rng.integers(0, nrows, nrows//2)
+cond = rng.random(nrows) < 0.5
+
+ops = [('take', lambda: np.take(a, ind)),
+       ('concatenate', lambda: np.concatenate([a, a])),
+       ('repeat', lambda: np.repeat(a, 2)),
+       ('where', lambda: np.where(cond, a, a)),
+       ('delete', lambda: np.delete(a, slice(0, None, 3)))]
+
+def timeit(f, n=3):
+    best = np.inf
+    for i in range(n):
+        t = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+print("{} columns x {} rows, {} workers".format(ncols, nrows, workers))
+for name, f in ops:
+    set_thread_pool(None)
+    serial = timeit(f)
+    set_thread_pool(workers)
+    parallel = timeit(f)
+    print("{:12s} serial {:8.3f}s  parallel {:8.3f}s  speedup {:5.2f}x".format(
+          name, serial, parallel, serial/parallel))
@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# Benchmark of parallel_map with a Python-level function, compared to
+# applying it serially.
+#
+# Usage: bench_parallel_map.py [workers]
+import sys
+import time
+import numpy as np
+from ndarray_ducktypes.MaskedArray import MaskedArray, parallel_map
+
+workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+def lanes(block):
+    # deliberately Python-level work: one apply_along_axis per block
+    return np.apply_along_axis(np.cumsum, 0, block)
+
+rng = np.random.default_rng(0)
+a = MaskedArray(rng.random((100, 4000)), rng.random((100, 4000)) < 0.1)
+
+t = time.perf_counter()
+serial = lanes(a)
+print("serial        {:8.3f}s".format(time.perf_counter() - t))
+
+t = time.perf_counter()
+par = parallel_map(lanes, a, axis=1, workers=workers)
+print("{} workers     {:8.3f}s".format(workers, time.perf_counter() - t))
+assert np.array_equal(serial.filled(0), par.filled(0))
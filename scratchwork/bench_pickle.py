@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# Benchmark of pickling MaskedArray and ArrayCollection, in-process with
+# out-of-band buffers, and round trips through a process pool.
+#
+# Usage: bench_pickle.py [nelem]
+import sys
+import time
+import pickle
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.reduction import ForkingPickler
+from ndarray_ducktypes.MaskedArray import MaskedArray
+from ndarray_ducktypes.ArrayCollection import ArrayCollection
+
+n = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**7
+rng = np.random.default_rng(0)
+marr = MaskedArray(rng.random(n), rng.random(n) < 0.1)
+coll = ArrayCollection({'c{}'.format(i): rng.random(n//10) for i in range(10)})
+
+def timeit(f, repeat=5):
+    best = np.inf
+    for i in range(repeat):
+        t = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+def roundtrip(obj, protocol):
+    bufs = []
+    cb = bufs.append if protocol >= 5 else None
+    s = pickle.dumps(obj, protocol=protocol, buffer_callback=cb)
+    return pickle.loads(s, buffers=bufs)
+
+def identity(x):
+    return x
+
+print("in-process dumps+loads:")
+for name, obj in [('MaskedArray', marr), ('ArrayCollection', coll)]:
+    for proto in [4, 5]:
+        t = timeit(lambda: roundtrip(obj, proto))
+        print("  {:16s} protocol {}  {:8.4f}s".format(name, proto, t))
+
+print("process pool round trip:")
+ForkingPickler._dumps_orig = ForkingPickler.dumps
+with ProcessPoolExecutor(1) as ex:
+    ex.submit(identity, 0).result()
+    for proto in [4, 5]:
+        # the pool pickles with the default protocol, so override it
+        ForkingPickler.dumps = classmethod(
+            lambda cls, obj, protocol=None, p=proto:
+                ForkingPickler._dumps_orig(obj, p))
+        for name, obj in [('MaskedArray', marr), ('ArrayCollection', coll)]:
+            t = timeit(lambda: ex.submit(identity, obj).result(), 3)
+            print("  {:16s} protocol {}  {:8.4f}s".format(name, proto, t))
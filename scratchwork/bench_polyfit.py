@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# Benchmark of batched masked polyfit, fitting a polynomial to each column
+# of y, against a Python loop of np.polyfit over the unmasked samples of
+# each column, and np.polyfit of the unmasked data (one lstsq).
+#
+# Usage: bench_polyfit.py [nseries] [nsamples] [deg]
+import sys
+import time
+import numpy as np
+from ndarray_ducktypes.MaskedArray import MaskedArray
+
+nseries = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**5
+nsamples = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+deg = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+rng = np.random.default_rng(0)
+x = np.linspace(0, 1, nsamples)
+d = rng.normal(size=(nsamples, nseries))
+y = MaskedArray(d, rng.random(d.shape) < 0.1)
+
+def timeit(name, f):
+    t = time.perf_counter()
+    f()
+    print("{:40s} {:8.3f}s".format(name, time.perf_counter() - t))
+
+def loop():
+    nloop = min(nseries, 10000)
+    for j in range(nloop):
+        k = ~y._mask[:, j]
+        np.polyfit(x[k], d[k, j], deg)
+    return nloop
+
+t = time.perf_counter()
+nloop = loop()
+print("{:40s} {:8.3f}s".format("loop of np.polyfit (extrapolated)",
+      (time.perf_counter() - t) * nseries / nloop))
+timeit("np.polyfit of unmasked data", lambda: np.polyfit(x, d, deg))
+timeit("masked np.polyfit", lambda: np.polyfit(x, y, deg))
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# Benchmark of QuantileSketch, ingesting masked data in chunks, against the
+# exact masked np.quantile on the whole array. Prints the rank error of the
+# sketch's estimates.
+#
+# Usage: bench_quantile_sketch.py [n] [nlanes]
+import sys
+import time
+import numpy as np
+from ndarray_ducktypes.MaskedArray import MaskedArray, QuantileSketch
+
+n = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**7
+nlanes = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+rng = np.random.default_rng(0)
+a = MaskedArray(rng.lognormal(size=(n // nlanes, nlanes)),
+                rng.random((n // nlanes, nlanes)) < 0.1)
+q = [0.5, 0.99, 0.999]
+
+def timeit(name, f):
+    t = time.perf_counter()
+    r = f()
+    print("{:32s} {:8.3f}s".format(name, time.perf_counter() - t))
+    return r
+
+exact = timeit("np.quantile", lambda: np.quantile(a, q, axis=0))
+
+def sketch():
+    s = QuantileSketch(axis=0)
+    for data, mask in a.iter_chunks(rows=(1 << 18) // nlanes):
+        s.update(MaskedArray(data, mask))
+    return s.quantile(q)
+approx = timeit("QuantileSketch", sketch)
+
+v = np.sort(a._data[:, 0][~a._mask[:, 0]])
+for qi, e, x in zip(q, exact.filled()[:, 0], approx.filled()[:, 0]):
+    print("q={:<6} exact {:10.5f} sketch {:10.5f} rank error {:.2e}".format(
+          qi, e, x, abs(np.searchsorted(v, x) / len(v) - qi)))
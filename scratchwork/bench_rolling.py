@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# Benchmark of masked rolling reductions against reducing a strided window
+# view, which is O(n*window).
+#
+# Usage: bench_rolling.py [n] [window]
+import sys
+import time
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+import ndarray_ducktypes.MaskedArray as ma
+from ndarray_ducktypes.MaskedArray import MaskedArray
+
+n = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**6
+w = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+rng = np.random.default_rng(0)
+a = MaskedArray(rng.random(n), rng.random(n) < 0.1)
+
+def windows(x):
+    return as_strided(x, (n - w + 1, w), x.strides*2, writeable=False)
+
+def timeit(name, f):
+    t = time.perf_counter()
+    f()
+    print("{:24s} {:8.3f}s".format(name, time.perf_counter() - t))
+
+timeit("strided sum", lambda: windows(a.filled(0)).sum(axis=1))
+timeit("rolling_sum", lambda: ma.rolling_sum(a, w))
+timeit("rolling_var", lambda: ma.rolling_var(a, w))
+timeit("strided max", lambda: windows(a.filled(minmax='min')).max(axis=1))
+timeit("rolling_max", lambda: ma.rolling_max(a, w))
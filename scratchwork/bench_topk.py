@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# Benchmark of masked topk against a single np.argpartition of the plain
+# data, and the masked argpartition (rank trick) and argsort it replaces.
+#
+# Usage: bench_topk.py [nrows] [ncols] [k]
+import sys
+import time
+import numpy as np
+from ndarray_ducktypes.MaskedArray import MaskedArray, topk
+
+nrows = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**5
+ncols = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+rng = np.random.default_rng(0)
+d = rng.random((nrows, ncols))
+a = MaskedArray(d, rng.random((nrows, ncols)) < 0.2)
+# a few lanes with fewer than k valid elements
+a[::1000, k // 2:] = MaskedArray(0, True)
+
+def timeit(name, f):
+    t = time.perf_counter()
+    f()
+    print("{:36s} {:8.3f}s".format(name, time.perf_counter() - t))
+
+timeit("np.argpartition of plain data", lambda: np.argpartition(d, -k))
+timeit("masked argpartition", lambda: np.argpartition(a, ncols - k))
+timeit("masked argsort", lambda: np.argsort(a))
+timeit("topk, sorted", lambda: topk(a, k))
+timeit("topk, unsorted", lambda: topk(a, k, sorted=False))
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+# Benchmark of masked np.unique(axis=0) against np.unique(axis=0) on
+# ndarray data.
+#
+# Usage: bench_unique_rows.py [nrows] [ncols]
+import sys
+import time
+import numpy as np
+from ndarray_ducktypes.MaskedArray import MaskedArray
+
+nrows = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10**6
+ncols = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+rng = np.random.default_rng(0)
+d = rng.integers(0, 4, (nrows, ncols))
+m = MaskedArray(d, rng.random((nrows, ncols)) < 0.05)
+
+def timeit(name, f):
+    t = time.perf_counter()
+    r = f()
+    print("{:24s} {:8.3f}s".format(name, time.perf_counter() - t))
+    return r
+
+u = timeit("np.unique ndarray", lambda: np.unique(d, axis=0))
+mu = timeit("np.unique MaskedArray", lambda: np.unique(m, axis=0))
+print(len(u), "unique ndarray rows,", len(mu), "unique masked rows")
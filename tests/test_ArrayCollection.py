@@ -1,4 +1,5 @@
 import sys
+import pickle
 import pytest
 from numpy.testing import (
     assert_raises, assert_warns, suppress_warnings, assert_,
@@ -9,7 +10,11 @@ from functools import reduce
 import textwrap
 import operator
 import warnings
-from ndarray_ducktypes.ArrayCollection import ArrayCollection, CollectionScalar
+from ndarray_ducktypes.ArrayCollection import (ArrayCollection,
+                                              CollectionScalar, constant_array,
+                                              _normalize_index)
+from ndarray_ducktypes.common import set_thread_pool
+from ndarray_ducktypes.MaskedArray import MaskedArray, X
 
 class TestConstruction:
     def test_simple_dict(self):
@@ -18,6 +23,277 @@ class TestConstruction:
         assert_equal(a['age'], [8, 10, 7, 8])
         assert_equal(a.shape, (4,))
 
+class TestUnique:
+    def test_unique(self):
+        a = ArrayCollection({'a': [2, 1, 2, 1, 2], 'b': [1., 3., 1., 3., 0.]})
+        u = np.unique(a)
+        assert_equal(u['a'], [1, 2, 2])
+        assert_equal(u['b'], [3., 0., 1.])
+
+        u, ind, inv, c = np.unique(a, return_index=True, return_inverse=True,
+                                   return_counts=True)
+        assert_equal(ind, [1, 4, 0])
+        assert_equal(inv, [2, 0, 2, 0, 1])
+        assert_equal(c, [2, 1, 2])
+        assert_equal(u[inv]['b'], a['b'])
+
+    def test_unique_2d(self):
+        a = ArrayCollection({'a': [[1, 1], [0, 1]],
+                             'b': [['x', 'y'], ['x', 'x']]})
+        u, c = np.unique(a, return_counts=True)
+        assert_equal(u['a'], [0, 1, 1])
+        assert_equal(u['b'], ['x', 'x', 'y'])
+        assert_equal(c, [1, 2, 1])
+
+class TestPartition:
+    def test_partition_by(self):
+        a = ArrayCollection({'k': np.arange(100) % 7,
+                             's': np.array(['a', 'bb', 'ccccccccccc'])[
+                                           np.arange(100) % 3],
+                             'v': np.arange(100.)})
+        parts = a.partition_by(['k', 's'], 4)
+        assert_equal(len(parts), 4)
+        assert_equal(sum(p.size for p in parts), 100)
+
+        # every row is present, order preserved within a partition
+        v = np.concatenate([p['v'] for p in parts])
+        assert_equal(np.sort(v), a['v'])
+        for p in parts:
+            assert_(np.all(np.diff(p['v']) > 0))
+
+        # equal keys land in the same partition
+        seen = {}
+        for n, p in enumerate(parts):
+            for k, s in zip(p['k'], p['s']):
+                assert_equal(seen.setdefault((k, s), n), n)
+
+    def test_partition_by_float_zero(self):
+        a = ArrayCollection({'k': [0.0, -0.0, 0.0, -0.0]})
+        parts = a.partition_by('k', 3)
+        assert_equal(sorted(p.size for p in parts), [0, 0, 4])
+
+class TestConstant:
+    def setup_method(self):
+        self.a = ArrayCollection({'i': np.arange(6),
+                                  'f': constant_array(1.5, 6),
+                                  's': constant_array('xy', 6)})
+
+    def test_compact_ops(self):
+        a = self.a
+        for b in [a[1:4], a[[5, 0, 1]], a[a['i'] > 2], np.take(a, [2, 3]),
+                  np.concatenate([a, a]), a.copy(), a.ravel(),
+                  a.astype([('i', 'i4'), ('f', 'f4'), ('s', 'U3')])]:
+            assert_equal(b['f'].strides, (0,))
+            assert_equal(b['s'].strides, (0,))
+            assert_equal(b['f'][0], 1.5)
+            assert_equal(b['s'][-1], 'xy')
+        assert_equal(np.concatenate([a, a])['f'].shape, (12,))
+        assert_equal(a[2]._data, (2, 1.5, 'xy'))
+        assert_raises(IndexError, np.take, a, [6])
+
+        b = a.copy()
+        # fields are readonly until assigned through the collection
+        assert_raises(ValueError, b['f'].__setitem__, 0, 1)
+        b['f'] = 0
+        b['f'][0] = 1
+        assert_equal(b['f'], [1, 0, 0, 0, 0, 0])
+
+        # different values are concatenated normally
+        c = np.concatenate([a, ArrayCollection({'i': [0], 'f': [2.],
+                                                's': ['z']})])
+        assert_equal(c['f'], [1.5]*6 + [2.])
+
+    def test_copy_on_write(self):
+        a = self.a
+        v = a[2:4]
+        a[0] = (9, 2.5, 'zz')
+        assert_equal(a['f'], [2.5] + [1.5]*5)
+        assert_equal(a['s'][:2], ['zz', 'xy'])
+        assert_equal(a['f'].flags.writeable, True)
+        assert_equal(v['f'], [1.5, 1.5])
+
+    def test_to_structured(self):
+        s = self.a.to_structured()
+        assert_equal(s.dtype, self.a.dtype)
+        assert_equal(s['i'], np.arange(6))
+        assert_equal(s['s'], ['xy']*6)
+
+class TestIndexing:
+    def test_normalize_index(self):
+        shape = (10,)
+        ind, copy = _normalize_index(np.arange(10) % 3 == 1, shape)
+        assert_equal((ind, copy), (slice(1, 8, 3), True))
+        ind, copy = _normalize_index([2, 3, 4], shape)
+        assert_equal((ind, copy), (slice(2, 5, 1), True))
+        ind, copy = _normalize_index(np.array([4, 3]), shape)
+        assert_equal(ind, [4, 3])
+        assert_equal(copy, False)
+        ind, copy = _normalize_index([0, 1, 10], shape)
+        assert_equal(ind, [0, 1, 10])
+        ind, copy = _normalize_index(np.arange(10) % 4 == 0, shape)
+        assert_equal(ind, slice(0, 9, 4))
+        ind, copy = _normalize_index(np.arange(10) % 4 == 1, shape)
+        assert_equal(ind, slice(1, 10, 4))
+        ind, copy = _normalize_index(np.arange(10) < 3, (10, 2))
+        assert_equal(ind, slice(0, 3, 1))
+        ind, copy = _normalize_index(np.eye(2, dtype=bool), (2, 2))
+        assert_equal(ind, ([0, 1], [0, 1]))
+        assert_equal(_normalize_index(slice(2), shape), (slice(2), False))
+
+    def test_getitem_setitem(self):
+        a = ArrayCollection({'i': np.arange(10), 'f': np.arange(10.)/2})
+        b = a[a['i'] >= 5]
+        assert_equal(b['f'], [2.5, 3., 3.5, 4., 4.5])
+        # boolean indexing makes a copy even though a slice is used
+        b['i'] = 0
+        assert_equal(a['i'], np.arange(10))
+        assert_equal(a[[1, 2]]['i'].base, None)
+        assert_equal(a[[7, 1, 7]]['i'], [7, 1, 7])
+        assert_raises(IndexError, a.__getitem__, [1, 10])
+
+        a[a['i'] % 2 == 0] = (-1, -1.)
+        assert_equal(a['i'], [-1, 1, -1, 3, -1, 5, -1, 7, -1, 9])
+        a[[1, 3]] = ArrayCollection({'i': [10, 30], 'f': [1., 3.]})
+        assert_equal(a['i'][:4], [-1, 10, -1, 30])
+        assert_equal(a['f'][:4], [-1., 1., -1., 3.])
+
+class TestThreadPool:
+    def test_parallel_fields(self):
+        a = ArrayCollection({'f{}'.format(i): np.arange(100)*i
+                             for i in range(8)})
+        ops = [lambda a: np.take(a, [5, 2, 99]),
+               lambda a: np.concatenate([a, a[:5]]),
+               lambda a: np.repeat(a, 2),
+               lambda a: np.where(a['f1'] % 2 == 0, a, a[::-1]),
+               lambda a: np.reshape(a, (10, 10)),
+               lambda a: np.pad(a, 2, 'edge'),
+               lambda a: np.delete(a, [1, 3]),
+               lambda a: np.insert(a, 2, a[0])]
+        serial = [op(a) for op in ops]
+        old = set_thread_pool(4, threshold=0)
+        try:
+            for op, expected in zip(ops, serial):
+                res = op(a)
+                assert_equal(list(res._arrays.keys()),
+                             list(expected._arrays.keys()))
+                for name, field in expected._arrays.items():
+                    assert_equal(res[name], field)
+        finally:
+            set_thread_pool(*old)
+
+class TestQuery:
+    def test_query(self):
+        a = ArrayCollection({'a': np.arange(20), 'b': np.arange(20.)[::-1],
+                             'f': np.arange(20) % 3 == 0})
+        r = a.query('(a > 3) & (b < 7)', ['a'], rows=4)
+        assert_equal(r.dtype.names, ('a',))
+        assert_equal(r['a'], np.arange(13, 20))
+        r = a.query('f and a < 10 or a == 19', rows=3)
+        assert_equal(r['a'], [0, 3, 6, 9, 19])
+        assert_equal(r['b'], [19., 16., 13., 10., 0.])
+        assert_equal(a.query('2 < a*2 <= 10 and not f', ['a'])['a'],
+                     [2, 4, 5])
+        assert_equal(a.query('a > lim', variables={'lim': 17})['a'], [18, 19])
+        assert_equal(a.query('~f', ['a']).shape, (13,))
+        assert_equal(a['f'].sum(), 7)
+        assert_raises(NameError, a.query, 'c > 1')
+        assert_raises(ValueError, a.query, 'a.max() > 1')
+
+    def test_query_bitwise(self):
+        # & and | are bitwise in value context
+        a = ArrayCollection({'a': np.arange(8)})
+        assert_equal(a.query('(a & 1) == 1')['a'], [1, 3, 5, 7])
+        assert_equal(a.query('(a | 8) > 10')['a'], [3, 4, 5, 6, 7])
+        assert_equal(a.query('(a > 2) & ((a & 1) == 0)')['a'], [4, 6])
+        assert_equal(a.query('~a == -3')['a'], [2])
+        assert_equal(a.query('((a > 2) | (a < 1)) == (a != 2)')['a'],
+                     [0, 2, 3, 4, 5, 6, 7])
+
+    def test_query_masked(self):
+        # masked comparisons are neither true nor false
+        a = ArrayCollection({'a': MaskedArray([1, X, 3, X, 5]),
+                             'b': np.arange(5)})
+        assert_equal(a.query('a > 2')['b'], [2, 4])
+        assert_equal(a.query('~(a > 2)')['b'], [0])
+        assert_equal(a.query('not (a > 2)')['b'], [0])
+        assert_equal(a.query('(a > 2) | (b == 1)')['b'], [1, 2, 4])
+        assert_equal(a.query('~((a > 2) & (b < 4))')['b'], [0, 4])
+        assert_equal(a.query('~((a > 2) | (b > 3))')['b'], [0])
+
+    def test_short_circuit(self):
+        class Recorder(np.ndarray):
+            def __getitem__(self, ind):
+                self.reads.append(np.arange(len(self))[ind])
+                return np.asarray(self)[ind]
+
+        b = np.arange(100.).view(Recorder)
+        b.reads = []
+        a = ArrayCollection({'a': np.arange(100), 'b': b})
+        r = a.query('(a >= 10) & (a < 15) & (b > 12)', ['a'], rows=10)
+        assert_equal(r['a'], [13, 14])
+        # b is only read for rows 10-14
+        assert_equal(np.concatenate(b.reads), np.arange(10, 15))
+
+    def test_query_memmap(self, tmp_path):
+        m = np.memmap(str(tmp_path / 'a.dat'), dtype='f8', mode='w+',
+                      shape=(1000,))
+        m[:] = np.arange(1000)
+        a = ArrayCollection({'a': m, 'b': np.arange(1000) % 7})
+        r = a.query('(a < 100) & (b == 0)', ['a'], rows=128)
+        assert_equal(r['a'], np.arange(0, 100, 7))
+
+class TestPickle:
+    def test_pickle(self):
+        a = ArrayCollection({'a': np.arange(3), 'b': np.arange(6.)[::2],
+                             'k': constant_array(2.5, 3)})
+        for proto in range(2, pickle.HIGHEST_PROTOCOL + 1):
+            b = pickle.loads(pickle.dumps(a, protocol=proto))
+            assert_equal(b.dtype, a.dtype)
+            for name in a.dtype.names:
+                assert_equal(b[name], a[name])
+
+        buffers = []
+        s = pickle.dumps(a, protocol=5, buffer_callback=buffers.append)
+        assert_equal(len(buffers), 2)
+        b = pickle.loads(s, buffers=buffers)
+        assert_(np.shares_memory(b['a'], a['a']))
+        assert_equal(b['k'].strides, (0,))
+
+class TestShared:
+    def test_shared(self):
+        a = ArrayCollection({'a': np.arange(3), 'b': MaskedArray([1., X, 3.]),
+                             'k': constant_array(2.5, 3)})
+        with a.to_shared() as h:
+            b = ArrayCollection.from_shared(h)
+            c = ArrayCollection.from_shared(pickle.loads(pickle.dumps(h)))
+            c[0] = (5, X, 1.)
+            assert_equal(b['a'], [5, 1, 2])
+            assert_equal(b['b'].mask, [1, 1, 0])
+            # constant fields are copied on write, so are not shared
+            assert_equal(b['k'].strides, (0,))
+            assert_equal(b['k'], [2.5, 2.5, 2.5])
+        assert_raises(TypeError, ArrayCollection(
+                      {'a': np.array([None])}).to_shared)
+
+class TestIterChunks:
+    def test_iter_chunks(self):
+        a = ArrayCollection({'a': np.arange(10), 'b': np.arange(10.)})
+        chunks = list(a.iter_chunks(rows=4))
+        assert_equal([c.shape for c in chunks], [(4,), (4,), (2,)])
+        assert_equal(chunks[2]['b'], [8., 9.])
+        # chunks are views
+        chunks[0]['a'][0] = 100
+        assert_equal(a['a'][0], 100)
+
+    def test_iter_chunks_prefetch(self, tmp_path):
+        m = np.memmap(str(tmp_path / 'a.dat'), dtype='f8', mode='w+',
+                      shape=(10000,))
+        m[:] = np.arange(10000)
+        a = ArrayCollection({'a': m, 'b': np.arange(10000)})
+        total = sum(c['a'].sum() for c in a.iter_chunks(3000, prefetch=True))
+        assert_equal(total, m.sum())
+        assert_raises(TypeError, a[0:1].reshape(()).iter_chunks)
+
 if __name__ == '__main__':
     a = np.arange(4, dtype='u2')
     b = np.arange(4, 8, dtype='f8')
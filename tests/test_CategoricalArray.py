@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+import numpy as np
+from numpy.testing import assert_equal, assert_raises
+from ndarray_ducktypes.ArrayCollection import ArrayCollection
+from ndarray_ducktypes.CategoricalArray import CategoricalArray
+
+class TestCategoricalArray:
+    def setup_method(self):
+        self.a = CategoricalArray(['Oslo', 'Rome', 'Oslo', 'Bern'])
+
+    def test_construct(self):
+        a = self.a
+        assert_equal(a.categories, ['Bern', 'Oslo', 'Rome'])
+        assert_equal(a.codes, [1, 2, 1, 0])
+        assert_equal(a.codes.dtype, np.uint8)
+        assert_equal(np.asarray(a), ['Oslo', 'Rome', 'Oslo', 'Bern'])
+        assert_equal(a[1], 'Rome')
+        assert_equal(type(a[1:]), CategoricalArray)
+
+        b = CategoricalArray(['x', 'y'], categories=['z', 'y', 'x'])
+        assert_equal(b.codes, [0, 1])
+        assert_raises(ValueError, CategoricalArray, ['w'], ['x', 'y'])
+
+    def test_compare(self):
+        a = self.a
+        assert_equal(a == 'Oslo', [1, 0, 1, 0])
+        assert_equal(a != 'Paris', [1, 1, 1, 1])
+        assert_equal(a < 'Paris', [1, 0, 1, 1])
+        assert_equal(a >= 'Oslo', [1, 1, 1, 0])
+        assert_equal(a > 'Oslo', [0, 1, 0, 0])
+        assert_equal(a == CategoricalArray(['Oslo', 'Zug', 'Zug', 'Bern']),
+                     [1, 0, 0, 1])
+
+    def test_setitem(self):
+        a = self.a
+        a[1] = 'Bern'
+        assert_equal(a.categories, ['Bern', 'Oslo', 'Rome'])
+        a[2:] = CategoricalArray(['Rome', 'Oslo'])
+        assert_equal(np.asarray(a), ['Oslo', 'Bern', 'Rome', 'Oslo'])
+        assert_raises(ValueError, a.__setitem__, 0, 'Wien')
+        assert_raises(ValueError, a.__setitem__, 0, CategoricalArray(['Wien']))
+        assert_equal(a.categories, ['Bern', 'Oslo', 'Rome'])
+
+        # views see assignments
+        v = a[1:3]
+        v[0] = 'Rome'
+        assert_equal(np.asarray(a), ['Oslo', 'Rome', 'Rome', 'Oslo'])
+        assert_raises(ValueError, v.__setitem__, 0, 'Wien')
+        assert_equal(np.asarray(a), ['Oslo', 'Rome', 'Rome', 'Oslo'])
+
+    def test_functions(self):
+        a = self.a
+        b = CategoricalArray(['Zug', 'Oslo'])
+        c = np.concatenate([a, b])
+        assert_equal(c.categories, ['Bern', 'Oslo', 'Rome', 'Zug'])
+        assert_equal(np.asarray(c), ['Oslo', 'Rome', 'Oslo', 'Bern', 'Zug',
+                                     'Oslo'])
+        assert_equal(np.asarray(np.take(a, [3, 1])), ['Bern', 'Rome'])
+        w = np.where([True, False, True, False], a, ['x', 'y', 'z', 'w'])
+        assert_equal(np.asarray(w), ['Oslo', 'y', 'Oslo', 'w'])
+        u, cnt = np.unique(a, return_counts=True)
+        assert_equal(np.asarray(u), ['Bern', 'Oslo', 'Rome'])
+        assert_equal(cnt, [1, 2, 1])
+        assert_equal(np.asarray(np.sort(a)), ['Bern', 'Oslo', 'Oslo', 'Rome'])
+
+    def test_collection(self):
+        c = ArrayCollection({'city': self.a, 'temp': [3., 17., 5., 1.]})
+        assert_equal(c[c['city'] == 'Oslo']['temp'], [3., 5.])
+
+        d = np.concatenate([c, ArrayCollection({
+                    'city': CategoricalArray(['Zug', 'Oslo']),
+                    'temp': [0., 1.]})])
+        assert_equal(np.asarray(d['city']), ['Oslo', 'Rome', 'Oslo', 'Bern',
+                                             'Zug', 'Oslo'])
+        u = np.unique(d[['city']])
+        assert_equal(np.asarray(u['city']), ['Bern', 'Oslo', 'Rome', 'Zug'])
+
+        t = np.take(c, [3, 0])
+        assert_equal(type(t['city']), CategoricalArray)
+        assert_equal(t['temp'], [1., 3.])
+
+    def test_partition_by(self):
+        # equal values land in the same partition whatever the categories,
+        # and as for plain string fields
+        vals = np.array(['v{}'.format(i) for i in range(40)])
+        x = vals[np.arange(25) % 17]
+        cs = [ArrayCollection({'k': CategoricalArray(x)}),
+              ArrayCollection({'k': CategoricalArray(x, categories=vals)}),
+              ArrayCollection({'k': x.astype('U12')})]
+        where = [{str(k): n for n, p in enumerate(c.partition_by('k', 7))
+                  for k in np.asarray(p['k'])} for c in cs]
+        assert_equal(len(where[0]), 17)
+        assert_equal(where[1], where[0])
+        assert_equal(where[2], where[0])
@@ -545,6 +545,45 @@ class TestMaskedArray:
             test = pickle.loads(pickle.dumps(b, protocol=proto))
             assert_equal(test, b)
 
+    def test_pickling_out_of_band(self):
+        # protocol 5 transports data and mask as out-of-band buffers
+        a = MaskedArray([[1., X], [3., 4.]])
+        buffers = []
+        s = pickle.dumps(a, protocol=5, buffer_callback=buffers.append)
+        assert_equal(len(buffers), 2)
+        b = pickle.loads(s, buffers=buffers)
+        assert_masked_equal(b, a)
+        # unpickled arrays view the buffers
+        assert_(np.shares_memory(b._data, a._data))
+
+        for s in [X('i4'), MaskedScalar(2.5), a[0, 1]]:
+            assert_masked_equal(pickle.loads(pickle.dumps(s, protocol=5)), s)
+
+    def test_shared(self):
+        a = MaskedArray([[1., X], [3., 4.]])
+        with a.to_shared() as h:
+            b = MaskedArray.from_shared(h)
+            assert_masked_equal(b, a)
+            # a handle unpickled elsewhere views the same segment
+            c = MaskedArray.from_shared(pickle.loads(pickle.dumps(h)))
+            c[1, 0] = X
+            assert_equal(b.mask, [[0, 1], [1, 0]])
+        # views stay valid after the segment is unlinked
+        assert_equal(b.filled(0), [[1., 0.], [0., 4.]])
+
+    def test_parallel_map(self):
+        from functools import partial
+        from concurrent.futures import ThreadPoolExecutor
+        a = MaskedArray(np.arange(30.).reshape(3, 10),
+                        np.arange(30).reshape(3, 10) % 4 == 0)
+        func = partial(np.cumsum, axis=0)
+        expected = np.cumsum(a, axis=0)
+        assert_masked_equal(ma.parallel_map(func, a, axis=1, workers=2),
+                            expected)
+        with ThreadPoolExecutor(2) as ex:
+            assert_masked_equal(ma.parallel_map(func, a, 1, ex), expected)
+            assert_raises(ValueError, ma.parallel_map, np.sum, a, 1, ex)
+
     def test_single_element_subscript(self):
         # Tests single element subscripts of Maskedarrays.
         a = MaskedArray([1, 3, 2])
@@ -4322,6 +4361,13 @@ class Test_API:
         assert_almost_masked_equal(np.cov(xy.T, rowvar=False), ret)
         assert_almost_masked_equal(np.cov(x, y), ret)
         assert_almost_masked_equal(np.corrcoef(xy), cc)
+        # blocked computation
+        assert_almost_masked_equal(ma.cov(xy, max_memory=64, workers=2), ret)
+        assert_almost_masked_equal(ma.corrcoef(xy, max_memory=64), cc)
+
+        # pairs of variables with no common observations are masked
+        z = MaskedArray([X, X, X, 1., X, X, 2.])
+        assert_equal(np.cov(x, z).mask, [[0, 1], [1, 0]])
 
         # result values below not checked carefully for correctness... this
         # test is for consistency after code changes.
@@ -4337,6 +4383,19 @@ class Test_API:
         val = np.cov(xy, ddof=2, fweights=fweights, aweights=aweights)
         assert_almost_masked_equal(val, ret)
 
+        # more variables than a block of rows of the result
+        rng = np.random.default_rng(0)
+        d = rng.random((600, 20)) + 1j*rng.random((600, 20))
+        m = MaskedArray(d, rng.random(d.shape) < 0.2)
+        valid = ~m.mask
+        dm = np.where(valid, d - (m.sum(axis=1) /
+                                  valid.sum(axis=1)).filled()[:, None], 0)
+        ret = np.dot(dm, dm.T.conj()) / (np.dot(valid*1., valid.T) - 1)
+        for workers in [None, 2]:
+            val = ma.cov(m, max_memory=1 << 16, workers=workers)
+            assert_almost_equal(val.filled(), ret)
+            assert_equal(val.filled(), val.filled().T.conj())
+
     def test_clip(self):
         a = MaskedArray([[2.1, X, 3.1], [0.5, 1.0, 6.0]])
         ret = MaskedArray([[2.1, X, 3.1], [2., 2.0, 5.0]])
@@ -4616,6 +4675,16 @@ class Test_API:
         b = MaskedArray([[1,2,3], [4,5,X], [X,8,X]])
         assert_masked_equal(np.apply_along_axis(my_func, 1, b),
                             MaskedArray([2, X, X]))
+        assert_masked_equal(np.apply_along_axis(my_func, 1, b, workers=2),
+                            MaskedArray([2, X, X]))
+        assert_masked_equal(np.apply_along_axis(np.cumsum, 0, b, workers=2),
+                            np.cumsum(b, axis=0))
+        # vectorized func1d gets all the 1d slices as rows of a 2d array
+        assert_masked_equal(np.apply_along_axis(lambda x: x[:, 0] + x[:, -1],
+                                                0, b, vectorized=True),
+                            MaskedArray([X, 10, X]))
+        assert_raises(ValueError, np.apply_along_axis, np.sum, 0, b,
+                      vectorized=True)
 
         a = MaskedArray(np.arange(24).reshape(2,3,4))
         a[0,0,0] = X
@@ -4970,14 +5039,66 @@ class Test_API:
         assert_masked_equal(u[indices], a.ravel())
         assert_equal(c, [1,2,2,2,1,2])
 
-        # axis argument is not currently supported
-        #d = [[1, 0, X, 0], [1, 0, X, 0], [2, 3, 4, X]]
-        #a = MaskedArray(d)
-        #assert_masked_equal(np.unique(a, axis=0),
-        #                    MaskedArray([[1, 0, X, 0], [2, 3, 4, X]]))
-        #assert_masked_equal(ma.unique(d, axis=0),
-        #                    MaskedArray([[1, 0, X, 0], [2, 3, 4, X]]))
-
+        d = [[1, 0, X, 0], [1, 0, X, 0], [2, 3, 4, X]]
+        a = MaskedArray(d)
+        assert_masked_equal(np.unique(a, axis=0),
+                            MaskedArray([[1, 0, X, 0], [2, 3, 4, X]]))
+        assert_masked_equal(ma.unique(d, axis=0),
+                            MaskedArray([[1, 0, X, 0], [2, 3, 4, X]]))
+
+        # masked data values are ignored, masks must match
+        a = MaskedArray([[2, 1], [1, 1], [2, 1], [1, 1], [1, 1]],
+                        [[0, 0], [1, 0], [0, 0], [0, 0], [1, 0]])
+        a._data[1, 0] = 9
+        u, i, inv, c = np.unique(a, axis=0, return_index=True,
+                                 return_inverse=True, return_counts=True)
+        assert_masked_equal(u, MaskedArray([[1, 1], [2, 1], [X, 1]]))
+        assert_equal(i, [3, 0, 1])
+        assert_equal(inv, [1, 2, 1, 0, 2])
+        assert_equal(c, [1, 2, 2])
+        assert_masked_equal(np.unique(a.T, axis=1), u.T)
+
+    def test_set_operations(self):
+        a = MaskedArray([5, X, 1, 3, 5, 2])
+        b = MaskedArray([2, 5, 7, X])
+        c = MaskedArray([2, 5, 7])
+        # masked is treated as a distinct value
+        assert_equal(np.isin(a, b), [1, 1, 0, 0, 1, 1])
+        assert_equal(np.isin(a, c), [1, 0, 0, 0, 1, 1])
+        assert_equal(np.isin(a, [2, 5], invert=True), [0, 1, 1, 1, 0, 0])
+        assert_equal(np.isin(MaskedArray([.5, X, np.nan, 2.5e9]),
+                             [np.nan, 2.5e9]), [0, 0, 0, 1])
+        assert_equal(np.in1d(a.reshape(2, 3), b), [1, 1, 0, 0, 1, 1])
+
+        u, i1, i2 = np.intersect1d(a, b, return_indices=True)
+        assert_masked_equal(u, MaskedArray([2, 5, X]))
+        assert_equal(i1, [5, 0, 1])
+        assert_equal(i2, [0, 1, 3])
+        assert_masked_equal(np.intersect1d(a, c), MaskedArray([2, 5]))
+        assert_masked_equal(np.union1d(a, c), MaskedArray([1, 2, 3, 5, 7, X]))
+        assert_masked_equal(np.setdiff1d(a, b), MaskedArray([1, 3]))
+        assert_masked_equal(np.setdiff1d(a, c), MaskedArray([1, 3, X]))
+        assert_masked_equal(np.setxor1d(a, b), MaskedArray([1, 3, 7]))
+        assert_masked_equal(np.setxor1d(a, c), MaskedArray([1, 3, 7, X]))
+
+
+    def test_iter_chunks(self):
+        a = MaskedArray([[1, X], [3, 4], [X, X]])
+        chunks = list(a.iter_chunks(rows=2))
+        assert_equal(len(chunks), 2)
+        (d0, m0), (d1, m1) = chunks
+        assert_equal(d0, [[1, 0], [3, 4]])
+        assert_equal(m0, [[False, True], [False, False]])
+        assert_equal(m1, [[True, True]])
+        assert_(not m0.flags.writeable)
+        # views, not copies
+        d0[1, 1] = 5
+        assert_masked_equal(a[1, 1], MaskedScalar(5))
+
+        chunks = list(MaskedArray(np.arange(7), np.arange(7) % 2).iter_chunks(
+                      rows=3, prefetch=True))
+        assert_equal([d.tolist() for d, m in chunks], [[0,1,2], [3,4,5], [6]])
+        assert_raises(TypeError, MaskedScalar(1)[...].iter_chunks)
 
     def test_dtype_methods(self):
         s = X('i4')
@@ -5286,3 +5407,301 @@ class Test_API:
         assert_almost_masked_equal(np.unwrap(a), ret)
         assert_almost_masked_equal(ma.unwrap(d), ret)
 
+    def test_polyfit_polyval(self):
+        x = MaskedArray([0., 1., 2., X, 4.])
+        y = MaskedArray([1., 3., X, 100., 21.])
+        assert_almost_equal(np.polyfit(x, y, 2), [1, 1, 1])
+        assert_almost_masked_equal(np.polyval([1, 1, 1], x),
+                                   MaskedArray([1., 3., 7., X, 21.]))
+        assert_masked_equal(np.polyval(MaskedArray([1, X]), [1, 2]),
+                            MaskedArray([X, X], dtype=int))
+
+        # batched, with the lanes along either axis
+        y = MaskedArray([[1., 3., X, 100., 21.],
+                         [1., X, X, X, 9.],
+                         [X, X, X, X, 2.],
+                         [2., 0., 2., X, 18.]]).T
+        ret = MaskedArray([[1., X, X, 2.], [1., X, X, -4.], [1., X, X, 2.]])
+        assert_almost_masked_equal(np.polyfit(x, y, 2), ret)
+        assert_almost_masked_equal(ma.polyfit(x, y.T, 2, axis=1), ret.T)
+        assert_almost_masked_equal(ma.polyfit(x, y, 1, w=[1, 1, 1, 1, X]),
+                                   MaskedArray([[2., X, X, 0.],
+                                                [1., X, X, 4/3]]))
+        assert_raises(ValueError, np.polyfit, x, y, 2, full=True)
+
+        # as accurate as a loop of np.polyfit for offset x and high degree,
+        # and with the same rcond
+        rng = np.random.default_rng(0)
+        x = np.linspace(1000, 1010, 60)
+        d = np.sin(x)[:, None] + rng.normal(size=(60, 5))
+        y = MaskedArray(d, rng.random(d.shape) < 0.2)
+        for rcond in [None, 1e-3]:
+            c = np.polyfit(x, y, 8, rcond=rcond).filled()
+            for j in range(5):
+                k = ~y._mask[:, j]
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', np.RankWarning)
+                    ref = np.polyfit(x[k], d[k, j], 8, rcond=rcond)
+                rss = np.sum((np.polyval(c[:, j], x[k]) - d[k, j])**2)
+                ref = np.sum((np.polyval(ref, x[k]) - d[k, j])**2)
+                assert_almost_equal(rss / ref, 1, decimal=3)
+
+
+class TestMaskedFunctions:
+    def test_rolling(self):
+        a = MaskedArray([1., X, 3., 4., X, X, 7.])
+        assert_equal(ma.rolling_count(a, 3), [2, 2, 2, 1, 1])
+        assert_masked_equal(ma.rolling_sum(a, 3),
+                            MaskedArray([4., 7., 7., 4., 7.]))
+        assert_masked_equal(ma.rolling_sum(a, 3, min_count=2),
+                            MaskedArray([4., 7., 7., X, X]))
+        assert_masked_equal(ma.rolling_mean(a, 3),
+                            MaskedArray([2., 3.5, 3.5, 4., 7.]))
+        assert_almost_masked_equal(ma.rolling_var(a, 3),
+                                   MaskedArray([1., .25, .25, 0., 0.]))
+        assert_masked_equal(ma.rolling_var(a, 3, ddof=1),
+                            MaskedArray([2., .5, .5, X, X]))
+        assert_masked_equal(ma.rolling_min(a, 3),
+                            MaskedArray([1., 3., 3., 4., 7.]))
+        assert_masked_equal(ma.rolling_max(a, 2),
+                            MaskedArray([1., 3., 4., 4., X, 7.]))
+        assert_raises(ValueError, ma.rolling_sum, a, 8)
+
+        b = MaskedArray([[5, X, 1], [2, 3, X], [X, 0, 4]])
+        assert_masked_equal(ma.rolling_max(b, 2, axis=0),
+                            MaskedArray([[5, 3, 1], [2, 3, 4]]))
+        assert_masked_equal(ma.rolling_sum(b, 2, axis=0),
+                            MaskedArray([[7, 3, 1], [2, 3, 4]]))
+        assert_masked_equal(ma.rolling_min(b, 3, axis=1),
+                            MaskedArray([[1], [2], [0]]))
+
+    def test_fill(self):
+        a = MaskedArray([X, 1., X, X, 4., X, X, X, 8., X])
+        assert_masked_equal(ma.ffill(a),
+                    MaskedArray([X, 1., 1., 1., 4., 4., 4., 4., 8., 8.]))
+        assert_masked_equal(ma.ffill(a, limit=1),
+                    MaskedArray([X, 1., 1., X, 4., 4., X, X, 8., 8.]))
+        assert_masked_equal(ma.bfill(a, limit=2),
+                    MaskedArray([1., 1., 4., 4., 4., X, 8., 8., 8., X]))
+        assert_masked_equal(ma.interpolate_masked(a),
+                    MaskedArray([X, 1., 2., 3., 4., 5., 6., 7., 8., X]))
+        assert_masked_equal(ma.interpolate_masked(a, limit=2),
+                    MaskedArray([X, 1., 2., 3., 4., X, X, X, 8., X]))
+
+        b = MaskedArray([[1, X, 3], [X, 5, X], [7, X, X]])
+        assert_masked_equal(ma.ffill(b, axis=0),
+                            MaskedArray([[1, X, 3], [1, 5, 3], [7, 5, 3]]))
+        assert_masked_equal(ma.bfill(b),
+                            MaskedArray([[1, 3, 3], [5, 5, X], [7, X, X]]))
+        assert_masked_equal(ma.interpolate_masked(b, axis=0),
+                            MaskedArray([[1., X, 3.], [4., 5., X],
+                                         [7., X, X]]))
+
+    def test_grouped_reduce(self):
+        v = MaskedArray([1., X, 3., 4., 5., X])
+        labels = [2, 0, 2, 0, 3, 3]
+        assert_masked_equal(ma.grouped_reduce(v, labels, 'sum', ngroups=5),
+                            MaskedArray([4., X, 4., 5., X]))
+        assert_masked_equal(ma.grouped_reduce(v, labels, 'mean'),
+                            MaskedArray([4., X, 2., 5.]))
+        assert_masked_equal(ma.grouped_reduce(v, labels, 'count'),
+                            MaskedArray([1, 0, 2, 1]))
+        assert_masked_equal(ma.grouped_reduce(v, labels, 'min'),
+                            MaskedArray([4., X, 1., 5.]))
+        assert_masked_equal(ma.grouped_reduce(v, labels, 'max'),
+                            MaskedArray([4., X, 3., 5.]))
+        assert_raises(ValueError, ma.grouped_reduce, v, labels, 'prod')
+        for op in ['sum', 'min', 'count']:
+            assert_raises(ValueError, ma.grouped_reduce, v, labels, op,
+                          ngroups=3)
+        assert_masked_equal(ma.grouped_reduce(v[:4], MaskedArray([0, 1, X, 1]),
+                                              'count', ngroups=2),
+                            MaskedArray([1, 1]))
+
+        # columns are reduced independently, masked labels are ignored
+        v = MaskedArray([[1, X], [2, 3], [X, X], [4, 5]])
+        labels = MaskedArray([1, 0, 1, X])
+        assert_masked_equal(ma.grouped_reduce(v, labels, 'sum'),
+                            MaskedArray([[2, 3], [1, X]]))
+        assert_masked_equal(ma.grouped_reduce(v, labels, 'max'),
+                            MaskedArray([[2, 3], [1, X]]))
+
+    def test_minmax(self):
+        d = np.array([[4., 1., 7.], [2., 9., 3.]])
+        a = MaskedArray(d, [[0, 1, 0], [1, 1, 1]])
+        amin, amax = ma.minmax(a, axis=1)
+        assert_masked_equal(amin, MaskedArray([4., X]))
+        assert_masked_equal(amax, MaskedArray([7., X]))
+        assert_equal([x.filled() for x in ma.minmax(a)], [4., 7.])
+        amin, amax = ma.minmax(a, axis=0, keepdims=True)
+        assert_masked_equal(amax, MaskedArray([[4., X, 7.]]))
+        assert_masked_equal(np.ptp(a, axis=0), MaskedArray([0., X, 0.]))
+        # the input is not filled
+        assert_equal(d, [[4., 1., 7.], [2., 9., 3.]])
+
+        # the blocked kernel, across block boundaries
+        from ndarray_ducktypes import common
+        rng = np.random.default_rng(0)
+        d = rng.integers(-100, 100, (3, 50, 40))
+        m = rng.random(d.shape) < 0.3
+        hi, lo = np.iinfo(d.dtype).max, np.iinfo(d.dtype).min
+        block = common._MINMAX_BLOCK
+        try:
+            for common._MINMAX_BLOCK in [7, 64, 4000]:
+                for axis in [None, 0, 1, 2, (0, 2)]:
+                    amin, amax, empty = common.blocked_minmax(d, axis, m)
+                    assert_equal(amin, np.minimum.reduce(d, axis, initial=hi,
+                                                         where=~m))
+                    assert_equal(amax, np.maximum.reduce(d, axis, initial=lo,
+                                                         where=~m))
+                    assert_equal(empty, np.all(m, axis=axis))
+                    amin, amax, _ = common.blocked_minmax(d, axis)
+                    assert_equal(amin, np.min(d, axis=axis))
+                    assert_equal(amax, np.max(d, axis=axis))
+        finally:
+            common._MINMAX_BLOCK = block
+
+    def test_topk(self):
+        a = MaskedArray([[3, X, 9, 1, 4], [X, 2, X, X, X], [5, 5, X, 0, 7]])
+        v, i = ma.topk(a, 2)
+        assert_masked_equal(v, MaskedArray([[9, 4], [2, X], [7, 5]]))
+        assert_equal(i[:2], [[2, 4], [1, i[1, 1]]])
+        assert_equal(a._mask[1, i[1, 1]], True)
+        v, i = ma.topk(a, 3, largest=False)
+        assert_masked_equal(v, MaskedArray([[1, 3, 4], [2, X, X], [0, 5, 5]]))
+        v, i = ma.topk(a, 1, axis=0)
+        assert_masked_equal(v, MaskedArray([[5, 5, 9, 1, 7]]))
+        assert_equal(i, [[2, 2, 0, 0, 2]])
+        v, i = ma.topk(a, 2, sorted=False)
+        assert_masked_equal(np.sort(v), MaskedArray([[4, 9], [2, X], [5, 7]]))
+        assert_raises(ValueError, ma.topk, a, 6)
+
+        # unmasked elements equal to the fill value, and nan
+        f = MaskedArray([[-np.inf, X, np.nan, 1.]])
+        assert_masked_equal(ma.topk(f, 3)[0],
+                            MaskedArray([[np.nan, 1., -np.inf]]))
+        assert_masked_equal(ma.topk(-f, 4, largest=False)[0],
+                            MaskedArray([[-1., np.inf, np.nan, X]]))
+
+    def test_histogram_accumulator(self):
+        a = MaskedArray([0.5, 1., X, 3., 2.5, 2., 4., 0.])
+        h = ma.HistogramAccumulator(3, range=(0, 3))
+        h.update(a[:4]).update(a[4:], weights=[1, 5, 1, 1])
+        hist, edges = h.result()
+        assert_equal(hist, [2, 1, 7])
+        assert_equal(edges, [0, 1, 2, 3])
+
+        h2 = ma.HistogramAccumulator(3, range=(0, 3)).update(a)
+        h2.merge(ma.HistogramAccumulator(3, range=(0, 3)).update([2.]))
+        assert_equal(h2.result()[0], [2, 1, 4])
+        assert_raises(ValueError, h2.merge, ma.HistogramAccumulator([0, 3]))
+        assert_raises(ValueError, ma.HistogramAccumulator, 3)
+
+        h = ma.HistogramAccumulator([2, [0, 1, 3]], [(0, 4), None], ndim=2)
+        h.update(MaskedArray([[1, 0], [3, X], [3, 3], [2, 2]]))
+        assert_equal(h.result()[0], [[1., 0.], [0., 2.]])
+
+    def test_chunked_histogram(self):
+        rng = np.random.default_rng(1)
+        d, m = rng.normal(size=1001).astype(np.float32), rng.random(1001) < .3
+        w = rng.random(1001)
+        for bins, rng_ in [(10, None), (7, (-1, 1)), ([-2, 0, 0.5, 3], None)]:
+            hist, edges = ma.chunked_histogram(MaskedArray(d, m), bins, rng_,
+                                               weights=w, rows=100, workers=2)
+            ref = np.histogram(d[~m], bins, rng_, weights=w[~m])
+            assert_almost_equal(hist, ref[0])
+            assert_equal(edges, ref[1])
+            assert_equal(edges.dtype, ref[1].dtype)
+
+        s = MaskedArray(d[:1000].reshape(-1, 2), m[:1000].reshape(-1, 2))
+        hist, edges = ma.chunked_histogram(s, 5, ndim=2, rows=33)
+        ref = np.histogramdd(s._data[~s._mask.any(axis=1)], 5)
+        assert_equal(hist, ref[0])
+        assert_equal(edges, ref[1])
+
+        # blocks of non-contiguous arrays
+        s = MaskedArray(d[:1000].reshape(20, 50), m[:1000].reshape(20, 50)).T
+        ws = w[:1000].reshape(20, 50).T
+        hist, edges = ma.chunked_histogram(s, 6, weights=ws, rows=70)
+        ref = np.histogram(s._data[~s._mask], 6, weights=ws[~s._mask])
+        assert_almost_equal(hist, ref[0])
+        assert_equal(edges, ref[1])
+
+        # empty input has the dtype of the weights
+        for wt in [np.float64, np.int64]:
+            hist, _ = ma.chunked_histogram(MaskedArray(np.zeros(0)), 3,
+                                           (0, 1), weights=np.zeros(0, wt))
+            ref, _ = np.histogram([], 3, (0, 1), weights=np.zeros(0, wt))
+            assert_equal(hist, ref)
+            assert_equal(hist.dtype, ref.dtype)
+
+    def test_quantile_sketch(self):
+        # exact while there are few values
+        d = MaskedArray([[3., X], [1., 2.], [X, X], [2., 8.], [7., 4.]])
+        s = ma.QuantileSketch(axis=0).update(d[:2]).update(d[2:])
+        q = [0, 0.25, 0.5, 1]
+        assert_almost_masked_equal(s.quantile(q), np.quantile(d, q, axis=0))
+        assert_equal(s.count, [4, 3])
+        assert_almost_equal(s.quantile(0.5).filled(), [2.5, 4.])
+        assert_raises(ValueError, s.update, d.T)
+        assert_raises(ValueError, s.quantile, 1.5)
+
+        s = ma.QuantileSketch(axis=1).update(MaskedArray([[X, X], [1, 2]]))
+        assert_masked_equal(s.quantile(0.5), MaskedArray([X, 1.5]))
+
+        # a masked value stays masked next to a nan, which propagates
+        s = ma.QuantileSketch().update(MaskedArray([1., np.nan, 5.],
+                                                   [0, 0, 1]))
+        assert_equal(s._max, 1.)
+        assert_(np.isnan(s.quantile(0.5).filled()))
+        s = ma.QuantileSketch(axis=0).update(MaskedArray([[1., 2.], [3., 4.]]))
+        s.merge(ma.QuantileSketch(axis=0).update(
+            MaskedArray([[np.nan, 6.]], [[0, 0]])))
+        assert_equal(s.quantile(1).filled(), [np.nan, 6.])
+
+        # approximate, and mergeable
+        rng = np.random.default_rng(0)
+        d = rng.lognormal(size=(20000, 2))
+        d = MaskedArray(d, rng.random(d.shape) < 0.2)
+        s = ma.QuantileSketch(compression=100)
+        for i in range(0, 10000, 1000):
+            s.update(d[i:i + 1000])
+        s.merge(ma.QuantileSketch(compression=100).update(d[10000:]))
+        v = np.sort(d._data[~d._mask])
+        for q in [0.01, 0.5, 0.99, 0.999]:
+            rank = np.searchsorted(v, s.quantile(q).filled()) / len(v)
+            assert_(abs(rank - q) < 2e-3)
+        assert_equal(s.quantile(1).filled(), v[-1])
+
+    def test_reduceat_input_unchanged(self):
+        d = np.array([1, 2, 3, 4])
+        a = MaskedArray(d, [0, 1, 0, 0])
+        assert_masked_equal(np.add.reduceat(a, [0, 2]), MaskedArray([1, 7]))
+        assert_equal(d, [1, 2, 3, 4])
+
+    def test_construct_nested_lists(self):
+        a = MaskedArray([[1, X, 3], [X, 5, 6]])
+        assert_equal(a.dtype, np.array([1]).dtype)
+        assert_equal(a.mask, [[0, 1, 0], [1, 0, 0]])
+        assert_equal(a.filled(0), [[1, 0, 3], [0, 5, 6]])
+
+        a = MaskedArray([[[1, 2.5]], [[X, True]]])
+        assert_equal(a.shape, (2, 1, 2))
+        assert_equal(a.dtype, np.float64)
+        assert_equal(a.filled(-1), [[[1, 2.5]], [[-1, 1]]])
+
+        a = MaskedArray([[1, X], [X, 2]], dtype=np.float32)
+        assert_equal(a.dtype, np.float32)
+        assert_equal(a.mask, [[0, 1], [1, 0]])
+
+        a = MaskedArray([[X, X]], dtype='i2')
+        assert_equal(a.dtype, np.int16)
+        assert_equal(a.mask, [[1, 1]])
+        assert_raises(ValueError, MaskedArray, [[X], [X]])
+
+        # inputs outside the fast path
+        a = MaskedArray([1., X(np.float32)])
+        assert_equal(a.mask, [0, 1])
+        a = MaskedArray([MaskedArray([1, X]), [X, 4]])
+        assert_equal(a.mask, [[0, 1], [1, 0]])
+        assert_equal(a.filled(0), [[1, 0], [0, 4]])
@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 from ndarray_ducktypes.ArrayCollection import ArrayCollection
 from ndarray_ducktypes.MaskedArray import MaskedArray
-from ndarray_ducktypes.MaskedArrayCollection import MaskedArrayCollection
+from ndarray_ducktypes.MaskedArrayCollection import (MaskedArrayCollection,
+                                                     load_delimited)
 import numpy as np
+from numpy.testing import assert_equal, assert_raises
+from ndarray_ducktypes.MaskedArray import X
 
 # Tests for Masked ArrayCollections.
 #
@@ -26,3 +29,219 @@ import numpy as np
 #c['age'] += 100
 #print(repr(c))
 #print(repr(c.filled()))
+
+class TestUnique:
+    def test_unique_masked(self):
+        # masked cells count as a distinct value, as in MaskedArray unique
+        c = MaskedArrayCollection({'a': MaskedArray([2, X, 2, X, 2]),
+                                   'b': MaskedArray([1., 3., 1., 4., X])})
+        u, inv, cnt = np.unique(c, return_inverse=True, return_counts=True)
+        assert_equal(type(u), MaskedArrayCollection)
+        assert_equal(u['a'].mask, [0, 0, 1, 1])
+        assert_equal(u['a'].filled(), [2, 2, 0, 0])
+        assert_equal(u['b'].mask, [0, 1, 0, 0])
+        assert_equal(u['b'].filled(), [1, 0, 3, 4])
+        assert_equal(inv, [0, 2, 0, 3, 1])
+        assert_equal(cnt, [2, 1, 1, 1])
+
+class TestIterChunks:
+    def test_iter_chunks(self):
+        c = MaskedArrayCollection({'a': MaskedArray([2, X, 2, X, 2]),
+                                   'b': MaskedArray([1., 3., 1., 4., X])})
+        chunks = list(c.iter_chunks(rows=2, prefetch=True))
+        assert_equal(len(chunks), 3)
+        data, mask = chunks[1]
+        assert_equal(type(data), ArrayCollection)
+        assert_equal(data['b'], [1., 4.])
+        assert_equal(mask['a'], [False, True])
+        assert_equal(chunks[2][1]['b'], [True])
+
+class TestSharedMask:
+    def setup_method(self):
+        self.a = MaskedArray([1, X, 3, X, 5])
+        self.b = MaskedArray([1., X, 3., X, X])
+
+    def test_construct(self):
+        for packed in [False, True]:
+            c = MaskedArrayCollection([('a', self.a), ('b', self.b)],
+                                      shared_mask=True, packed=packed)
+            assert_equal(c.shape, (5,))
+            assert_equal(c.rowmask, [0, 1, 0, 1, 0])
+            # only the field which differs gets its own mask
+            assert_equal(list(c._fieldmasks.keys()), ['b'])
+            assert_equal(c['a'].mask, [0, 1, 0, 1, 0])
+            assert_equal(c['b'].mask, [0, 1, 0, 1, 1])
+            assert_equal(c['a'].flags.writeable, False)
+            assert_equal(c.filled(-1)['b'], [1., -1., 3., -1., -1.])
+
+        c = MaskedArrayCollection([('a', self.a), ('b', self.b)],
+                                  rowmask=[0, 0, 1, 0, 0])
+        assert_equal(c.rowmask, [0, 0, 1, 0, 0])
+        assert_equal(c['a'].mask, [0, 1, 1, 1, 0])
+        assert_equal(MaskedArrayCollection([('a', self.a)]).rowmask, None)
+
+    def test_indexing(self):
+        c = MaskedArrayCollection([('a', self.a), ('b', self.b)],
+                                  shared_mask=True)
+        v = c[2:]
+        assert_equal(type(v), MaskedArrayCollection)
+        assert_equal(v.rowmask, [0, 1, 0])
+        assert_equal(v['b'].mask, [0, 1, 1])
+        assert_equal(c[[4, 0]]['b'].mask, [1, 0])
+        assert_equal(c[['b']]['b'].mask, [0, 1, 0, 1, 1])
+        s = c[4]
+        assert_equal(s['a'].mask, False)
+        assert_equal(s['b'].mask, True)
+
+    def test_setitem(self):
+        for packed in [False, True]:
+            c = MaskedArrayCollection([('a', self.a.copy()),
+                                       ('b', self.b.copy())],
+                                      shared_mask=True, packed=packed)
+            c[4] = (5, 5.)
+            # the fields now agree, so no per-field masks are needed
+            assert_equal(c._fieldmasks, {})
+            c[0] = (X, 2.)
+            assert_equal(c['a'].mask, [1, 1, 0, 1, 0])
+            assert_equal(c['b'].mask, [0, 1, 0, 1, 0])
+            assert_equal(c['b'].filled(), [2., 0., 3., 0., 5.])
+            c['b'] = c['a']
+            assert_equal(c._fieldmasks, {})
+            c[1:3] = X
+            assert_equal(c.rowmask, [1, 1, 1, 1, 0])
+
+    def test_setitem_view(self):
+        c = MaskedArrayCollection([('a', self.a), ('b', self.b)],
+                                  shared_mask=True)
+        v = c[1:3]
+        v[0] = (7, 7.)
+        assert_equal(c['a'].mask, [0, 0, 0, 1, 0])
+        assert_equal(c['b'].filled(), [1., 7., 3., 0., 0.])
+        # views share the mask state of the base, so mask changes through
+        # either are seen by both
+        v[1] = (X, 1.)
+        assert_equal(c['a'].mask, [0, 0, 1, 1, 0])
+        assert_equal(c['b'].mask, [0, 0, 0, 1, 1])
+
+    def test_view_mask_state(self):
+        for packed in [False, True]:
+            a = MaskedArray([1, X, 3, X, 5])
+            c = MaskedArrayCollection([('a', a), ('b', a.astype(float))],
+                                      shared_mask=True, packed=packed)
+            v, w = c[0:3], c[['b']]
+            c[0] = (X, 2.)
+            assert_equal(c['b'].mask, [0, 1, 0, 1, 0])
+            assert_equal(v['a'].mask, [1, 1, 0])
+            assert_equal(v['b'].mask, [0, 1, 0])
+            assert_equal(w['b'].mask, [0, 1, 0, 1, 0])
+            c[0] = (X, X)
+            assert_equal(c._fieldmasks, {})
+            assert_equal(v['b'].mask, [1, 1, 0])
+
+            # assigning one field does not change the others' masks
+            w[2:4] = X
+            assert_equal(c['b'].mask, [1, 1, 1, 1, 0])
+            assert_equal(v['a'].mask, [1, 1, 0])
+            v[::-1][0] = (X, 0.)
+            assert_equal(c['a'].mask, [1, 1, 1, 1, 0])
+            assert_equal(c['b'].mask, [1, 1, 0, 1, 0])
+
+            # advanced indexing copies
+            f = c[[0, 4]]
+            f[1] = X
+            assert_equal(c['a'].mask, [1, 1, 1, 1, 0])
+
+    def test_shared_input_masks(self):
+        # assignment writes to the input data, but to none of their masks
+        a, b = MaskedArray([1, 2, 3, X]), MaskedArray([1., X, 3., X])
+        c = MaskedArrayCollection([('a', a), ('b', b)], shared_mask=True)
+        c[2] = X
+        c[0] = (5, 6.)
+        assert_equal(a.mask, [0, 0, 0, 1])
+        assert_equal(b.mask, [0, 1, 0, 1])
+        assert_equal(a.filled(0), [5, 2, 3, 0])
+        assert_equal(b.filled(0), [6., 0, 3., 0])
+        assert_equal(c['a'].mask, [0, 0, 1, 1])
+        assert_equal(c['b'].mask, [0, 1, 1, 1])
+
+        # nor to those of a shared-mask collection it was made from
+        d = MaskedArrayCollection(c, shared_mask=True)
+        d[0] = X
+        assert_equal(c['b'].mask, [0, 1, 1, 1])
+
+class TestLoadDelimited:
+    def test_infer(self, tmp_path):
+        fn = tmp_path / 'a.csv'
+        fn.write_text("# comment\nname, x ,y\nfoo,1,2.5\r\nbar,,NA\n\n"
+                      "baz quux,3, 4e2\nN/A,-4,\n")
+        c = load_delimited(fn, skip_header=1, names=True, block_size=10)
+        assert_equal(c.dtype.names, ('name', 'x', 'y'))
+        assert_equal(c['x'].dtype, np.int64)
+        assert_equal(c['name'].mask, [0, 0, 0, 1])
+        assert_equal(c['name'].filled(''), ['foo', 'bar', 'baz quux', ''])
+        assert_equal(c['x'].filled(0), [1, 0, 3, -4])
+        assert_equal(c['x'].mask, [0, 1, 0, 0])
+        assert_equal(c['y'].filled(0), [2.5, 0, 400., 0])
+        assert_equal(c['y'].mask, [0, 1, 0, 1])
+
+    def test_dtype(self, tmp_path):
+        fn = tmp_path / 'a.csv'
+        fn.write_text("1,2\n3,\n-0.5,6e-1")
+        m = load_delimited(fn, dtype=float)
+        assert_equal(type(m), MaskedArray)
+        assert_equal(m.filled(-1), [[1, 2], [3, -1], [-0.5, 0.6]])
+        c = load_delimited(fn, dtype=[('a', 'f4'), ('b', 'f8')])
+        assert_equal(c['a'].dtype, np.float32)
+        assert_equal(c['b'].mask, [0, 1, 0])
+        assert_raises(ValueError, load_delimited, fn, dtype=int)
+
+        fn.write_text("1,2\n3\n")
+        assert_raises(ValueError, load_delimited, fn)
+
+    def test_infer_blocks(self, tmp_path):
+        # types are promoted across blocks
+        fn = tmp_path / 'a.csv'
+        fn.write_text("1,,1,1.50\n2,,2,2\n" + "3,4,2.5,x\n"*3)
+        c = load_delimited(fn, block_size=8)
+        assert_equal([c[n].dtype.kind for n in c.dtype.names],
+                     ['i', 'i', 'f', 'U'])
+        assert_equal(c['f1'].mask, [1, 1, 0, 0, 0])
+        assert_equal(c['f1'].filled(0), [0, 0, 4, 4, 4])
+        assert_equal(c['f2'].filled(), [1, 2, 2.5, 2.5, 2.5])
+        assert_equal(c['f3'].filled(), ['1.50', '2', 'x', 'x', 'x'])
+
+    def test_long_tokens(self, tmp_path):
+        long = '0.' + '3'*100
+        fn = tmp_path / 'a.csv'
+        fn.write_text("1,{0},a\n2,NA,{1}\n{0},3,\n".format(long, 'b'*50))
+        c = load_delimited(fn)
+        assert_equal(c['f0'].filled(0), [1, 2, float(long)])
+        assert_equal(c['f1'].mask, [0, 1, 0])
+        assert_equal(c['f1'].filled(0), [float(long), 0, 3])
+        assert_equal(c['f2'].filled(''), ['a', 'b'*50, ''])
+        m = load_delimited(fn, dtype=[('a', 'f8'), ('b', 'f4'), ('c', 'U')],
+                           block_size=8)
+        assert_equal(m['a'].filled(0), [1, 2, float(long)])
+        assert_equal(m['b'].filled(0), np.array([long, 0, 3], 'f4'))
+        m = load_delimited(fn, dtype='U110')
+        assert_equal(m[:, 1].filled(''), [long, '', '3'])
+
+    def test_floats(self, tmp_path):
+        # the fast parse path must round like float()
+        vals = ['0.1', '-0.0', '123456.789012345', '0.30000000000000004',
+                '1.5e-7', '.5', '5.', '-12']
+        fn = tmp_path / 'a.csv'
+        fn.write_text("\n".join(vals))
+        m = load_delimited(fn, dtype=float)
+        assert_equal(m.filled(), [float(v) for v in vals])
+        assert_equal(np.signbit(m.filled()[1]), True)
+
+    def test_executor(self, tmp_path):
+        from concurrent.futures import ThreadPoolExecutor
+        fn = tmp_path / 'a.csv'
+        fn.write_text("".join("{},{}\n".format(i, i/2 if i % 3 else '')
+                              for i in range(1000)))
+        with ThreadPoolExecutor(3) as ex:
+            c = load_delimited(fn, block_size=256, executor=ex)
+        assert_equal(c['f0'].filled(), np.arange(1000))
+        assert_equal(c['f1'].mask, np.arange(1000) % 3 == 0)
@@ -6,7 +6,9 @@ from numpy.testing import (
 import numpy as np
 import numpy
 
-from ndarray_ducktypes.common import get_duck_cls, ducktype_link
+from ndarray_ducktypes.common import (get_duck_cls, ducktype_link,
+                                     set_thread_pool, get_thread_pool,
+                                     thread_pool_workers, pool_map)
 
 class Test_get_duck_cls:
     def test(self):
@@ -63,3 +65,32 @@ class Test_get_duck_cls:
         # Eg so someone can say that they don't want their derived class
         # to be mixed with the parent class. Maybe add a kwd arg
         # know_parents=True to ducktype_link
+
+class Test_thread_pool:
+    def test_pool_map(self):
+        old = set_thread_pool(4, threshold=10)
+        try:
+            args = [(i, 2) for i in range(20)]
+            assert_equal(pool_map(lambda a, b: a*b, args, 100),
+                         [2*i for i in range(20)])
+            # nested calls run serially inside the workers
+            nested = pool_map(lambda i: pool_map(lambda j: i + j,
+                                                 [(0,), (1,)], 100),
+                              [(i,) for i in range(8)], 100)
+            assert_equal(nested, [[i, i + 1] for i in range(8)])
+        finally:
+            set_thread_pool(*old)
+
+    def test_set_thread_pool(self):
+        old = set_thread_pool(4)
+        try:
+            pool = get_thread_pool()
+            assert_equal(thread_pool_workers(), 4)
+            assert_equal(set_thread_pool(2)[0], 4)
+            # pools created by set_thread_pool are shut down when replaced
+            assert_raises(RuntimeError, pool.submit, int)
+            assert_equal(thread_pool_workers(), 2)
+            set_thread_pool(None)
+            assert_equal(thread_pool_workers(), 1)
+        finally:
+            set_thread_pool(*old)